@@ -0,0 +1,56 @@
+"""
+Per-update cost of account lookups in AccountManager.
+
+A single /transfer resolves accounts about five times (middleware, transfer,
+can_pay, subtract_from_balance, get_byn_balance), so one "update" here is five
+find_account calls for a random user.
+
+Run from the project root:
+    python -m benchmarks.account_lookup
+"""
+import random
+import time
+from decimal import Decimal
+
+from src.core.account.Account import Account
+from src.core.account.AccountManager import AccountManager
+
+SIZES = (10_000, 100_000, 1_000_000)
+UPDATES = 10_000
+LOOKUPS_PER_UPDATE = 5
+
+
+class _MemoryStorage:
+    def __init__(self, data):
+        self._data = data
+
+    @property
+    def data(self):
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    def reload(self):
+        pass
+
+
+def bench(size: int) -> float:
+    manager = AccountManager(_MemoryStorage([Account(i, False, Decimal(100)) for i in range(size)]))
+    ids = [random.randrange(size) for _ in range(UPDATES)]
+
+    start = time.perf_counter()
+    for tg_id in ids:
+        for _ in range(LOOKUPS_PER_UPDATE):
+            manager.find_account(tg_id)
+    return (time.perf_counter() - start) / UPDATES
+
+
+def main():
+    for size in SIZES:
+        print(f"{size:>9} accounts: {bench(size) * 1e6:8.2f} us per update")
+
+
+if __name__ == '__main__':
+    main()
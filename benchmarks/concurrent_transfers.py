@@ -0,0 +1,68 @@
+"""
+Stress run of the async ledger API: thousands of concurrent transfers between a small set of accounts.
+Checks that the total balance is conserved, no account goes below the debt limit
+and the running stats match a full recompute.
+
+Run from the project root:
+    python -m benchmarks.concurrent_transfers
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+from decimal import Decimal
+
+from src.core.account.Account import Account
+from src.core.account.AccountManager import AccountManager, get_max_debt_kopecks
+from src.core.account.json_coder import AccountSchema
+from src.core.currency.Amount import Amount
+from src.core.history.HistoryStore import HistoryStore
+from src.database.JsonFileStorage import JsonFileStorage
+from src.database.codec import RecordCodec
+
+ACCOUNTS = 200
+TRANSFERS = 5_000
+INITIAL_BALANCE = Decimal("10")
+
+
+async def run(manager: AccountManager):
+    rng = random.Random(1)
+    ids = [account.get_id() for account in manager.accounts]
+    transfers = [(rng.choice(ids), rng.choice(ids), Amount(Decimal(rng.randint(1, 2000)) / 100))
+                 for _ in range(TRANSFERS)]
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(manager.transfer_async(a, b, amount) for a, b, amount in transfers))
+    elapsed = time.perf_counter() - start
+    print(f"{TRANSFERS} transfers in {elapsed * 1e3:.0f} ms, {sum(results)} succeeded")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        storage = JsonFileStorage(os.path.join(directory, "accounts.json"), default_value=[], write_behind=True,
+                                  codec=RecordCodec(AccountSchema))
+        storage.data = [Account(tg_id, False, INITIAL_BALANCE) for tg_id in range(1, ACCOUNTS + 1)]
+        manager = AccountManager(storage=storage, history=HistoryStore(os.path.join(directory, "history.sqlite3")))
+
+        asyncio.run(run(manager))
+        storage.flush()
+
+        total = sum(account.get_balance_kopecks() for account in manager.accounts)
+        lowest = min(account.get_balance_kopecks() for account in manager.accounts)
+        expected = ACCOUNTS * int(INITIAL_BALANCE * 100)
+        print(f"total {total} kopecks (expected {expected}), lowest balance {lowest} "
+              f"(limit {get_max_debt_kopecks()}), locks left {len(manager.locks)}")
+        assert total == expected
+        assert lowest >= get_max_debt_kopecks()
+        assert len(manager.locks) == 0
+        assert manager.verify_stats()
+
+        manager.reload()
+        assert sum(account.get_balance_kopecks() for account in manager.accounts) == expected
+        manager.history.close()
+        print("ok")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+RPC calls needed to confirm payouts in flight: polling every txid vs ConfirmationTracker.
+
+The chain is simulated in memory: one solidified block per poll, the payouts are spread over
+the next BLOCKS blocks. The per-txid baseline asks for every unconfirmed transaction on each
+poll; the tracker reads the solidified block number and the new blocks once per poll.
+
+Run from the project root:
+    python -m benchmarks.confirmation_polling
+"""
+import asyncio
+import time
+
+from src.core.crypto.tron.ConfirmationTracker import ConfirmationTracker
+
+SIZES = (10, 100, 1_000)
+BLOCKS = 20
+START_BLOCK = 1_000
+
+
+class _MemoryChain:
+    def __init__(self, count: int):
+        self.solid = START_BLOCK
+        self.calls = 0
+        self.blocks = {}
+        self.by_txid = {}
+        for i in range(count):
+            txid = f"{i:064x}"
+            info = {"id": txid, "blockNumber": START_BLOCK + 1 + i % BLOCKS, "receipt": {}}
+            self.blocks.setdefault(info["blockNumber"], {})[txid] = info
+            self.by_txid[txid] = info
+
+    async def fetch_solid_block_number(self) -> int:
+        self.calls += 1
+        return self.solid
+
+    async def fetch_block_transaction_infos(self, block_number: int):
+        self.calls += 1
+        return self.blocks.get(block_number, {})
+
+    async def fetch_transaction_info(self, txid: str):
+        self.calls += 1
+        info = self.by_txid[txid]
+        return info if info["blockNumber"] <= self.solid else None
+
+
+async def per_txid(count: int) -> int:
+    chain = _MemoryChain(count)
+    pending = set(chain.by_txid)
+    while pending:
+        chain.solid += 1
+        for txid in list(pending):
+            if await chain.fetch_transaction_info(txid) is not None:
+                pending.discard(txid)
+    return chain.calls
+
+
+async def tracked(count: int) -> int:
+    chain = _MemoryChain(count)
+    tracker = ConfirmationTracker(chain, limit=8, deadline=5)
+    for txid in chain.by_txid:
+        tracker.track(txid, 0, 0)
+    while len(tracker):
+        await tracker.poll()
+        chain.solid += 1
+    return chain.calls
+
+
+async def main():
+    for count in SIZES:
+        start = time.perf_counter()
+        baseline = await per_txid(count)
+        batched = await tracked(count)
+        print(f"{count:>6} payouts: per-txid {baseline:>7} calls, tracker {batched:>4} calls "
+              f"({(time.perf_counter() - start) * 1000:.0f} ms)")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
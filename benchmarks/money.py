@@ -0,0 +1,81 @@
+"""
+Memory per account and transfer arithmetic: the previous Decimal representation
+(Amount object per balance, re-quantized on every read) against integer kopecks in slotted classes.
+
+Run from the project root:
+    python -m benchmarks.money
+"""
+import time
+import tracemalloc
+from decimal import Decimal, ROUND_HALF_UP
+
+from src.core.account.Account import Account
+from src.core.currency.Amount import Amount
+
+ACCOUNTS = 100_000
+TRANSFERS = 200_000
+
+
+class LegacyAmount:
+    def __init__(self, byn):
+        self._byn = Decimal(str(byn))
+
+    def get_byn_amount(self) -> Decimal:
+        return self._byn.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+class LegacyAccount:
+    def __init__(self, tg_id: int, is_blocked: bool = False, init_balance: Decimal = 0):
+        self._tg_id = tg_id
+        self._blocked = is_blocked
+        self._balance = LegacyAmount(init_balance)
+
+    def get_balance(self):
+        return self._balance.get_byn_amount()
+
+    def modify_balance(self, amount):
+        self._balance = LegacyAmount(self._balance.get_byn_amount() + Decimal(amount))
+
+
+def _memory_per_account(factory) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    accounts = [factory(i) for i in range(ACCOUNTS)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del accounts
+    return (after - before) / ACCOUNTS
+
+
+def _legacy_transfers(a: LegacyAccount, b: LegacyAccount, amount: LegacyAmount, max_debt: Decimal) -> float:
+    start = time.perf_counter()
+    for _ in range(TRANSFERS):
+        if a.get_balance() - amount.get_byn_amount() >= max_debt:
+            b.modify_balance(amount.get_byn_amount())
+            a.modify_balance(-amount.get_byn_amount())
+    return time.perf_counter() - start
+
+
+def _transfers(a: Account, b: Account, amount: Amount, max_debt: int) -> float:
+    start = time.perf_counter()
+    for _ in range(TRANSFERS):
+        if a.get_balance_kopecks() - amount.get_kopecks() >= max_debt:
+            b.modify_balance_kopecks(amount.get_kopecks())
+            a.modify_balance_kopecks(-amount.get_kopecks())
+    return time.perf_counter() - start
+
+
+def main():
+    legacy_memory = _memory_per_account(lambda i: LegacyAccount(i, False, Decimal("12.34")))
+    memory = _memory_per_account(lambda i: Account(i, False, Decimal("12.34")))
+    print(f"memory per account: decimal {legacy_memory:6.0f} B, kopecks {memory:6.0f} B")
+
+    legacy = _legacy_transfers(LegacyAccount(1, init_balance=Decimal("1000000")), LegacyAccount(2),
+                               LegacyAmount("1.25"), Decimal("-5"))
+    kopecks = _transfers(Account(1, init_balance=Decimal("1000000")), Account(2), Amount("1.25"), -500)
+    print(f"{TRANSFERS} transfers: decimal {legacy * 1e3:8.1f} ms, kopecks {kopecks * 1e3:8.1f} ms "
+          f"({legacy / kopecks:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Signing 2 000 concurrent payouts from 50 wallets:
+- LocalSigner, on a worker thread of the bot process;
+- SocketSigner against a signer process with 1 and 4 workers.
+Reports throughput and the longest event loop stall seen by a 1 ms ticker.
+
+Run from the project root:
+    python -m benchmarks.signing
+"""
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+from tronpy.keys import PrivateKey
+
+from src.core.crypto.tron.Signer import LocalSigner, SignerServer, SocketSigner
+
+WALLETS = 50
+SIGNATURES = 2_000
+
+
+def serve(keys, socket_path, workers):
+    server = SignerServer(keys, socket_path, workers)
+    try:
+        asyncio.run(server.serve_forever())
+    finally:
+        server.close()
+
+
+async def bench(signer, addresses, txids):
+    stall = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal stall
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            stall = max(stall, time.perf_counter() - start - 0.001)
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    signatures = await asyncio.gather(*(signer.sign(addresses[i % WALLETS], txid) for i, txid in enumerate(txids)))
+    elapsed = time.perf_counter() - start
+    done = True
+    await tick
+    await signer.close()
+    return signatures, elapsed, stall
+
+
+def main():
+    private_keys = [PrivateKey.random() for _ in range(WALLETS)]
+    keys = {key.public_key.to_base58check_address(): key.hex() for key in private_keys}
+    addresses = list(keys)
+    txids = [os.urandom(32).hex() for _ in range(SIGNATURES)]
+
+    signatures, elapsed, stall = asyncio.run(bench(LocalSigner(keys), addresses, txids))
+    expected = signatures
+    print(f"{'LocalSigner':<22} {SIGNATURES / elapsed:8.0f} signatures/s, longest loop stall {stall * 1e3:6.1f} ms")
+
+    fork = multiprocessing.get_context("fork")
+    for workers in (1, 4):
+        socket_path = os.path.join(tempfile.mkdtemp(), "signer.sock")
+        process = fork.Process(target=serve, args=(keys, socket_path, workers))
+        process.start()
+        while not os.path.exists(socket_path):
+            time.sleep(0.01)
+        try:
+            signatures, elapsed, stall = asyncio.run(bench(SocketSigner(socket_path, 10), addresses, txids))
+        finally:
+            process.terminate()
+            process.join()
+        assert signatures == expected, "signer process returned different signatures"
+        print(f"{f'SocketSigner, {workers} workers':<22} {SIGNATURES / elapsed:8.0f} signatures/s, "
+              f"longest loop stall {stall * 1e3:6.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Load/save cost of the accounts file: legacy JSON (object_hook + JSONEncoder, indent=2)
+against the compact schema-driven record codec.
+
+Run from the project root:
+    python -m benchmarks.storage_codec
+"""
+import time
+from decimal import Decimal
+
+from src.core.account.Account import Account
+from src.core.account.json_coder import AccountDecoder, AccountEncoder, AccountSchema
+from src.database.codec import JsonCodec, RecordCodec
+
+SIZES = (10_000, 100_000)
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def bench(size: int):
+    accounts = [Account(i, i % 3 == 0, Decimal(i % 1000) / 7) for i in range(size)]
+    legacy = JsonCodec(AccountDecoder.decode_hook, AccountEncoder)
+    records = RecordCodec(AccountSchema, legacy=legacy)
+
+    legacy_text, legacy_save = _timed(legacy.dumps, accounts)
+    _, legacy_load = _timed(legacy.loads, legacy_text)
+    records_text, records_save = _timed(records.dumps, accounts)
+    _, records_load = _timed(records.loads, records_text)
+    _, migrate_load = _timed(records.loads, legacy_text)
+
+    print(f"{size:>7} accounts")
+    print(f"  legacy : save {legacy_save * 1e3:8.1f} ms, load {legacy_load * 1e3:8.1f} ms, "
+          f"{len(legacy_text) / 1024:8.0f} KiB")
+    print(f"  records: save {records_save * 1e3:8.1f} ms, load {records_load * 1e3:8.1f} ms, "
+          f"{len(records_text) / 1024:8.0f} KiB")
+    print(f"  records reading legacy file: {migrate_load * 1e3:8.1f} ms")
+
+
+def main():
+    for size in SIZES:
+        bench(size)
+
+
+if __name__ == '__main__':
+    main()
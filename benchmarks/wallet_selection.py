@@ -0,0 +1,66 @@
+"""
+Cost of picking a wallet for a payment from a pool of 100 wallets, network excluded (states are known):
+- the former choose_wallet scan, with the address derived from the private key on every call;
+- the same scan over memoized TronWallet;
+- WalletIndex bisect lookup.
+
+Run from the project root:
+    python -m benchmarks.wallet_selection
+"""
+import time
+
+from tronpy.keys import PrivateKey
+
+from src.core.crypto.tron.TronWallet import TronWallet
+from src.core.crypto.tron.WalletIndex import WalletIndex
+from src.core.crypto.tron.WalletState import WalletState
+
+WALLETS = 100
+SELECTIONS = 2_000
+REQUIRED_BANDWIDTH = 280
+
+
+class LegacyTronWallet(TronWallet):
+    def get_address(self):
+        return PrivateKey.fromhex(self._private_key).public_key.to_base58check_address()
+
+
+def scan(wallets, states, amount_sun):
+    sufficient = [wallet for wallet in wallets if states[wallet.get_address()].get_balance_sun() >= amount_sun]
+    no_fees = [wallet for wallet in sufficient
+               if states[wallet.get_address()].get_free_bandwidth() >= REQUIRED_BANDWIDTH]
+    candidates = no_fees or sufficient
+    return min(candidates, key=lambda wallet: states[wallet.get_address()].get_balance_sun() - amount_sun)
+
+
+def bench(select) -> float:
+    start = time.perf_counter()
+    for i in range(SELECTIONS):
+        select((i % WALLETS) * 1_000_000)
+    return (time.perf_counter() - start) / SELECTIONS
+
+
+def main():
+    keys = [PrivateKey.random().hex() for _ in range(WALLETS)]
+    states = {}
+    for i, key in enumerate(keys):
+        address = TronWallet(key).get_address()
+        states[address] = WalletState(address, (i + 1) * 1_000_000, 0 if i % 2 else 600, 0, time.time())
+
+    legacy = [LegacyTronWallet(key) for key in keys]
+    memoized = [TronWallet(key) for key in keys]
+    index = WalletIndex(REQUIRED_BANDWIDTH)
+    for state in states.values():
+        index.update(state)
+
+    results = {
+        "scan, address derived every call": bench(lambda amount: scan(legacy, states, amount)),
+        "scan, memoized wallets": bench(lambda amount: scan(memoized, states, amount)),
+        "WalletIndex": bench(index.choose),
+    }
+    for name, seconds in results.items():
+        print(f"{WALLETS} wallets, {name:<34} {seconds * 1e6:10.1f} us per selection")
+
+
+if __name__ == '__main__':
+    main()
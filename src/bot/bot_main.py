@@ -1,13 +1,35 @@
-from telegram.ext import Application
+from telegram.ext import Application, ContextTypes
 
-from src.bot.dialogs.payment import get_payment_conversation
+from src.bot.dialogs.payment import get_payment_conversation, notify_payout
 from src.bot.dialogs.transfer import get_transfer_conversation
 from src.bot.handlers import *
+from src.core.crypto.tron.TronClient import REFERENCE_BLOCK_REFRESH
+from src.core.crypto.tron.TronManager import get_wallet_reconcile_interval, tron_manager
+from src.core.payout.PayoutService import payout_service
 import src.config.env.env
 import src.config.env.var_names
 from src.util.logger import logger
 
 
+async def on_startup(app: Application):
+    await tron_manager.client.connect()
+    await tron_manager.reconcile_wallets()
+    await payout_service.start(lambda payout: notify_payout(app.bot, payout))
+
+
+async def on_shutdown(app: Application):
+    await payout_service.stop()
+    await tron_manager.client.close()
+
+
+async def reconcile_wallets(context: ContextTypes.DEFAULT_TYPE):
+    await tron_manager.reconcile_wallets()
+
+
+async def refresh_reference_block(context: ContextTypes.DEFAULT_TYPE):
+    await tron_manager.client.refresh_reference_block()
+
+
 def start_bot():
     token = src.config.env.env.get_env_var(src.config.env.var_names.BOT_TOKEN)
     if not token:
@@ -16,7 +38,11 @@ def start_bot():
 
     logger.debug("BOT_TOKEN loaded")
 
-    app = Application.builder().token(token).build()
+    app = (Application.builder()
+           .token(token)
+           .post_init(on_startup)
+           .post_shutdown(on_shutdown)
+           .build())
 
     app.add_handler(ch_start)
     app.add_handler(ch_block)
@@ -25,10 +51,25 @@ def start_bot():
     app.add_handler(ch_get_account_balance)
     app.add_handler(ch_max_amount)
     app.add_handler(ch_wallets_info)
+    app.add_handler(ch_history)
+    app.add_handler(ch_stats)
+    app.add_handler(ch_payouts)
+    app.add_handler(ch_block_bulk)
+    app.add_handler(ch_unblock_bulk)
+    app.add_handler(ch_credit_bulk)
+    app.add_handler(mh_bulk_document)
 
     app.add_handler(get_transfer_conversation())
     app.add_handler(get_payment_conversation())
 
+    if app.job_queue is None:
+        logger.warning("JobQueue unavailable (install python-telegram-bot[job-queue]), "
+                       "wallets and reference block are not refreshed in background")
+    else:
+        interval = get_wallet_reconcile_interval()
+        app.job_queue.run_repeating(reconcile_wallets, interval=interval, first=interval)
+        app.job_queue.run_repeating(refresh_reference_block, interval=REFERENCE_BLOCK_REFRESH,
+                                    first=REFERENCE_BLOCK_REFRESH)
 
     logger.debug("polling...")
     app.run_polling()
@@ -1,4 +1,4 @@
-from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from telegram import Bot, Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import (
     ConversationHandler,
     CommandHandler,
@@ -8,17 +8,30 @@ from telegram.ext import (
 )
 from decimal import Decimal, InvalidOperation
 
+from src.bot.dialogs.replay import finish, reply_replayed
 from src.bot.middleware import require_account
 from src.config.env.env import get_env_var
 from src.core.account.AccountManager import account_manager
-from src.core.crypto.tron.TronClient import get_fee
-from src.core.crypto.tron.TronManager import tron_manager, PayResult
-from src.core.currency.Amount import Amount, amount_from_trx
+from src.core.crypto.tron.PaymentQuote import PaymentQuote
+from src.core.crypto.tron.TronManager import tron_manager
+from src.core.currency.Amount import amount_from_trx
+from src.core.currency.RateSnapshot import get_rate_snapshot
+from src.core.idempotency.IdempotencyStore import generate_transaction_id, idempotency_store
+from src.core.payout.Payout import Payout, STATUS_CONFIRMED, STATUS_REFUNDED, STATUS_REVIEW
+from src.core.payout.PayoutService import payout_service
 from src.util.logger import logger
 from datetime import datetime
 
 ADDRESS, AMOUNT, CONFIRMATION = range(3)
 
+
+def _drop_quote(context: CallbackContext):
+    """Снимает резерв котировки, если пользователь не дошел до оплаты."""
+    quote = context.user_data.pop("quote", None)
+    if quote is not None:
+        tron_manager.cancel_quote(quote)
+
+
 @require_account
 async def start_payment(update: Update, context: CallbackContext):
     user = update.effective_user
@@ -70,6 +83,7 @@ async def receive_amount(update: Update, context: CallbackContext):
 
     if amount_input.lower() == "отмена":
         logger.info(f"User {tg_id} cancelled payment dialog at amount step.")
+        _drop_quote(context)
         await update.message.reply_text("❌ *Перевод отменен*", parse_mode="Markdown",
                                         reply_markup=ReplyKeyboardRemove())
         return ConversationHandler.END
@@ -79,16 +93,19 @@ async def receive_amount(update: Update, context: CallbackContext):
         if amount_trx <= 0:
             raise ValueError("Сумма должна быть положительной")
 
-        amount = amount_from_trx(amount_trx)
+        # Котировка, списание и отправка считаются по одному снимку курса
+        amount = amount_from_trx(amount_trx, get_rate_snapshot())
         address = context.user_data["address"]
 
+        # Котировка откладывает сумму на кошельке до подтверждения, оплата пойдет с него же
+        _drop_quote(context)
         try:
-            _, fee_amount = tron_manager.choose_wallet(amount)
+            quote = await tron_manager.quote(amount)
         except ValueError:
             msg = (
                 f"❌ *Перевод отменен*. Недостаточно средств.\n"
                 f"Нужно: {amount.format_trx()} TRX\n"
-                f"Баланс: {tron_manager.get_max_payment_amount()} TRX"
+                f"Баланс: {await tron_manager.get_max_payment_amount()} TRX"
             )
             await update.message.reply_text(
                 msg,
@@ -104,12 +121,14 @@ async def receive_amount(update: Update, context: CallbackContext):
             logger.error("Not enough balance: " + amount.format_trx())
             return ConversationHandler.END
 
-        total_amount_to_pay = Amount(byn=(amount.get_byn_amount() + fee_amount.get_byn_amount()))
+        fee_amount = quote.get_fee()
+        total_amount_to_pay = quote.get_total()
 
-        context.user_data["payment_amount"] = amount
-        context.user_data["total_amount_to_pay"] = total_amount_to_pay
+        # Ключ идемпотентности котировки: повторное "OK" вернет первый результат
+        context.user_data["transaction_id"] = generate_transaction_id()
 
         if not account_manager.can_pay(tg_id, total_amount_to_pay):
+            tron_manager.cancel_quote(quote)
             await update.message.reply_text(
                 f"❌ *Перевод отменен*. Недостаточно средств.\n"
                 f"Нужно: {total_amount_to_pay.get_byn_amount():.2f} BYN\n"
@@ -119,6 +138,7 @@ async def receive_amount(update: Update, context: CallbackContext):
             )
             return ConversationHandler.END
 
+        context.user_data["quote"] = quote
         await update.message.reply_text(
             "✅ *Подтвердите перевод*:\n\n"
             f"Получатель: `{address}`\n"
@@ -150,68 +170,102 @@ async def confirm_transaction(update: Update, context: CallbackContext) -> int:
 
     if confirmation == "отмена":
         logger.info(f"User {tg_id} cancelled payment at confirmation step.")
+        _drop_quote(context)
         await update.message.reply_text("Перевод отменён.", reply_markup=ReplyKeyboardRemove())
         return ConversationHandler.END
 
     address = context.user_data["address"]
-    payment_amount: Amount = context.user_data["payment_amount"]
-    total_amount_to_pay: Amount = context.user_data["total_amount_to_pay"]
+    transaction_id = context.user_data["transaction_id"]
 
-    if not account_manager.subtract_from_balance(tg_id, total_amount_to_pay):
-        await update.message.reply_text(
-            f"❌ *Перевод отменен*. Недостаточно средств.\n"
-            f"Ваш баланс: {account_manager.get_byn_balance(tg_id):.2f} BYN",
-            parse_mode="Markdown",
-            reply_markup=ReplyKeyboardRemove(),
-        )
+    previous = idempotency_store.claim(tg_id, transaction_id, "payment")
+    if previous is not None:
+        await reply_replayed(update, previous)
         return ConversationHandler.END
 
-    pay_result = tron_manager.pay(address, payment_amount)
+    quote: PaymentQuote = context.user_data.get("quote")
+    if quote is None or quote.is_expired():
+        idempotency_store.release(tg_id, transaction_id)
+        _drop_quote(context)
+        await update.message.reply_text("⌛ *Котировка устарела*. Начните перевод заново: /payment",
+                                        parse_mode="Markdown", reply_markup=ReplyKeyboardRemove())
+        return ConversationHandler.END
 
-    if pay_result == PayResult.NOT_ENOUGH_BALANCE:
-        logger.critical(
-            f"CRITICAL: Not enough funds on service wallets for payment! Amount: {payment_amount}. User: {tg_id}")
-        account_manager.add_to_balance(tg_id, total_amount_to_pay)
-        await update.message.reply_text(
-            "❌ *Ошибка сервера*. На сервисных кошельках недостаточно средств. Повторите попытку позже. Средства возвращены на ваш баланс.",
-            parse_mode="Markdown",
-            reply_markup=ReplyKeyboardRemove(),
-        )
+    payment_amount = quote.get_amount()
+    total_amount_to_pay = quote.get_total()
+    try:
+        payout = await payout_service.submit(tg_id, transaction_id, address, quote)
+    except Exception:
+        idempotency_store.release(tg_id, transaction_id)
+        raise
+
+    if payout is None:
+        _drop_quote(context)
+        await finish(update, tg_id, transaction_id,
+                     f"❌ *Перевод отменен*. Недостаточно средств.\n"
+                     f"Ваш баланс: {account_manager.get_byn_balance(tg_id):.2f} BYN")
         return ConversationHandler.END
 
-    logger.info(f"Transaction confirmed for user {tg_id}: {payment_amount.format_trx()} TRX to {address}")
+    # Котировка теперь у выплаты: отправит ее обработчик outbox, результат придет отдельным сообщением
+    context.user_data.pop("quote", None)
+    logger.info(f"Transaction {transaction_id} queued as payout #{payout.get_id()} for user {tg_id}: "
+                f"{payment_amount.format_trx()} TRX to {address}")
+
+    await finish(update, tg_id, transaction_id,
+                 f"⏳ *Перевод принят*\n\n"
+                 f"Сумма: {payment_amount.format_trx()} TRX\n"
+                 f"Получатель: {address}\n"
+                 f"Списано: *{total_amount_to_pay.get_byn_amount():.2f} BYN*\n"
+                 f"Баланс: *{account_manager.get_byn_balance(tg_id):.2f} BYN*\n\n"
+                 f"О результате придет сообщение.")
+    return ConversationHandler.END
 
-    await update.message.reply_text(
-        f"✅ *Перевод выполнен*\n\n"
-        f"Сумма: {payment_amount.format_trx()} TRX\n"
-        f"Получатель: {address}\n"
-        f"Баланс: *{account_manager.get_byn_balance(tg_id):.2f} BYN*",
-        parse_mode="Markdown",
-        reply_markup=ReplyKeyboardRemove(),
-    )
 
+async def notify_payout(bot: Bot, payout: Payout):
+    """Сообщает пользователю и админу окончательный результат выплаты."""
     admin_id = get_env_var("ADMIN_ID")
-    admin_message = (
-        f"🔔 *Новый платеж 🔔*\n\n"
-        f"Отправитель: `{tg_id}`\n"
-        f"Получатель: `{address}`\n"
-        f"Сумма: *{context.user_data['total_amount_to_pay']} BYN*\n"
-        f"Дата: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} \n\n"
-    )
-    sent_message = await context.bot.send_message(
-        chat_id=admin_id,
-        text=admin_message,
-        parse_mode="Markdown"
-    )
-    await context.bot.pin_chat_message(chat_id=admin_id,
-                                       message_id=sent_message.message_id, disable_notification=True)
-
-    return ConversationHandler.END
+    status = payout.get_status()
+    if status == STATUS_CONFIRMED:
+        await bot.send_message(chat_id=payout.get_tg_id(),
+                               text=f"✅ *Перевод выполнен*\n\n"
+                                    f"Сумма: {payout.get_amount_trx().normalize():f} TRX\n"
+                                    f"Получатель: {payout.get_address()}\n"
+                                    f"Транзакция: `{payout.get_txid()}`",
+                               parse_mode="Markdown")
+        admin_message = (
+            f"🔔 *Новый платеж 🔔*\n\n"
+            f"Отправитель: `{payout.get_tg_id()}`\n"
+            f"Получатель: `{payout.get_address()}`\n"
+            f"Сумма: *{payout.get_debit_byn():.2f} BYN*\n"
+            f"Транзакция: `{payout.get_transaction_id()}`\n"
+            f"Кошелек: `{payout.get_wallet() or '-'}`\n"
+            f"Дата: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} \n\n"
+        )
+        sent_message = await bot.send_message(chat_id=admin_id, text=admin_message, parse_mode="Markdown")
+        await bot.pin_chat_message(chat_id=admin_id, message_id=sent_message.message_id, disable_notification=True)
+    elif status == STATUS_REFUNDED:
+        await bot.send_message(chat_id=payout.get_tg_id(),
+                               text=f"❌ *Перевод не выполнен*: {payout.get_amount_trx().normalize():f} TRX "
+                                    f"на {payout.get_address()}.\n"
+                                    f"Средства ({payout.get_debit_byn():.2f} BYN) возвращены на ваш баланс.",
+                               parse_mode="Markdown")
+        await bot.send_message(chat_id=admin_id,
+                               text=f"❌ Выплата #{payout.get_id()} не выполнена после {payout.get_attempts()} "
+                                    f"попыток ({payout.get_error()}), списание возвращено.\n"
+                                    f"Пользователь: {payout.get_tg_id()}, сумма: {payout.get_amount_trx()} TRX")
+    elif status == STATUS_REVIEW:
+        await bot.send_message(chat_id=payout.get_tg_id(),
+                               text=f"⏳ Перевод {payout.get_amount_trx().normalize():f} TRX на {payout.get_address()} "
+                                    f"задерживается и будет проверен администратором.")
+        await bot.send_message(chat_id=admin_id,
+                               text=f"⚠️ Выплата #{payout.get_id()} требует проверки: {payout.get_error()}.\n"
+                                    f"Пользователь: {payout.get_tg_id()}, получатель: {payout.get_address()}, "
+                                    f"сумма: {payout.get_amount_trx()} TRX, txid: {payout.get_txid() or '-'}")
 
 
 async def cancel(update: Update, context: CallbackContext) -> int:
     user = update.effective_user
     logger.info(f"User {user.id} cancelled the conversation.")
+    _drop_quote(context)
     await update.message.reply_text(
         "Действие отменено.",
         reply_markup=ReplyKeyboardRemove(),
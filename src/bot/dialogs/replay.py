@@ -0,0 +1,16 @@
+from telegram import Update, ReplyKeyboardRemove
+
+from src.core.idempotency.IdempotencyStore import STATUS_DONE, idempotency_store
+
+
+async def finish(update: Update, tg_id: int, transaction_id: str, text: str):
+    """Запоминает итог операции для повторных подтверждений и отправляет его пользователю."""
+    idempotency_store.complete(tg_id, transaction_id, text)
+    await update.message.reply_text(text, parse_mode="Markdown", reply_markup=ReplyKeyboardRemove())
+
+
+async def reply_replayed(update: Update, previous: tuple):
+    status, result = previous
+    if status != STATUS_DONE:
+        result = "⏳ *Операция уже выполняется*. Проверьте баланс: /balance"
+    await update.message.reply_text(result, parse_mode="Markdown", reply_markup=ReplyKeyboardRemove())
@@ -7,15 +7,16 @@ from telegram.ext import (
     filters,
 )
 
+from src.bot.dialogs.replay import finish, reply_replayed
 from src.bot.middleware import require_account
 from src.config.env.env import get_env_var
 from src.core.account.AccountManager import account_manager
 from src.core.currency.Amount import Amount
 from src.core.exceptions.AccountIsBlocked import AccountIsBlocked
 from src.core.exceptions.AccountNotFound import AccountNotFound
+from src.core.idempotency.IdempotencyStore import generate_transaction_id, idempotency_store
 from src.util.logger import logger
 from datetime import datetime
-import uuid
 
 # Состояния диалога
 RECIPIENT, AMOUNT = range(2)
@@ -57,6 +58,8 @@ async def receive_recipient(update: Update, context: CallbackContext) -> int:
     try:
         recipient_id = int(recipient_input)
         context.user_data["recipient_id"] = recipient_id
+        # Ключ идемпотентности: повторная отправка суммы не проведет перевод второй раз
+        context.user_data["transaction_id"] = generate_transaction_id()
         logger.debug(f"Recipient {recipient_id} selected by {tg_id}")
 
         await update.message.reply_text(
@@ -98,59 +101,7 @@ async def receive_amount(update: Update, context: CallbackContext) -> int:
         amount_byn = float(amount_input)
         if amount_byn <= 0:
             raise ValueError("Сумма должна быть положительной")
-
         amount = Amount(amount_byn)
-        recipient_id = context.user_data["recipient_id"]
-
-        if account_manager.transfer(tg_id, recipient_id, amount):
-            new_balance = account_manager.get_byn_balance(tg_id)
-            trx_amount = amount.format_trx()
-            message = (
-                f"✅ *Перевод выполнен* 🎉\n\n"
-                f"Сумма: *{amount.get_byn_amount()} BYN* ({trx_amount:.2f} TRX)\n"
-                f"Получатель: `{recipient_id}`\n"
-                f"Ваш баланс: *{new_balance} BYN*\n\n"
-            )
-            await update.message.reply_text(
-                message,
-                parse_mode="Markdown",
-                reply_markup=ReplyKeyboardRemove(),
-            )
-            admin_id = get_env_var("ADMIN_ID")
-            admin_message = (
-                f"🔔 *Новый перевод 🔔*\n\n"
-                f"Отправитель: `{tg_id}`\n"
-                f"Получатель: `{recipient_id}`\n"
-                f"Сумма: *{amount.get_byn_amount()} BYN* ({trx_amount:.2f} TRX)\n"
-                f"Дата: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} \n\n"
-            )
-            await context.bot.send_message(
-                chat_id=admin_id,
-                text=admin_message,
-                parse_mode="Markdown"
-            )
-            await context.bot.send_message(
-                chat_id=recipient_id,
-                text=f"🔔 Перевод от {tg_id}: *{amount.get_byn_amount()} BYN* ({amount.format_trx():.2f} TRX)",
-                parse_mode="Markdown"
-            )
-            logger.info(f"Transfer {amount.get_byn_amount()} BYN from {tg_id} to {recipient_id} succeeded")
-        else:
-            await update.message.reply_text(
-                "❌ *Ошибка перевода: недостаточно средств*",
-                parse_mode="Markdown",
-                reply_markup=ReplyKeyboardRemove(),
-            )
-            logger.error(f"Transfer failed for {tg_id}: insufficient funds")
-        return ConversationHandler.END
-    except AccountIsBlocked:
-        await update.message.reply_text(
-            "❌ *Ошибка: аккаунт заблокирован*",
-            parse_mode="Markdown",
-            reply_markup=ReplyKeyboardRemove(),
-        )
-        logger.error(f"Access from blocked account: {tg_id}")
-        return ConversationHandler.END
     except ValueError as e:
         logger.warning(f"Invalid amount input {amount_input} by {tg_id}: {e}")
         await update.message.reply_text(
@@ -160,6 +111,62 @@ async def receive_amount(update: Update, context: CallbackContext) -> int:
         )
         return AMOUNT
 
+    recipient_id = context.user_data["recipient_id"]
+    transaction_id = context.user_data["transaction_id"]
+
+    previous = idempotency_store.claim(tg_id, transaction_id, "transfer")
+    if previous is not None:
+        await reply_replayed(update, previous)
+        return ConversationHandler.END
+
+    try:
+        transferred = await account_manager.transfer_async(tg_id, recipient_id, amount)
+    except AccountIsBlocked:
+        await finish(update, tg_id, transaction_id, "❌ *Ошибка: аккаунт заблокирован*")
+        logger.error(f"Access from blocked account: {tg_id}")
+        return ConversationHandler.END
+    except Exception:
+        # Исключения бросаются до изменения баланса, операцию можно повторить
+        idempotency_store.release(tg_id, transaction_id)
+        raise
+
+    if not transferred:
+        await finish(update, tg_id, transaction_id, "❌ *Ошибка перевода: недостаточно средств*")
+        logger.error(f"Transfer failed for {tg_id}: insufficient funds")
+        return ConversationHandler.END
+
+    await account_manager.flush()
+    new_balance = account_manager.get_byn_balance(tg_id)
+    trx_amount = amount.format_trx()
+    message = (
+        f"✅ *Перевод выполнен* 🎉\n\n"
+        f"Сумма: *{amount.get_byn_amount()} BYN* ({trx_amount} TRX)\n"
+        f"Получатель: `{recipient_id}`\n"
+        f"Ваш баланс: *{new_balance} BYN*\n\n"
+    )
+    await finish(update, tg_id, transaction_id, message)
+    admin_id = get_env_var("ADMIN_ID")
+    admin_message = (
+        f"🔔 *Новый перевод 🔔*\n\n"
+        f"Отправитель: `{tg_id}`\n"
+        f"Получатель: `{recipient_id}`\n"
+        f"Сумма: *{amount.get_byn_amount()} BYN* ({trx_amount} TRX)\n"
+        f"Транзакция: `{transaction_id}`\n"
+        f"Дата: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} \n\n"
+    )
+    await context.bot.send_message(
+        chat_id=admin_id,
+        text=admin_message,
+        parse_mode="Markdown"
+    )
+    await context.bot.send_message(
+        chat_id=recipient_id,
+        text=f"🔔 Перевод от {tg_id}: *{amount.get_byn_amount()} BYN* ({trx_amount} TRX)",
+        parse_mode="Markdown"
+    )
+    logger.info(f"Transfer {transaction_id} {amount.get_byn_amount()} BYN from {tg_id} to {recipient_id} succeeded")
+    return ConversationHandler.END
+
 async def cancel(update: Update, context: CallbackContext) -> int:
     user = update.effective_user
     tg_id = user.id
@@ -172,9 +179,6 @@ async def cancel(update: Update, context: CallbackContext) -> int:
     )
     return ConversationHandler.END
 
-def generate_transaction_id():
-    return str(uuid.uuid4())[:8]
-
 def get_transfer_conversation():
     return ConversationHandler(
         entry_points=[CommandHandler("transfer", start_transfer)],
@@ -1,7 +1,24 @@
+import asyncio
+import io
+from datetime import datetime
+
 from src.bot.middleware import require_account, admin_command
 from src.core.crypto.tron.TronManager import tron_manager
 from src.util.logger import logger
 from src.core.account.AccountManager import account_manager
+from src.core.account.csv_io import read_credits, read_ids
+from src.core.currency.Amount import Amount, kopecks_to_byn, sun_to_trx
+from src.core.history.HistoryEntry import HistoryKind
+from src.core.payout.Payout import STATUS_DEAD, STATUS_REVIEW
+from src.core.payout.PayoutOutbox import payout_outbox
+
+HISTORY_PAGE_SIZE = 10
+_HISTORY_LABELS = {
+    HistoryKind.TRANSFER: "Перевод",
+    HistoryKind.PAYMENT: "Платеж",
+    HistoryKind.REFUND: "Возврат",
+    HistoryKind.CREDIT: "Пополнение",
+}
 
 async def start(update, context):
     logger.log(f"Пользователь {update.effective_user.id} отправил команду /start")
@@ -16,21 +33,86 @@ async def get_account_balance(update, context):
         return
     await context.bot.send_message(text=f"💰 Баланс: {balance} BYN", chat_id=update.effective_user.id)
 
+@require_account
+async def history(update, context):
+    tg_id = update.effective_user.id
+    before_id = None
+    if context.args:
+        try:
+            before_id = int(context.args[0])
+        except ValueError:
+            await update.message.reply_text("Использование: /history [номер операции]")
+            return
+
+    entries = account_manager.history.get_page(tg_id, before_id=before_id, limit=HISTORY_PAGE_SIZE)
+    if not entries:
+        await update.message.reply_text("📜 Операций нет.")
+        return
+
+    msg = "📜 *История операций*\n\n"
+    for entry in entries:
+        counterparty = f" `{entry.counterparty}`" if entry.counterparty else ""
+        msg += (f"#{entry.entry_id} {entry.created_at:%Y-%m-%d %H:%M} "
+                f"{_HISTORY_LABELS[entry.kind]}{counterparty}: *{entry.amount:+.2f} BYN*\n")
+    if len(entries) == HISTORY_PAGE_SIZE:
+        msg += f"\nДальше: /history {entries[-1].entry_id}"
+
+    await update.message.reply_text(msg, parse_mode="Markdown")
+
 async def get_max_payment_amount(update, context):
 
-    await context.bot.send_message(text=f"Максимальная сумма для оплаты: {tron_manager.get_max_payment_amount()}",
+    await context.bot.send_message(text=f"Максимальная сумма для оплаты: {await tron_manager.get_max_payment_amount()}",
                                    chat_id=update.effective_user.id)
 
 @admin_command
 async def get_wallets_info(update, context):
+    states = await tron_manager.query_wallet_states(tron_manager.addresses)
+
     msg = ""
-    for wallet in tron_manager.wallets:
-        msg += (f"Wallet: {wallet.get_address()}\n"
-                f"Balance: {tron_manager.client.get_balance(wallet.get_address())}\n"
-                f"Bandwidth: {tron_manager.client.estimate_bandwidth_usage(wallet.get_address())}\n\n\n")
+    for address in tron_manager.addresses:
+        msg += f"Wallet: {address}\n"
+        state = states.results.get(address)
+        if state is None:
+            msg += f"⚠️ {states.errors[address]!r}\n\n\n"
+            continue
+        msg += (f"Balance: {state.get_balance()}\n"
+                f"Bandwidth: {state.get_free_bandwidth()}\n"
+                f"Staked: {sun_to_trx(state.get_staked_sun())} TRX\n"
+                f"Updated: {datetime.fromtimestamp(state.get_updated_at()):%H:%M:%S}\n\n\n")
 
     await context.bot.send_message(text=msg, chat_id=update.effective_user.id)
 
+@admin_command
+async def stats(update, context):
+    verified = ""
+    if context.args and context.args[0] == "verify":
+        verified = "✅ Сверка пройдена\n\n" if await account_manager.verify_stats_async() else "⚠️ Агрегаты пересчитаны\n\n"
+
+    account_stats = await account_manager.get_stats_async()
+    liabilities = Amount(byn=account_stats.liabilities)
+    await context.bot.send_message(
+        text=f"{verified}"
+             f"Аккаунтов: {account_stats.accounts}\n"
+             f"Заблокировано: {account_stats.blocked}\n"
+             f"В долгу: {account_stats.in_debt} (лимит {kopecks_to_byn(account_stats.debt_limit_kopecks)} BYN)\n\n"
+             f"Обязательства: {account_stats.liabilities:.2f} BYN ({liabilities.format_trx()} TRX)\n"
+             f"Долги: {account_stats.debt:.2f} BYN\n"
+             f"Итого: {account_stats.get_net_liabilities():.2f} BYN\n\n"
+             f"Максимальная сумма для оплаты: {await tron_manager.get_max_payment_amount()} TRX",
+        chat_id=update.effective_user.id)
+
+@admin_command
+async def payouts(update, context):
+    counts = payout_outbox.counts()
+    msg = "📤 *Выплаты*\n\n"
+    msg += "\n".join(f"{status}: {count}" for status, count in sorted(counts.items())) or "Выплат нет."
+    for status in (STATUS_REVIEW, STATUS_DEAD):
+        for payout in payout_outbox.list(status):
+            msg += (f"\n\n#{payout.get_id()} {status}: {payout.get_amount_trx()} TRX -> `{payout.get_address()}`\n"
+                    f"Пользователь: `{payout.get_tg_id()}`, попыток: {payout.get_attempts()}\n"
+                    f"Ошибка: {payout.get_error() or '-'}, txid: `{payout.get_txid() or '-'}`")
+    await update.message.reply_text(msg, parse_mode="Markdown")
+
 @admin_command
 async def block(update, context):
     tg_id = update.effective_message.text.replace('/block ', '')
@@ -45,6 +127,65 @@ async def unblock(update, context):
     await context.bot.send_message(text=f"Пользователь разблокирован.",
                                    chat_id=update.effective_user.id)
 
+async def _read_bulk_lines(update) -> io.StringIO:
+    """
+    Строки для массовой операции: CSV документ или строки/слова после команды
+    """
+    message = update.effective_message
+    if message.document:
+        content = await (await message.document.get_file()).download_as_bytearray()
+        return io.StringIO(content.decode("utf-8-sig"))
+    return io.StringIO("\n".join((message.text or "").split()[1:]))
+
+def _count_valid(lines: io.StringIO, parse) -> int:
+    # Проверочный проход по строкам без их накопления: с ошибкой в файле не применяется ничего
+    count = sum(1 for _ in parse(lines))
+    lines.seek(0)
+    return count
+
+async def _run_bulk(update, context, parse, operation, usage: str):
+    try:
+        lines = await _read_bulk_lines(update)
+        if not await asyncio.to_thread(_count_valid, lines, parse):
+            raise ValueError(usage)
+        result = await operation(parse(lines))
+    except ValueError as e:
+        await context.bot.send_message(text=f"⚠️ {e}", chat_id=update.effective_user.id)
+        return
+    await context.bot.send_message(text=result, chat_id=update.effective_user.id)
+
+@admin_command
+async def block_bulk(update, context):
+    async def operation(tg_ids):
+        changed, missing = await account_manager.bulk_set_blocked_async(tg_ids, True)
+        return f"Заблокировано: {changed}, не найдено: {missing}."
+    await _run_bulk(update, context, read_ids, operation, "Использование: /block_bulk id1 id2 ... или CSV файл")
+
+@admin_command
+async def unblock_bulk(update, context):
+    async def operation(tg_ids):
+        changed, _ = await account_manager.bulk_set_blocked_async(tg_ids, False, create_missing=True)
+        return f"Разблокировано: {changed}."
+    await _run_bulk(update, context, read_ids, operation, "Использование: /unblock_bulk id1 id2 ... или CSV файл")
+
+@admin_command
+async def credit_bulk(update, context):
+    async def operation(credits):
+        count, total = await account_manager.bulk_credit_async(credits)
+        return f"Начислено: {count} операций на {total:.2f} BYN."
+    await _run_bulk(update, context, read_credits, operation, "Использование: /credit_bulk id,сумма ... или CSV файл")
+
+async def bulk_document(update, context):
+    # Команда в подписи к CSV файлу
+    command = update.effective_message.caption.split()[0].lstrip("/").split("@")[0]
+    await _BULK_COMMANDS[command](update, context)
+
+_BULK_COMMANDS = {
+    "block_bulk": block_bulk,
+    "unblock_bulk": unblock_bulk,
+    "credit_bulk": credit_bulk,
+}
+
 async def get_id(update, context):
     await update.message.reply_text(
         f"ID: `{update.effective_user.id}`",
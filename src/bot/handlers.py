@@ -1,4 +1,4 @@
-from telegram.ext import CommandHandler
+from telegram.ext import CommandHandler, MessageHandler, filters
 from src.bot.functions import *
 
 ch_start = CommandHandler("start", start)
@@ -8,3 +8,11 @@ ch_unblock = CommandHandler("unblock", unblock)
 ch_get_account_balance = CommandHandler("balance", get_account_balance)
 ch_max_amount = CommandHandler("max_amount", get_max_payment_amount)
 ch_wallets_info = CommandHandler("wallets_info", get_wallets_info)
+ch_history = CommandHandler("history", history)
+ch_stats = CommandHandler("stats", stats)
+ch_payouts = CommandHandler("payouts", payouts)
+ch_block_bulk = CommandHandler("block_bulk", block_bulk)
+ch_unblock_bulk = CommandHandler("unblock_bulk", unblock_bulk)
+ch_credit_bulk = CommandHandler("credit_bulk", credit_bulk)
+mh_bulk_document = MessageHandler(filters.Document.ALL & filters.CaptionRegex(r"^/(block|unblock|credit)_bulk\b"),
+                                  bulk_document)
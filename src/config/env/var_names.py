@@ -2,4 +2,7 @@ BOT_TOKEN="BOT_TOKEN"
 TRON_NETWORK="TRON_NETWORK"
 TRONGRID_API_KEY="TRONGRID_API_KEY"
 ADMIN_ID="ADMIN_ID"
-LOG_LVL="LOGLVL"
\ No newline at end of file
+LOG_LVL="LOGLVL"
+STORAGE_MODE="STORAGE_MODE"
+STORAGE_WRITE_BEHIND="STORAGE_WRITE_BEHIND"
+SIGNER_SOCKET="SIGNER_SOCKET"
@@ -5,6 +5,10 @@ from src.config import directories
 _DATA_ACCOUNTS_FILENAME = "/accounts.json"
 _DATA_TRX_CONFIG_FILENAME = "/trx_config.json"
 _DATA_TRX_WALLETS_FILENAME = "/trx_wallets.json"
+_DATA_DATABASE_FILENAME = "/storage.sqlite3"
+_DATA_HISTORY_FILENAME = "/history.sqlite3"
+_DATA_IDEMPOTENCY_FILENAME = "/idempotency.sqlite3"
+_DATA_PAYOUTS_FILENAME = "/payouts.sqlite3"
 
 def wrap_filename(filename: str):
     if not os.path.isfile(filename):
@@ -20,3 +24,15 @@ def get_trx_config_filename():
 
 def get_trx_wallets_filename():
     return wrap_filename(directories.get_data() + _DATA_TRX_WALLETS_FILENAME)
+
+def get_database_filename():
+    return directories.get_data() + _DATA_DATABASE_FILENAME
+
+def get_history_filename():
+    return directories.get_data() + _DATA_HISTORY_FILENAME
+
+def get_idempotency_filename():
+    return directories.get_data() + _DATA_IDEMPOTENCY_FILENAME
+
+def get_payouts_filename():
+    return directories.get_data() + _DATA_PAYOUTS_FILENAME
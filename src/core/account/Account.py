@@ -1,6 +1,6 @@
 from decimal import Decimal
 
-from src.core.currency.Amount import Amount
+from src.core.currency.Amount import Amount, byn_to_kopecks, kopecks_to_byn
 
 
 _STR_TG_ID = "tg_id"
@@ -8,16 +8,24 @@ _STR_BLOCKED = "blocked"
 _STR_BALANCE = "balance"
 
 class Account:
-    _tg_id = 1
-    _blocked = False
-    _balance = Amount(0)
+    # Баланс хранится целым числом копеек, в Decimal переводится только при выводе.
+    # __weakref__ - для RecordCache ленивых хранилищ
+    __slots__ = ("_tg_id", "_blocked", "_balance", "__weakref__")
 
     def __init__(self, tg_id: int,
                  is_blocked: bool = False,
                  init_balance: Decimal = 0):
         self._tg_id = tg_id
         self._blocked = is_blocked
-        self._balance = Amount(init_balance)
+        self._balance = byn_to_kopecks(init_balance)
+
+    @classmethod
+    def from_kopecks(cls, tg_id: int, is_blocked: bool, balance_kopecks: int) -> "Account":
+        account = cls.__new__(cls)
+        account._tg_id = tg_id
+        account._blocked = is_blocked
+        account._balance = balance_kopecks
+        return account
 
     def block(self):
         self._blocked = True
@@ -29,30 +37,38 @@ class Account:
         return self._blocked
 
     def get_balance(self):
-        return self._balance.get_byn_amount()
+        return kopecks_to_byn(self._balance)
 
-    def get_balance_amount(self):
+    def get_balance_kopecks(self) -> int:
         return self._balance
 
+    def get_balance_amount(self):
+        return Amount.from_kopecks(self._balance)
+
     def get_id(self):
         return self._tg_id
 
+    def to_row(self) -> tuple:
+        """(tg_id, blocked, balance in kopecks): строка AccountSchema, снимается под блокировкой хранилища."""
+        return self._tg_id, self._blocked, self._balance
+
     def to_dict(self):
         return {
             _STR_TG_ID: self._tg_id,
             _STR_BLOCKED: self._blocked,
-            _STR_BALANCE: self._balance.to_dict()
+            _STR_BALANCE: self.get_balance_amount().to_dict()
         }
 
     def modify_balance(self, amount: Decimal | float):
-        self._balance = Amount(self._balance.get_byn_amount() + Decimal(amount))
+        self._balance += byn_to_kopecks(amount)
+
+    def modify_balance_kopecks(self, kopecks: int):
+        self._balance += kopecks
 
     @classmethod
     def from_dict(cls, data: dict):
-        return Account(tg_id=data[_STR_TG_ID],
-                       is_blocked=data[_STR_BLOCKED],
-                       init_balance=data[_STR_BALANCE].get_byn_amount())
+        return Account.from_kopecks(data[_STR_TG_ID], data[_STR_BLOCKED], data[_STR_BALANCE].get_kopecks())
 
     def __repr__(self):
         return (f"Account [id {self._tg_id}] is [{"blocked" if self._blocked else "not blocked"}]. "
-                f"Balance: {self._balance.get_byn_amount()}")
+                f"Balance: {self.get_balance()}")
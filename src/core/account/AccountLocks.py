@@ -0,0 +1,50 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+
+class AccountLocks:
+    """
+    asyncio locks per tg_id. A lock exists only while someone holds or waits for it,
+    so the table does not grow with the number of accounts.
+    """
+
+    def __init__(self):
+        # tg_id -> [lock, число держащих и ожидающих]
+        self._locks: Dict[int, List] = {}
+
+    def _acquire_ref(self, tg_id: int) -> asyncio.Lock:
+        entry = self._locks.get(tg_id)
+        if entry is None:
+            entry = self._locks[tg_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        return entry[0]
+
+    def _release_ref(self, tg_id: int):
+        entry = self._locks[tg_id]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._locks[tg_id]
+
+    @asynccontextmanager
+    async def hold(self, *tg_ids: int):
+        """
+        Holds the locks of all given accounts. Locks are taken in ascending tg_id order,
+        so two transfers between the same pair of accounts cannot deadlock.
+        """
+        ids = sorted(set(tg_ids))
+        locks = [self._acquire_ref(tg_id) for tg_id in ids]
+        held = []
+        try:
+            for lock in locks:
+                await lock.acquire()
+                held.append(lock)
+            yield
+        finally:
+            for lock in reversed(held):
+                lock.release()
+            for tg_id in ids:
+                self._release_ref(tg_id)
+
+    def __len__(self):
+        return len(self._locks)
@@ -1,19 +1,31 @@
-from typing import List, Optional
+import asyncio
+import copy
+from itertools import batched
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from decimal import Decimal
 
 import src.util.logger
 from src.core.account.Account import Account
-from src.config.files import get_accounts_filename
-from src.core.account.json_coder import AccountEncoder, AccountDecoder
-from src.core.currency.Amount import Amount
+from src.core.account.AccountLocks import AccountLocks
+from src.core.account.AccountStats import AccountStats
+from src.config.files import get_accounts_filename, get_history_filename
+from src.core.account.json_coder import AccountEncoder, AccountDecoder, AccountSchema
+from src.core.currency.Amount import Amount, byn_to_kopecks, kopecks_to_byn
 from src.core.exceptions.AccountIsBlocked import AccountIsBlocked
 from src.core.exceptions.AccountNotFound import AccountNotFound
+from src.core.history.HistoryEntry import HistoryKind
+from src.core.history.HistoryStore import HistoryStore
 from src.database.JsonFileStorage import JsonFileStorage
+from src.database.LazyRecords import LazyRecords
+from src.database.codec import JsonCodec, RecordCodec
+from src.database.storage import create_record_storage
 from src.core.is_admin import is_admin
 import src.util.configs
 
 logger = src.util.logger.logger
 
+BULK_BATCH_SIZE = 1000
+
 
 def get_max_debt() -> Decimal:
     # Загружаем из конфига, если есть, иначе значение по умолчанию
@@ -21,28 +33,135 @@ def get_max_debt() -> Decimal:
     return Decimal(str(max_debt_val))
 
 
+def get_max_debt_kopecks() -> int:
+    return byn_to_kopecks(get_max_debt())
+
+
 class AccountManager:
-    def __init__(self, storage: JsonFileStorage = None):
-        self.storage = storage or JsonFileStorage(
+    def __init__(self, storage: JsonFileStorage = None, history: HistoryStore = None):
+        self.storage = storage or create_record_storage(
             file_path=get_accounts_filename(),
+            table="accounts",
+            key=Account.get_id,
             default_value=[],
             decode_hook=AccountDecoder.decode_hook,
-            encoder=AccountEncoder
+            encoder=AccountEncoder,
+            codec=RecordCodec(AccountSchema, legacy=JsonCodec(AccountDecoder.decode_hook, AccountEncoder)),
+            lazy=True
         )
-        self.accounts: List[Account] = self.storage.data
+        self.history = history or HistoryStore(get_history_filename())
+        self.locks = AccountLocks()
+        self.accounts: List[Account] = []
+        self._index: Dict[int, Account] | LazyRecords = {}
+        self._stats: Optional[AccountStats] = None
+        self._set_accounts(self.storage.data)
         logger.debug(f"AccountManager loaded. {len(self.accounts)} accounts")
 
+    def _set_accounts(self, accounts: List[Account] | LazyRecords):
+        self.accounts = accounts
+        if isinstance(accounts, LazyRecords):
+            # Хранилище (sharded, sqlite) само индексирует tg_id и поднимает аккаунты по требованию,
+            # агрегаты посчитаются при первом запросе, чтобы не читать все записи на старте
+            self._index = accounts
+            self._stats = None
+            return
+        self._index = {}
+        for account in accounts:
+            self._index.setdefault(account.get_id(), account)
+        if len(self._index) != len(accounts):
+            logger.warning(f"Duplicate tg_id in accounts storage: {len(accounts) - len(self._index)} entries shadowed")
+        self._stats = AccountStats.recompute(self._index.values(), get_max_debt_kopecks())
+
+    def iter_accounts(self) -> Iterator[Account]:
+        """Все аккаунты по одному разу; в режимах sharded и sqlite читаются потоком с диска."""
+        if isinstance(self._index, dict):
+            return iter(self._index.values())
+        return iter(self.accounts)
+
+    def _current_stats(self) -> AccountStats:
+        # Вызывается под storage.lock: изменения балансов не проходят мимо пересчета и его присваивания
+        stats = self._stats
+        if stats is None or stats.debt_limit_kopecks != get_max_debt_kopecks():
+            self._stats = stats = AccountStats.recompute(self.iter_accounts(), get_max_debt_kopecks())
+        return stats
+
+    def get_stats(self) -> AccountStats:
+        """
+        Копия накопленных агрегатов. Полный пересчет (O(n)) - при первом запросе в ленивых режимах
+        и после смены max_debt в конфиге.
+        """
+        with self.storage.lock:
+            return copy.copy(self._current_stats())
+
+    def verify_stats(self) -> bool:
+        """
+        Сверяет накопленные агрегаты с полным пересчетом.
+        При расхождении пишет ошибку и заменяет агрегаты пересчитанными.
+        Все под storage.lock: изменение баланса не может попасть между пересчетом и заменой.
+        """
+        with self.storage.lock:
+            current = self._current_stats()
+            recomputed = AccountStats.recompute(self.iter_accounts(), current.debt_limit_kopecks)
+            if current == recomputed:
+                return True
+            logger.error(f"Account stats drifted: {current}, recomputed: {recomputed}")
+            self._stats = recomputed
+            return False
+
+    def _modify_balance(self, account: Account, kopecks: int):
+        old_balance = account.get_balance_kopecks()
+        account.modify_balance_kopecks(kopecks)
+        if self._stats is not None:
+            self._stats.on_balance_change(old_balance, account.get_balance_kopecks())
+
+    def _compare_and_set(self, account: Account, expected: int, new: int) -> bool:
+        # Вызывается под storage.lock
+        if account.get_balance_kopecks() != expected:
+            return False
+        self._modify_balance(account, new - expected)
+        return True
+
+    def compare_and_set_balance(self, tg_id: int, expected_kopecks: int, new_kopecks: int) -> bool:
+        """
+        Устанавливает баланс, только если он все еще равен expected_kopecks.
+        Возвращает False, если аккаунта нет или баланс успели изменить. В историю не пишет.
+        """
+        account = self.find_account(tg_id)
+        if account is None:
+            return False
+        with self.storage.lock:
+            if not self._compare_and_set(account, expected_kopecks, new_kopecks):
+                return False
+            self.storage.commit(account)
+        return True
+
+    def _set_blocked(self, account: Account, blocked: bool):
+        was_blocked = account.is_blocked()
+        if blocked:
+            account.block()
+        else:
+            account.unblock()
+        if self._stats is not None:
+            self._stats.on_blocked_change(was_blocked, blocked)
+
+    def reload(self):
+        self.storage.reload()
+        self._set_accounts(self.storage.data)
+        logger.debug(f"AccountManager reloaded. {len(self.accounts)} accounts")
+
+    async def flush(self):
+        """Waits until all account changes are durable on disk."""
+        await self.storage.flush_async()
+
     def find_account(self, tg_id: int) -> Optional[Account]:
-        for account in self.accounts:
-            if account.get_id() == tg_id:
-                return account
-        return None
+        return self._index.get(tg_id)
 
     def block(self, tg_id: int):
         account = self.find_account(tg_id)
         if account:
-            account.block()
-            self.storage.data = self.accounts
+            with self.storage.lock:
+                self._set_blocked(account, True)
+                self.storage.commit(account)
             logger.log(f"Account {tg_id} is blocked.")
         else:
             logger.warning(f"Attempted to block non-existent account {tg_id}.")
@@ -50,8 +169,9 @@ class AccountManager:
     def unblock(self, tg_id: int):
         account = self.find_account(tg_id)
         if account:
-            account.unblock()
-            self.storage.data = self.accounts
+            with self.storage.lock:
+                self._set_blocked(account, False)
+                self.storage.commit(account)
             logger.log(f"Account {tg_id} is unblocked.")
         else:
             logger.warning(f"Attempted to unblock non-existent account {tg_id}.")
@@ -71,11 +191,88 @@ class AccountManager:
 
         # Используем Decimal для баланса
         account = Account(tg_id=tg_id, init_balance=init_balance, is_blocked=is_blocked)
-        self.accounts.append(account)
-        self.storage.data = self.accounts
+        with self.storage.lock:
+            # Аккаунт мог создать параллельный перевод
+            existing = self.find_account(tg_id)
+            if existing is not None:
+                return existing
+            self._register(account)
+            self.storage.commit(account)
         logger.info(f"Account created: {account}")
         return account
 
+    def _register(self, account: Account):
+        self.accounts.append(account)
+        self._index[account.get_id()] = account
+        if self._stats is not None:
+            self._stats.on_added(account)
+
+    def bulk_set_blocked(self, tg_ids: Iterable[int], blocked: bool, create_missing: bool = False,
+                         batch_size: int = BULK_BATCH_SIZE) -> Tuple[int, int]:
+        """
+        Блокирует или разблокирует аккаунты пачками, каждая пачка сохраняется одним коммитом.
+        create_missing - создать отсутствующие аккаунты (массовое подключение пользователей).
+        Возвращает (изменено, не найдено).
+        """
+        changed = missing = 0
+        for batch in batched(tg_ids, batch_size):
+            batch_changed, batch_missing = self._set_blocked_batch(batch, blocked, create_missing)
+            changed += batch_changed
+            missing += batch_missing
+        logger.log(f"Bulk {'block' if blocked else 'unblock'}: {changed} changed, {missing} not found")
+        return changed, missing
+
+    def _set_blocked_batch(self, batch: Tuple[int, ...], blocked: bool, create_missing: bool) -> Tuple[int, int]:
+        touched = []
+        missing = 0
+        with self.storage.lock:
+            for tg_id in batch:
+                account = self.find_account(tg_id)
+                if account is None:
+                    if not create_missing:
+                        missing += 1
+                        continue
+                    account = Account(tg_id=tg_id, is_blocked=blocked)
+                    self._register(account)
+                elif account.is_blocked() == blocked:
+                    continue
+                else:
+                    self._set_blocked(account, blocked)
+                touched.append(account)
+            self.storage.commit(*touched)
+        return len(touched), missing
+
+    def bulk_credit(self, credits: Iterable[Tuple[int, Decimal]],
+                    batch_size: int = BULK_BATCH_SIZE) -> Tuple[int, Decimal]:
+        """
+        Начисляет суммы пачками, каждая пачка сохраняется одним коммитом.
+        Отсутствующие аккаунты создаются заблокированными, как при переводе.
+        Возвращает (число начислений, общая сумма).
+        """
+        count, total = 0, 0
+        for batch in batched(credits, batch_size):
+            total += self._credit_batch(batch)
+            count += len(batch)
+        logger.log(f"Bulk credit: {count} credits, {kopecks_to_byn(total)} BYN")
+        return count, kopecks_to_byn(total)
+
+    def _credit_batch(self, batch: Tuple[Tuple[int, Decimal], ...]) -> int:
+        """Начисляет пачку одним коммитом, возвращает сумму в копейках."""
+        batch = [(tg_id, byn_to_kopecks(amount)) for tg_id, amount in batch]
+        touched = {}
+        with self.storage.lock:
+            for tg_id, kopecks in batch:
+                account = self.find_account(tg_id)
+                if account is None:
+                    account = Account(tg_id=tg_id, is_blocked=True)
+                    self._register(account)
+                self._modify_balance(account, kopecks)
+                touched[tg_id] = account
+            self.storage.commit(*touched.values())
+        self.history.record_many((tg_id, HistoryKind.CREDIT, kopecks_to_byn(kopecks), None, "bulk")
+                                 for tg_id, kopecks in batch)
+        return sum(kopecks for _, kopecks in batch)
+
     def transfer(self, from_tg_id: int, to_tg_id: int, amount: Amount) -> bool:
         logger.debug(f"Creating transaction for {amount} from {from_tg_id} to {to_tg_id}")
 
@@ -86,19 +283,40 @@ class AccountManager:
             # Создаем аккаунт получателя, если его нет. Он будет заблокирован.
             to_account = self.add_account(to_tg_id)
 
-        if not is_admin(from_tg_id):
+        charge_sender = not is_admin(from_tg_id)
+        if charge_sender:
             if from_account is None:
                 raise AccountNotFound(f"Account [id {from_tg_id}] not found.")
             if from_account.is_blocked():
                 raise AccountIsBlocked(f"Transaction sender [id {from_tg_id}] is blocked.")
-            if from_account.get_balance() - amount.get_byn_amount() < get_max_debt():
-                logger.error(f"Account {from_tg_id} has insufficient funds for transfer of {amount}.")
-                return False
 
-            from_account.modify_balance(-amount.get_byn_amount())
+        kopecks = amount.get_kopecks()
+        while True:
+            if charge_sender:
+                expected = from_account.get_balance_kopecks()
+                if expected - kopecks < get_max_debt_kopecks():
+                    logger.error(f"Account {from_tg_id} has insufficient funds for transfer of {amount}.")
+                    return False
 
-        to_account.modify_balance(amount.get_byn_amount())
-        self.storage.data = self.accounts
+            with self.storage.lock:
+                if charge_sender:
+                    if not self._compare_and_set(from_account, expected, expected - kopecks):
+                        # Баланс изменили параллельно, проверяем заново
+                        continue
+                    self._modify_balance(to_account, kopecks)
+                    self.storage.commit(from_account, to_account)
+                else:
+                    self._modify_balance(to_account, kopecks)
+                    self.storage.commit(to_account)
+            break
+
+        if charge_sender:
+            self.history.record_many([
+                (from_tg_id, HistoryKind.TRANSFER, -amount.get_byn_amount(), to_tg_id, None),
+                (to_tg_id, HistoryKind.TRANSFER, amount.get_byn_amount(), from_tg_id, None),
+            ])
+        else:
+            self.history.record(to_tg_id, HistoryKind.CREDIT, amount.get_byn_amount(), counterparty=from_tg_id)
         logger.info(f"Transferred {amount} from {from_tg_id} to {to_tg_id}")
         return True
 
@@ -108,12 +326,15 @@ class AccountManager:
         account = self.find_account(tg_id)
         if not account:
             return False
-        return account.get_balance() - amount.get_byn_amount() >= get_max_debt()
+        return account.get_balance_kopecks() - amount.get_kopecks() >= get_max_debt_kopecks()
 
-    def subtract_from_balance(self, tg_id: int, amount: Amount) -> bool:
+    def subtract_from_balance(self, tg_id: int, amount: Amount, reference: Optional[str] = None,
+                              operation: Optional[str] = None) -> bool:
         """
         Атомарно проверяет баланс и списывает средства.
         Возвращает True в случае успеха, False если средств недостаточно.
+        reference - адрес получателя платежа для истории операций.
+        operation - идентификатор списания в истории, по нему was_subtracted найдет его после сбоя.
         """
         if is_admin(tg_id):
             return True  # Администратор может все
@@ -123,14 +344,90 @@ class AccountManager:
             logger.warning(f"Attempt to subtract balance from non-existent account {tg_id}")
             return False
 
-        if not self.can_pay(tg_id, amount):
-            logger.warning(f"Insufficient funds for {tg_id} to pay {amount}. Balance: {account.get_balance()}")
+        kopecks = amount.get_kopecks()
+        while True:
+            expected = account.get_balance_kopecks()
+            if expected - kopecks < get_max_debt_kopecks():
+                logger.warning(f"Insufficient funds for {tg_id} to pay {amount}. Balance: {account.get_balance()}")
+                return False
+            with self.storage.lock:
+                if self._compare_and_set(account, expected, expected - kopecks):
+                    self.storage.commit(account)
+                    break
+        self.history.record(tg_id, HistoryKind.PAYMENT, -amount.get_byn_amount(), counterparty=reference,
+                            reference=operation)
+        logger.info(f"Subtracted {amount} from {tg_id}. New balance: {account.get_balance()}")
+        return True
+
+    def was_subtracted(self, tg_id: int, operation: str) -> bool:
+        """Прошло ли списание с идентификатором operation (у администратора списаний не бывает)."""
+        return is_admin(tg_id) or self.history.has_entry(tg_id, HistoryKind.PAYMENT, operation)
+
+    def refund(self, tg_id: int, amount: Amount, reference: Optional[str] = None) -> bool:
+        """Возвращает на баланс ранее списанный платеж."""
+        if is_admin(tg_id):
+            return True
+
+        account = self.find_account(tg_id)
+        if not account:
+            logger.error(f"Attempt to refund {amount} to non-existent account {tg_id}")
             return False
 
-        account.modify_balance(-1 * amount.get_byn_amount())
-        self.storage.data = self.accounts
-        logger.info(f"Subtracted {amount} from {tg_id}. New balance: {account.get_balance()}")
+        with self.storage.lock:
+            self._modify_balance(account, amount.get_kopecks())
+            self.storage.commit(account)
+        self.history.record(tg_id, HistoryKind.REFUND, amount.get_byn_amount(), counterparty=reference)
+        logger.info(f"Refunded {amount} to {tg_id}. New balance: {account.get_balance()}")
         return True
 
+    # Асинхронный API для обработчиков: операции над одним аккаунтом идут по очереди,
+    # над разными - параллельно, запись в хранилище не блокирует цикл событий
+
+    async def transfer_async(self, from_tg_id: int, to_tg_id: int, amount: Amount) -> bool:
+        async with self.locks.hold(from_tg_id, to_tg_id):
+            return await asyncio.to_thread(self.transfer, from_tg_id, to_tg_id, amount)
+
+    async def subtract_from_balance_async(self, tg_id: int, amount: Amount, reference: Optional[str] = None,
+                                          operation: Optional[str] = None) -> bool:
+        async with self.locks.hold(tg_id):
+            return await asyncio.to_thread(self.subtract_from_balance, tg_id, amount, reference, operation)
+
+    async def refund_async(self, tg_id: int, amount: Amount, reference: Optional[str] = None) -> bool:
+        async with self.locks.hold(tg_id):
+            return await asyncio.to_thread(self.refund, tg_id, amount, reference)
+
+    # Массовые операции держат блокировки всех аккаунтов пачки, как transfer_async и refund_async;
+    # пачки читаются из источника и применяются в потоке
+
+    async def bulk_set_blocked_async(self, tg_ids: Iterable[int], blocked: bool, create_missing: bool = False,
+                                     batch_size: int = BULK_BATCH_SIZE) -> Tuple[int, int]:
+        changed = missing = 0
+        batches = batched(tg_ids, batch_size)
+        while batch := await asyncio.to_thread(next, batches, None):
+            async with self.locks.hold(*batch):
+                batch_changed, batch_missing = await asyncio.to_thread(
+                    self._set_blocked_batch, batch, blocked, create_missing)
+            changed += batch_changed
+            missing += batch_missing
+        logger.log(f"Bulk {'block' if blocked else 'unblock'}: {changed} changed, {missing} not found")
+        return changed, missing
+
+    async def bulk_credit_async(self, credits: Iterable[Tuple[int, Decimal]],
+                                batch_size: int = BULK_BATCH_SIZE) -> Tuple[int, Decimal]:
+        count, total = 0, 0
+        batches = batched(credits, batch_size)
+        while batch := await asyncio.to_thread(next, batches, None):
+            async with self.locks.hold(*(tg_id for tg_id, _ in batch)):
+                total += await asyncio.to_thread(self._credit_batch, batch)
+            count += len(batch)
+        logger.log(f"Bulk credit: {count} credits, {kopecks_to_byn(total)} BYN")
+        return count, kopecks_to_byn(total)
+
+    async def get_stats_async(self) -> AccountStats:
+        return await asyncio.to_thread(self.get_stats)
+
+    async def verify_stats_async(self) -> bool:
+        return await asyncio.to_thread(self.verify_stats)
+
 
 account_manager = AccountManager()
@@ -0,0 +1,68 @@
+from decimal import Decimal
+from typing import Iterable
+
+from src.core.account.Account import Account
+from src.core.currency.Amount import kopecks_to_byn
+
+
+class AccountStats:
+    """
+    Running totals over all accounts, updated in O(1) on every change. Sums are kept in kopecks.
+    in_debt counts accounts below the debt limit (max_debt), debt sums all negative balances.
+    """
+
+    def __init__(self, debt_limit_kopecks: int = 0):
+        self.debt_limit_kopecks = debt_limit_kopecks
+        self.accounts = 0
+        self.blocked = 0
+        self.in_debt = 0
+        self.liabilities_kopecks = 0
+        self.debt_kopecks = 0
+
+    @property
+    def liabilities(self) -> Decimal:
+        return kopecks_to_byn(self.liabilities_kopecks)
+
+    @property
+    def debt(self) -> Decimal:
+        return kopecks_to_byn(self.debt_kopecks)
+
+    def on_added(self, account: Account):
+        self.accounts += 1
+        if account.is_blocked():
+            self.blocked += 1
+        balance = account.get_balance_kopecks()
+        self.liabilities_kopecks += max(balance, 0)
+        self.debt_kopecks += max(-balance, 0)
+        self.in_debt += int(balance < self.debt_limit_kopecks)
+
+    def on_blocked_change(self, was_blocked: bool, is_blocked: bool):
+        self.blocked += int(is_blocked) - int(was_blocked)
+
+    def on_balance_change(self, old: int, new: int):
+        # Долг и обязательства считаются по знаку баланса, переход через ноль меняет обе суммы
+        self.liabilities_kopecks += max(new, 0) - max(old, 0)
+        self.debt_kopecks += max(-new, 0) - max(-old, 0)
+        self.in_debt += int(new < self.debt_limit_kopecks) - int(old < self.debt_limit_kopecks)
+
+    def get_net_liabilities(self) -> Decimal:
+        return kopecks_to_byn(self.liabilities_kopecks - self.debt_kopecks)
+
+    @classmethod
+    def recompute(cls, accounts: Iterable[Account], debt_limit_kopecks: int = 0) -> "AccountStats":
+        stats = cls(debt_limit_kopecks)
+        for account in accounts:
+            stats.on_added(account)
+        return stats
+
+    def as_tuple(self):
+        return (self.debt_limit_kopecks, self.accounts, self.blocked, self.in_debt, self.liabilities_kopecks,
+                self.debt_kopecks)
+
+    def __eq__(self, other):
+        return isinstance(other, AccountStats) and self.as_tuple() == other.as_tuple()
+
+    def __repr__(self):
+        return (f"AccountStats [accounts {self.accounts}, blocked {self.blocked}, "
+                f"in debt {self.in_debt} (below {kopecks_to_byn(self.debt_limit_kopecks)}), "
+                f"liabilities {self.liabilities}, debt {self.debt}]")
@@ -0,0 +1,68 @@
+import csv
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, Iterator, List, TextIO, Tuple
+
+from src.core.account.Account import Account
+
+ACCOUNT_FIELDS = ("tg_id", "blocked", "balance")
+
+
+def _rows(lines: Iterable[str]) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Строки CSV с номерами, без пустых строк, комментариев (#) и заголовка
+    """
+    for number, row in enumerate(csv.reader(lines), start=1):
+        row = [cell.strip() for cell in row]
+        if not row or not row[0] or row[0].startswith("#"):
+            continue
+        if number == 1 and not row[0].lstrip("-").isdigit():
+            continue
+        yield number, row
+
+
+def _parse_id(number: int, value: str) -> int:
+    try:
+        tg_id = int(value)
+    except ValueError:
+        raise ValueError(f"line {number}: invalid tg_id {value!r}")
+    if tg_id <= 0:
+        raise ValueError(f"line {number}: invalid tg_id {value!r}")
+    return tg_id
+
+
+def read_ids(lines: Iterable[str]) -> Iterator[int]:
+    """
+    Читает tg_id из первой колонки CSV
+    """
+    for number, row in _rows(lines):
+        yield _parse_id(number, row[0])
+
+
+def read_credits(lines: Iterable[str]) -> Iterator[Tuple[int, Decimal]]:
+    """
+    Читает строки tg_id,amount (BYN). Сумма должна быть положительной
+    """
+    for number, row in _rows(lines):
+        if len(row) < 2:
+            raise ValueError(f"line {number}: expected tg_id,amount")
+        tg_id = _parse_id(number, row[0])
+        try:
+            amount = Decimal(row[1])
+        except InvalidOperation:
+            raise ValueError(f"line {number}: invalid amount {row[1]!r}")
+        if not amount.is_finite() or amount <= 0:
+            raise ValueError(f"line {number}: amount must be positive")
+        yield tg_id, amount
+
+
+def write_accounts(accounts: Iterable[Account], out: TextIO) -> int:
+    """
+    Пишет аккаунты в CSV построчно, возвращает число записанных строк
+    """
+    writer = csv.writer(out)
+    writer.writerow(ACCOUNT_FIELDS)
+    count = 0
+    for account in accounts:
+        writer.writerow((account.get_id(), int(account.is_blocked()), account.get_balance()))
+        count += 1
+    return count
@@ -1,7 +1,8 @@
 import json
 
 from src.core.account.Account import Account
-from src.core.currency.Amount import Amount
+from src.core.currency.Amount import Amount, byn_to_kopecks
+from src.database.codec import RecordSchema
 from src.util.logger import logger
 
 
@@ -26,3 +27,18 @@ class AccountDecoder:
             if data.get("__type__") == "Amount":
                 return Amount.from_dict(data)
         return data
+
+
+class AccountSchema(RecordSchema):
+    name = "Account"
+    fields = ("tg_id", "blocked", "balance")
+
+    # Баланс в копейках; ранее записанные файлы хранят строку BYN
+    to_row = staticmethod(Account.to_row)
+
+    @staticmethod
+    def from_row(row: list) -> Account:
+        balance = row[2]
+        if not isinstance(balance, int):
+            balance = byn_to_kopecks(balance)
+        return Account.from_kopecks(row[0], row[1], balance)
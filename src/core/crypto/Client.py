@@ -2,8 +2,5 @@ from src.core.currency.Amount import Amount
 
 
 class Client:
-    def get_balance(self, addr):
-        raise NotImplementedError
-
-    def transfer(self, private_key: str, to_address: str, amount: Amount):
+    async def transfer(self, from_address: str, to_address: str, amount: Amount):
         raise NotImplementedError
@@ -0,0 +1,197 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from src.core.crypto.tron.TronClient import TronClient, get_tx_expiration
+from src.util.fan_out import fan_out
+from src.util.logger import logger
+
+OUTCOME_CONFIRMED = "confirmed"
+# Транзакция в блоке, но не исполнена
+OUTCOME_FAILED = "failed"
+# Срок истек, а в необратимых блоках транзакции нет: она уже не попадет в сеть
+OUTCOME_EXPIRED = "expired"
+
+# Блок производится раз в 3 с, необратимым становится примерно через 19 блоков
+BLOCK_INTERVAL = 3
+_SOLID_LAG = 60
+# Сколько необратимых блоков разбирается за один опрос; при большем отставании транзакции проверяются по одной
+_MAX_SCAN_BLOCKS = 100
+# Транзакция, отправленная позже чем за столько секунд до начала разбора блоков, не может оказаться раньше него
+_SCAN_SAFE_AGE = 20
+_MAX_POLL_INTERVAL = 30
+# Истекшая транзакция еще могла попасть в последний блок до срока: ждем, пока он станет необратимым, с запасом
+_EXPIRY_MARGIN = 2 * _SOLID_LAG
+
+
+class TrackedTransaction:
+    """Отправленная транзакция выплаты, ожидающая необратимого блока."""
+    __slots__ = ("_txid", "_payout_id", "_tg_id", "_wallet_address", "_expires_at", "_tracked_at")
+
+    def __init__(self, txid: str, payout_id: int, tg_id: int, wallet_address: Optional[str],
+                 expires_at: float, tracked_at: float):
+        self._txid = txid
+        self._payout_id = payout_id
+        self._tg_id = tg_id
+        self._wallet_address = wallet_address
+        self._expires_at = expires_at
+        self._tracked_at = tracked_at
+
+    def get_txid(self) -> str:
+        return self._txid
+
+    def get_payout_id(self) -> int:
+        return self._payout_id
+
+    def get_tg_id(self) -> int:
+        return self._tg_id
+
+    def get_wallet_address(self) -> Optional[str]:
+        return self._wallet_address
+
+    def get_expires_at(self) -> float:
+        """Unix time after which the network no longer accepts the transaction."""
+        return self._expires_at
+
+    def get_tracked_at(self) -> float:
+        return self._tracked_at
+
+    def __repr__(self):
+        return f"TrackedTransaction {self._txid} (payout #{self._payout_id}, wallet {self._wallet_address or '-'})"
+
+
+class ConfirmationTracker:
+    def __init__(self, client: TronClient, limit: int, deadline: float):
+        """
+        Waits for broadcast transactions to reach a solidified block.
+        One poll reads the solidified block number and the transaction infos of every new block,
+        then matches them against all tracked txids, so RPC load follows the chain, not the number
+        of payouts in flight. Transactions that may be in blocks before the scan started
+        (after a restart or a long outage) are looked up one by one, once.
+        on_outcome gets each transaction once, with OUTCOME_*.
+        """
+        self.client = client
+        self.limit = limit
+        self.deadline = deadline
+        self.on_outcome: Optional[Callable[[TrackedTransaction, str], Awaitable[None]]] = None
+        self._pending: Dict[str, TrackedTransaction] = {}
+        # Следующий неразобранный необратимый блок; None, пока разбор не начат
+        self._cursor: Optional[int] = None
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def track(self, txid: str, payout_id: int, tg_id: int, wallet_address: Optional[str] = None,
+              broadcast_at: Optional[float] = None):
+        """broadcast_at - unix time of the broadcast if it was not just now (e.g. before a restart)."""
+        now = time.time()
+        sent = now if broadcast_at is None else broadcast_at
+        self._pending[txid] = TrackedTransaction(txid, payout_id, tg_id, wallet_address,
+                                                 sent + get_tx_expiration(), sent)
+        self._wake.set()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def start(self, on_outcome: Callable[[TrackedTransaction, str], Awaitable[None]]):
+        self.on_outcome = on_outcome
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                # Ждать нечего: сеть не опрашивается, разбор блоков начнется заново
+                self._cursor = None
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.warning(f"Confirmation poll failed: {e!r}")
+            delay = self.next_delay()
+            if delay is not None:
+                await asyncio.sleep(delay)
+
+    def next_delay(self, now: float = None) -> Optional[float]:
+        """
+        Seconds until the next poll: a transaction reaches a solidified block about _SOLID_LAG seconds after
+        the broadcast, so the tracker waits for the oldest one, then polls every block.
+        None if nothing is tracked.
+        """
+        if not self._pending:
+            return None
+        now = time.time() if now is None else now
+        oldest = min(tracked.get_tracked_at() for tracked in self._pending.values())
+        return min(max(oldest + _SOLID_LAG - now, BLOCK_INTERVAL), _MAX_POLL_INTERVAL)
+
+    async def poll(self):
+        """One round: new solidified blocks (or single lookups), then expiry."""
+        now = time.time()
+        solid = await self.client.fetch_solid_block_number()
+        if self._cursor is None or solid - self._cursor >= _MAX_SCAN_BLOCKS:
+            if not await self._look_up(solid, now):
+                return
+        elif not await self._scan(solid):
+            return
+
+        # Все блоки до solid разобраны: транзакция с истекшим сроком в них уже не появится
+        for tracked in list(self._pending.values()):
+            if now > tracked.get_expires_at() + _EXPIRY_MARGIN:
+                await self._resolve(tracked, OUTCOME_EXPIRED)
+
+    async def _look_up(self, solid: int, now: float) -> bool:
+        catching_up = self._cursor is not None
+        candidates = [tracked for tracked in self._pending.values()
+                      if catching_up or now - tracked.get_tracked_at() > _SCAN_SAFE_AGE]
+        if candidates:
+            logger.info(f"Looking up {len(candidates)} transaction(s) before scanning from block {solid + 1}")
+        result = await fan_out((tracked.get_txid() for tracked in candidates), self.client.fetch_transaction_info,
+                               self.limit, self.deadline)
+        for txid, info in result.results.items():
+            if info is not None:
+                await self._resolve_info(self._pending[txid], info)
+        if not result.is_complete():
+            # Без ответа по всем нельзя начинать разбор с solid: пропущенная транзакция осталась бы до него
+            logger.warning(f"Transaction lookup incomplete: {len(result.errors)} failed")
+            return False
+        self._cursor = solid + 1
+        return True
+
+    async def _scan(self, solid: int) -> bool:
+        blocks = range(self._cursor, solid + 1)
+        result = await fan_out(blocks, self.client.fetch_block_transaction_infos, self.limit, self.deadline)
+        for block_number in blocks:
+            infos = result.results.get(block_number)
+            if infos is None:
+                # Курсор останавливается на первом неразобранном блоке
+                logger.warning(f"Failed to read block {block_number}: {result.errors.get(block_number)!r}")
+                return False
+            for txid in infos.keys() & self._pending.keys():
+                await self._resolve_info(self._pending[txid], infos[txid])
+            self._cursor = block_number + 1
+        return True
+
+    async def _resolve_info(self, tracked: TrackedTransaction, info: dict):
+        if info.get("result") == "FAILED" or info.get("receipt", {}).get("result", "SUCCESS") != "SUCCESS":
+            logger.error(f"{tracked} failed in block {info.get('blockNumber')}: {info.get('resMessage')}")
+            await self._resolve(tracked, OUTCOME_FAILED)
+        else:
+            await self._resolve(tracked, OUTCOME_CONFIRMED)
+
+    async def _resolve(self, tracked: TrackedTransaction, outcome: str):
+        if self._pending.pop(tracked.get_txid(), None) is None:
+            return
+        logger.info(f"{tracked}: {outcome}")
+        if self.on_outcome is None:
+            return
+        try:
+            await self.on_outcome(tracked, outcome)
+        except Exception as e:
+            logger.error(f"Failed to handle {outcome} of {tracked}: {e!r}")
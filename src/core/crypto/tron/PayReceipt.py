@@ -0,0 +1,24 @@
+from typing import Optional
+
+
+class PayReceipt:
+    """Итог TronManager.pay: результат, txid (если транзакция ушла в сеть) и кошелек отправителя."""
+    __slots__ = ("_result", "_txid", "_wallet_address")
+
+    def __init__(self, result, txid: Optional[str] = None, wallet_address: Optional[str] = None):
+        self._result = result
+        self._txid = txid
+        self._wallet_address = wallet_address
+
+    def get_result(self):
+        """PayResult"""
+        return self._result
+
+    def get_txid(self) -> Optional[str]:
+        return self._txid
+
+    def get_wallet_address(self) -> Optional[str]:
+        return self._wallet_address
+
+    def __repr__(self):
+        return f"PayReceipt {self._result.name} {self._txid or '-'} from {self._wallet_address or '-'}"
@@ -0,0 +1,43 @@
+import time
+
+from src.core.crypto.tron.WalletIndex import WalletReservation
+from src.core.currency.Amount import Amount
+from src.core.currency.RateSnapshot import RateSnapshot
+
+
+class PaymentQuote:
+    """
+    Котировка платежа, показанная пользователю: сумма (со снимком курса), комиссия и кошелек,
+    на котором под нее отложена сумма. TronManager.pay исполняет ее без повторного выбора кошелька.
+    """
+    __slots__ = ("_amount", "_fee", "_reservation")
+
+    def __init__(self, amount: Amount, fee: Amount, reservation: WalletReservation):
+        self._amount = amount
+        self._fee = fee
+        self._reservation = reservation
+
+    def get_amount(self) -> Amount:
+        return self._amount
+
+    def get_fee(self) -> Amount:
+        return self._fee
+
+    def get_total(self) -> Amount:
+        return self._amount + self._fee
+
+    def get_rate(self) -> RateSnapshot:
+        return self._amount.get_rate()
+
+    def get_reservation(self) -> WalletReservation:
+        return self._reservation
+
+    def get_wallet_address(self) -> str:
+        return self._reservation.get_address()
+
+    def is_expired(self, now: float = None) -> bool:
+        return (time.monotonic() if now is None else now) >= self._reservation.get_expires_at()
+
+    def __repr__(self):
+        return (f"PaymentQuote {self._amount.format_trx()} TRX + fee {self._fee.get_byn_amount()} BYN "
+                f"from {self.get_wallet_address()}")
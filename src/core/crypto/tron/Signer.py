@@ -0,0 +1,243 @@
+"""
+Подпись транзакций. Подписывается только txid (sha256 от raw_data), поэтому подписчику не нужна сеть.
+
+LocalSigner держит ключи из trx_wallets в процессе бота и подписывает в рабочем потоке.
+SocketSigner отправляет txid процессу подписи (python -m src.tools.signer) через unix-сокет:
+одновременные запросы собираются в пакеты, пакет подписывает пул рабочих процессов.
+Ключей в процессе бота тогда нет, список кошельков бот получает у процесса подписи.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from tronpy.keys import PrivateKey
+
+from src.config.env.env import get_env_var
+from src.config.env.var_names import SIGNER_SOCKET
+from src.core.crypto.tron.json_coder import create_wallet_storage
+from src.util.logger import logger
+
+# Подписей в одном запросе к процессу подписи
+_BATCH_MAX = 256
+# Меньше этого пакет не делится между рабочими: пересылка дороже подписи
+_MIN_CHUNK = 32
+# Ответ на 256 подписей ~35 КБ, стандартный предел строки asyncio - 64 КБ
+_LINE_LIMIT = 1 << 20
+
+# Ключи рабочего процесса, загружаются при его запуске
+_worker_keys: Dict[str, PrivateKey] = {}
+
+
+def sign_digests(keys: Dict[str, PrivateKey], items: Iterable[Sequence[str]]) -> List[Optional[str]]:
+    """Подписи (hex) для пар (address, txid). None - ключа для адреса нет или txid не hex."""
+    signatures = []
+    for address, txid in items:
+        key = keys.get(address)
+        try:
+            signatures.append(None if key is None else key.sign_msg_hash(bytes.fromhex(txid)).hex())
+        except ValueError:
+            signatures.append(None)
+    return signatures
+
+
+def load_keys() -> Dict[str, str]:
+    """Ключи (address -> private key hex) из trx_wallets."""
+    return {wallet.get_address(): wallet.get_private_key() for wallet in create_wallet_storage().data}
+
+
+def _init_worker(keys_hex: Dict[str, str]):
+    global _worker_keys
+    # Ctrl+C останавливает процесс подписи, а он - свой пул
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_keys = {address: PrivateKey.fromhex(key) for address, key in keys_hex.items()}
+
+
+def _sign_chunk(items: List[Sequence[str]]) -> List[Optional[str]]:
+    return sign_digests(_worker_keys, items)
+
+
+class SignerServer:
+    def __init__(self, keys_hex: Dict[str, str], socket_path: str, workers: int):
+        """
+        Holds the keys (address -> private key hex) in a pool of `workers` processes and serves
+        one JSON request per line on a unix socket:
+            {"items": [[address, txid], ...]}  ->  {"signatures": [hex or null, ...]}  or  {"error": "..."}
+            {"addresses": true}                ->  {"addresses": [address, ...]}
+        A batch is split between the workers.
+        """
+        self.socket_path = socket_path
+        self.workers = workers
+        self.addresses = frozenset(keys_hex)
+        # fork: рабочие наследуют загруженные модули и не импортируют __main__ заново
+        self._pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"),
+                                         initializer=_init_worker, initargs=(keys_hex,))
+
+    async def sign(self, items: List[Sequence[str]]) -> List[Optional[str]]:
+        loop = asyncio.get_running_loop()
+        size = max(_MIN_CHUNK, -(-len(items) // self.workers))
+        parts = await asyncio.gather(*(loop.run_in_executor(self._pool, _sign_chunk, items[i:i + size])
+                                       for i in range(0, len(items), size)))
+        return [signature for part in parts for signature in part]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    if request.get("addresses"):
+                        response = {"addresses": sorted(self.addresses)}
+                    else:
+                        response = {"signatures": await self.sign(request["items"])}
+                except Exception as e:
+                    logger.error(f"Signer request failed: {str(e)}")
+                    response = {"error": str(e)}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        # Сокет доступен только владельцу с момента создания
+        umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self._handle, path=self.socket_path, limit=_LINE_LIMIT)
+        finally:
+            os.umask(umask)
+        logger.info(f"Signer listening on {self.socket_path}: {len(self.addresses)} keys, {self.workers} workers")
+        # По SIGTERM/SIGINT сервер останавливается штатно, и close() завершает рабочие процессы
+        loop = asyncio.get_running_loop()
+        serving = asyncio.current_task()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, serving.cancel)
+        try:
+            async with server:
+                await server.serve_forever()
+        except asyncio.CancelledError:
+            logger.info("Signer stopped")
+
+    def close(self):
+        self._pool.shutdown(cancel_futures=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class LocalSigner:
+    def __init__(self, keys_hex: Dict[str, str]):
+        """Signs in the bot process with the keys (address -> private key hex), on a worker thread."""
+        self._keys = {address: PrivateKey.fromhex(key) for address, key in keys_hex.items()}
+
+    async def get_addresses(self) -> List[str]:
+        return list(self._keys)
+
+    async def sign(self, address: str, txid: str) -> str:
+        # ~0.1 мс на подпись: в цикле событий пачка одновременных выплат остановила бы бота
+        signature = (await asyncio.to_thread(sign_digests, self._keys, [(address, txid)]))[0]
+        if signature is None:
+            raise ValueError(f"No key for {address}")
+        return signature
+
+    async def close(self):
+        pass
+
+
+class SocketSigner:
+    def __init__(self, socket_path: str, timeout: float):
+        """
+        Client of SignerServer. Concurrent sign() calls are queued and sent as one batch over a single
+        connection; while a batch is in flight the next one accumulates. The connection is reopened
+        after any error.
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._queue: List[Tuple[str, str, asyncio.Future]] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def get_addresses(self) -> List[str]:
+        """Addresses of the signer's keys, over a separate connection so it does not interleave with batches."""
+        async with asyncio.timeout(self.timeout):
+            reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=_LINE_LIMIT)
+            try:
+                writer.write(json.dumps({"addresses": True}).encode() + b"\n")
+                await writer.drain()
+                line = await reader.readline()
+            finally:
+                writer.close()
+        if not line:
+            raise ConnectionError("signer closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["addresses"]
+
+    async def sign(self, address: str, txid: str) -> str:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((address, txid, future))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush())
+        return await future
+
+    async def _flush(self):
+        while self._queue:
+            batch, self._queue = self._queue[:_BATCH_MAX], self._queue[_BATCH_MAX:]
+            try:
+                async with asyncio.timeout(self.timeout):
+                    signatures = await self._request([[address, txid] for address, txid, _ in batch])
+            except Exception as e:
+                # Ответ на этот запрос может прийти позже и сдвинуть следующие: соединение открывается заново
+                logger.error(f"Signer request of {len(batch)} failed: {str(e)}")
+                self._disconnect()
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError(f"Signer unavailable: {str(e)}"))
+                continue
+            for (address, _, future), signature in zip(batch, signatures):
+                if future.done():
+                    continue
+                if signature is None:
+                    future.set_exception(ValueError(f"Signer has no key for {address}"))
+                else:
+                    future.set_result(signature)
+
+    async def _request(self, items: List[List[str]]) -> List[Optional[str]]:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path, limit=_LINE_LIMIT)
+        self._writer.write(json.dumps({"items": items}).encode() + b"\n")
+        await self._writer.drain()
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("signer closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        if len(response["signatures"]) != len(items):
+            raise RuntimeError("signer returned a wrong number of signatures")
+        return response["signatures"]
+
+    def _disconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+        self._disconnect()
+
+
+def create_signer(timeout: float):
+    """SocketSigner, если задан SIGNER_SOCKET (trx_wallets тогда не читается), иначе LocalSigner."""
+    socket_path = get_env_var(SIGNER_SOCKET)
+    if socket_path:
+        logger.info(f"Transactions are signed by the signer process at {socket_path}")
+        return SocketSigner(socket_path, timeout)
+    return LocalSigner(load_keys())
@@ -1,32 +1,90 @@
-from decimal import Decimal
+import asyncio
+from typing import Dict, Iterable, Optional
 
-import requests
-from tronpy import Tron
-from tronpy.keys import PrivateKey
-from tronpy.providers import HTTPProvider
+import httpx
+import tronpy.version
+from tronpy import AsyncTron
+from tronpy.exceptions import (AddressNotFound, BadSignature, TaposError, TransactionError, TransactionNotFound,
+                               ValidationError)
+from tronpy.providers import AsyncHTTPProvider
 
 from src.config.env.env import get_env_var
 from src.config.env.var_names import TRON_NETWORK, TRONGRID_API_KEY
 from src.core.crypto.Client import Client
-from src.core.currency.Amount import Amount
+from src.core.crypto.tron.Signer import create_signer
+from src.core.crypto.tron.WalletState import WalletState
+from src.core.currency.Amount import Amount, sun_to_trx
+from src.core.currency.RateSnapshot import RateSnapshot, get_rate_snapshot
+from src.core.exceptions.TransferOutcomeUnknown import TransferOutcomeUnknown
 import src.util.configs
+from src.util.fan_out import FanOutResult, fan_out
 from src.util.logger import logger
-
-def get_fee() -> Amount:
-    fee_byn = src.util.configs.trx_config.data.get('transaction_fee_byn', 0.35)
-    return Amount(byn=str(fee_byn))
+from src.util.ttl_cache import TtlCache
+
+_MAX_CONNECTIONS = 50
+_KEEPALIVE_EXPIRY = 60
+# Опорный блок (TaPoS) обновляется в фоне раз в REFERENCE_BLOCK_REFRESH секунд. Сеть принимает ссылку
+# на любой из последних 65536 блоков, но старше _REFERENCE_BLOCK_MAX_AGE секунд блок не берется
+REFERENCE_BLOCK_REFRESH = 3
+_REFERENCE_BLOCK_MAX_AGE = 30
+_REFERENCE_BLOCK_KEY = "solid"
+# Попытка отправки - build, подпись и broadcast, каждый шаг ограничен rpc_timeout.
+# Вторая попытка - только после отказа сети из-за опорного блока или срока
+_TRANSFER_ATTEMPTS = 2
+_TRANSFER_STEPS = 3
+
+def get_fee(rate: Optional[RateSnapshot] = None) -> Amount:
+    rate = rate or get_rate_snapshot()
+    return Amount.from_kopecks(rate.get_fee_kopecks(), rate)
 
 def get_required_bandwidth() -> int:
     return src.util.configs.trx_config.data.get('required_bandwidth', 280)
 
 
+def get_wallet_cache_ttl() -> float:
+    return float(src.util.configs.trx_config.data.get('wallet_cache_ttl', 30))
+
+
+def get_tx_expiration() -> float:
+    """Сколько секунд подписанная транзакция принимается сетью."""
+    return float(src.util.configs.trx_config.data.get('tx_expiration', 60))
+
+
+def get_rpc_timeout() -> float:
+    return float(src.util.configs.trx_config.data.get('rpc_timeout', 10))
+
+
+class _CachedReferenceTron(AsyncTron):
+    """AsyncTron, у которого build берет опорный блок из кэша, а не запрашивает его для каждой транзакции."""
+
+    def __init__(self, provider: AsyncHTTPProvider):
+        super().__init__(provider)
+        self.reference_blocks = TtlCache(_REFERENCE_BLOCK_MAX_AGE)
+
+    async def get_latest_solid_block_id(self) -> str:
+        return await self.reference_blocks.get(_REFERENCE_BLOCK_KEY, super().get_latest_solid_block_id)
+
+    async def refresh_reference_block(self):
+        await self.reference_blocks.refresh(_REFERENCE_BLOCK_KEY, super().get_latest_solid_block_id)
+
+    def invalidate_reference_block(self):
+        self.reference_blocks.invalidate(_REFERENCE_BLOCK_KEY)
+
+
 class TronClient(Client):
     def __init__(self):
+        """
+        Async TronGrid client. HTTP connections are pooled and kept alive between calls,
+        every call is bounded by rpc_timeout from trx_config.
+        Nothing is sent until connect() or the first call.
+        """
         self.network = get_env_var(TRON_NETWORK)
         self.api_key = get_env_var(TRONGRID_API_KEY)
+        self.timeout = get_rpc_timeout()
         self._client = self._get_client()
+        self.signer = create_signer(self.timeout)
 
-    def _get_client(self) -> Tron:
+    def _get_client(self) -> _CachedReferenceTron:
         if self.network == "mainnet":
             if not self.api_key:
                 raise ValueError("TRONGRID_API_KEY is required for mainnet (TronGrid)")
@@ -36,13 +94,25 @@ class TronClient(Client):
         else:
             raise ValueError(f"Unsupported network: {self.network}")
 
+        headers = {"User-Agent": f"Tronpy/{tronpy.version.VERSION}"}
+        if self.network == "mainnet":
+            headers["Tron-Pro-Api-Key"] = self.api_key
+        http_client = httpx.AsyncClient(
+            headers=headers,
+            timeout=httpx.Timeout(self.timeout),
+            limits=httpx.Limits(max_connections=_MAX_CONNECTIONS,
+                                max_keepalive_connections=_MAX_CONNECTIONS,
+                                keepalive_expiry=_KEEPALIVE_EXPIRY),
+        )
+        return _CachedReferenceTron(AsyncHTTPProvider(provider_url, timeout=self.timeout, client=http_client))
+
+    async def connect(self):
         try:
-            provider = HTTPProvider(provider_url, api_key=self.api_key if self.network == "mainnet" else None)
-            client = Tron(provider=provider)
-            client.get_block(0)
+            async with asyncio.timeout(self.timeout):
+                await self._client.get_block(0)
+                await self._client.refresh_reference_block()
             logger.info(f"Connected to Tron network: {self.network}")
-            return client
-        except requests.exceptions.HTTPError as e:
+        except httpx.HTTPStatusError as e:
             logger.error(f"Ошибка подключения к сети Tron ({self.network}): {str(e)}")
             raise RuntimeError(
                 f"Failed to connect to Tron network: {str(e)}. Check TRONGRID_API_KEY for mainnet or network availability for nile")
@@ -50,60 +120,114 @@ class TronClient(Client):
             logger.error(f"Неизвестная ошибка при подключении к Tron ({self.network}): {str(e)}")
             raise RuntimeError(f"Unexpected error connecting to Tron network: {str(e)}")
 
+    async def close(self):
+        await self.signer.close()
+        await self._client.close()
+
+    def get_transfer_timeout(self) -> float:
+        """Longest possible transfer(): every attempt with every step running up to its timeout."""
+        return _TRANSFER_ATTEMPTS * _TRANSFER_STEPS * self.timeout
+
+    async def refresh_reference_block(self):
+        try:
+            async with asyncio.timeout(self.timeout):
+                await self._client.refresh_reference_block()
+        except Exception as e:
+            # Кэш не сбрасывается: старый блок годен, пока не старше _REFERENCE_BLOCK_MAX_AGE
+            logger.warning(f"Failed to refresh reference block: {str(e)}")
+
     def validate_address(self, address: str) -> bool:
+        # Проверка локальная, сеть не нужна
         try:
             return self._client.is_address(address)
         except Exception as e:
             logger.error(f"Address validation failed for {address}: {str(e)}")
             return False
 
-    def get_balance(self, address: str) -> Decimal:
+    async def fetch_wallet_state(self, address: str) -> WalletState:
+        """Balance and bandwidth of the address in one getaccount call, raises on network errors."""
         try:
-            balance = self._client.get_account_balance(address)
-            return Decimal(balance)
-        except Exception as e:
-            logger.error(f"Failed to get balance for {address}: {str(e)}")
-            return Decimal('0.0')
-
-    def transfer(self, private_key: str, to_address: str, amount: Amount) -> str:
+            async with asyncio.timeout(self.timeout):
+                account = await self._client.get_account(address)
+        except AddressNotFound:
+            # Аккаунт не активирован: баланса нет
+            account = {}
+        return WalletState.from_account(address, account)
+
+    async def fetch_wallet_states(self, addresses: Iterable[str], limit: int, deadline: float) -> FanOutResult:
+        """WalletState by address for many addresses, at most `limit` calls at a time. Failed ones are in errors."""
+        return await fan_out(addresses, self.fetch_wallet_state, limit, deadline)
+
+    async def fetch_solid_block_number(self) -> int:
+        """Latest irreversible (solidified) block, raises on network errors."""
+        async with asyncio.timeout(self.timeout):
+            return await self._client.get_latest_solid_block_number()
+
+    async def fetch_block_transaction_infos(self, block_number: int) -> Dict[str, dict]:
+        """Infos of all transactions in a solidified block by txid, raises on network errors."""
+        async with asyncio.timeout(self.timeout):
+            infos = await self._client.provider.make_request("walletsolidity/gettransactioninfobyblocknum",
+                                                             {"num": block_number})
+        # Пустой блок - пустой объект, а не список
+        return {info["id"]: info for info in infos} if isinstance(infos, list) else {}
+
+    async def fetch_transaction_info(self, txid: str) -> Optional[dict]:
+        """Info of a transaction in a solidified block, None if it is not there yet. Raises on network errors."""
         try:
-            prv_key = PrivateKey(bytes.fromhex(private_key))
-            trx_value = amount.get_to_trx()
-            amount_sun = int(trx_value * 1_000_000)
-
-            txn = (
-                self._client.trx.transfer(
-                    prv_key.public_key.to_base58check_address(),
-                    to_address,
-                    amount_sun,
-                )
-                .build()
-                .sign(prv_key)
-            )
-
-            txid = txn.txid
-            logger.debug(f"Broadcasting transaction: TXID={txid}, From={prv_key.public_key.to_base58check_address()}, To={to_address}, Amount={trx_value:.6f} TRX")
-            txn.broadcast()
-            logger.info(f"Transaction sent successfully: TXID={txid}")
-            return txid
-
+            async with asyncio.timeout(self.timeout):
+                return await self._client.get_solid_transaction_info(txid)
+        except TransactionNotFound:
+            return None
+
+    async def transfer(self, from_address: str, to_address: str, amount: Amount) -> str:
+        """
+        Sends the amount and returns the txid. TransferOutcomeUnknown if the transaction was broadcast
+        but the answer was lost; any other error means nothing was accepted by the network.
+        """
+        try:
+            amount_sun = amount.get_sun()
+            trx_value = sun_to_trx(amount_sun)
+            expiration_ms = int(get_tx_expiration() * 1000)
+
+            # Вторая попытка - только если сеть отвергла транзакцию из-за опорного блока или срока:
+            # такая транзакция не принята, и отправить новую безопасно
+            for attempt in range(_TRANSFER_ATTEMPTS):
+                async with asyncio.timeout(self.timeout):
+                    txn = await self._client.trx.transfer(
+                        from_address,
+                        to_address,
+                        amount_sun,
+                    ).expiration(expiration_ms).build()
+                txid = txn.txid
+                # Подписывается только txid: ключ может быть и в отдельном процессе подписи
+                async with asyncio.timeout(self.timeout):
+                    txn.set_signature([await self.signer.sign(from_address, txid)])
+
+                logger.debug(f"Broadcasting transaction: TXID={txid}, From={from_address}, To={to_address}, Amount={trx_value:.6f} TRX")
+                try:
+                    async with asyncio.timeout(self.timeout):
+                        await txn.broadcast()
+                except (TaposError, TransactionError) as e:
+                    self._client.invalidate_reference_block()
+                    if attempt == _TRANSFER_ATTEMPTS - 1:
+                        raise
+                    logger.warning(f"Transaction {txid} rejected ({str(e)}), rebuilding with a fresh reference block")
+                    continue
+                except (BadSignature, ValidationError):
+                    # Сеть отвергла транзакцию при проверке
+                    raise
+                except Exception as e:
+                    # Таймаут или обрыв: сеть могла принять транзакцию, отправлять ее заново нельзя
+                    raise TransferOutcomeUnknown(txid, f"Broadcast of {txid} failed: {str(e)}") from e
+                logger.info(f"Transaction sent successfully: TXID={txid}")
+                return txid
+
+        except TransferOutcomeUnknown as e:
+            logger.error(f"Transaction outcome unknown for to_address={to_address}: {str(e)}")
+            raise
         except ValueError as e:
             logger.error(f"Invalid transaction parameters for transfer to {to_address} of amount {amount}: {str(e)}")
             raise
         except Exception as e:
             logger.error(f"Transaction failed for to_address={to_address}, amount={amount.get_to_trx()} TRX. Error: {str(e)}")
             raise RuntimeError(f"Transaction failed: {str(e)}")
-
-    def estimate_bandwidth_usage(self, address: str) -> int:
-        try:
-            account = self._client.get_account(address)
-            usage = account.get("free_net_usage", -1)
-            if usage == -1:
-                return 600
-            return 600 - usage
-        except Exception as e:
-            logger.error(f"Bandwidth check failed for {address}: {str(e)}")
-            return 0
-
-    def can_transfer_without_fees(self, address: str) -> bool:
-        return self.estimate_bandwidth_usage(address) >= get_required_bandwidth()
@@ -1,103 +1,235 @@
+import asyncio
+import time
+from decimal import Decimal
 from enum import Enum
-from typing import List, Optional
-from src.core.crypto.tron.TronClient import TronClient, get_fee
-from src.core.crypto.tron.TronWallet import TronWallet
+from typing import Dict, List
+from src.core.crypto.tron.TronClient import (TronClient, get_fee, get_required_bandwidth, get_rpc_timeout,
+                                             get_wallet_cache_ttl)
+from src.core.crypto.tron.PaymentQuote import PaymentQuote
+from src.core.crypto.tron.PayReceipt import PayReceipt
+from src.core.crypto.tron.WalletIndex import WalletIndex, WalletLease
+from src.core.crypto.tron.WalletState import WalletState
 from src.core.currency.Amount import Amount
-from src.database.JsonFileStorage import JsonFileStorage
+from src.core.exceptions.TransferOutcomeUnknown import TransferOutcomeUnknown
+from src.util.fan_out import FanOutResult, fan_out
 from src.util.logger import logger
-import src.core.crypto.tron.json_coder
+from src.util.ttl_cache import TtlCache
 
 import src
 
 
-class PayResult(Enum):
-    COMPLETED = 0
-    COMPLETED_FEE = 1
-    NOT_ENOUGH_BALANCE = 2
-    ERROR = 3
+# Отправленная транзакция попадает в блок за ~3 с: до этого сеть еще показывает старый баланс,
+# и сверка не перезаписывает им локальный учет
+RECONCILE_SETTLE_SECONDS = 6
 
-class TronManager:
-    def __init__(self):
-        self.storage = JsonFileStorage(src.config.files.get_trx_wallets_filename(),
-                                       default_value=[],
-                                       decode_hook=src.core.crypto.tron.json_coder.TronWalletDecoder.decode_hook,
-                                       encoder=src.core.crypto.tron.json_coder.TronWalletEncoder)
-        self.wallets: List[TronWallet] = self.storage.data
-        self.client = TronClient()
 
-    def get_wallet_with_lower_reminder(self, wallets: List[TronWallet], amount: Amount) -> Optional[TronWallet]:
-        trx_amount = amount.get_to_trx()
-        best_wallet = None
-        min_reminder = float('inf')
+_LEASE_POLL_SECONDS = 1.0
 
-        for wallet in wallets:
-            balance = self.client.get_balance(wallet.get_address())
-            reminder = balance - trx_amount
-            if reminder < min_reminder:
-                min_reminder = reminder
-                best_wallet = wallet
 
-        return best_wallet
+def get_wallet_lease_timeout(transfer_timeout: float) -> float:
+    """
+    Аренда должна пережить весь transfer со всеми попытками: истекшая аренда отдала бы кошелек
+    второй отправке, пока первая еще идет. Меньшее значение из конфига не применяется.
+    """
+    minimum = transfer_timeout + get_rpc_timeout()
+    return max(float(src.util.configs.trx_config.data.get('wallet_lease_timeout', minimum)), minimum)
 
-    def pay(self, address: str, amount: Amount) -> PayResult:
-        trx_amount = amount.get_to_trx()
-        logger.info(f"Initiating payment of {trx_amount:.6f} TRX to {address}")
 
-        try:
-            chosen_wallet, fee_charged = self.choose_wallet(amount)
-        except ValueError:
-            return PayResult.NOT_ENOUGH_BALANCE
+def get_payment_quote_ttl() -> float:
+    return float(src.util.configs.trx_config.data.get('payment_quote_ttl', 300))
 
-        if chosen_wallet is None:
-            logger.error("A wallet should have been selected, but was not. This indicates a logic error.")
-            return PayResult.ERROR
 
-        logger.debug(f"Chosen wallet {chosen_wallet.get_address()} for the transaction.")
+def get_wallet_reconcile_interval() -> float:
+    return float(src.util.configs.trx_config.data.get('wallet_reconcile_interval', 30))
 
-        try:
-            self.client.transfer(chosen_wallet.get_private_key(), address, amount)
-            return PayResult.COMPLETED_FEE if fee_charged == Amount() else PayResult.COMPLETED
-        except Exception as e:
-            logger.error(f"An unexpected error occurred during transfer: {e}")
-            return PayResult.ERROR
 
-    def choose_wallet(self, amount: Amount) -> (TronWallet, Amount):
-        trx_amount = amount.get_to_trx()
-        sufficient_wallets = [
-            wallet for wallet in self.wallets
-            if self.client.get_balance(wallet.get_address()) >= trx_amount
-        ]
+def get_rpc_concurrency() -> int:
+    return int(src.util.configs.trx_config.data.get('rpc_concurrency', 50))
 
-        if not sufficient_wallets:
-            logger.warning(f"Payment failed: Not enough balance on any wallet to send {trx_amount:.6f} TRX.")
-            raise ValueError("Not enough balance!")
 
-        no_fees_wallets = self.get_no_fees_wallets(sufficient_wallets)
+def get_wallet_query_deadline() -> float:
+    return float(src.util.configs.trx_config.data.get('wallet_query_deadline', 15))
 
-        if no_fees_wallets:
-            return self.get_wallet_with_lower_reminder(no_fees_wallets, amount), Amount()
+
+class PayResult(Enum):
+    COMPLETED = 0
+    COMPLETED_FEE = 1
+    # Резерв котировки истек или снят: нужна новая котировка с тем же классом комиссии
+    QUOTE_EXPIRED = 2
+    # Транзакция не принята сетью, платеж можно повторить
+    ERROR = 3
+    # Транзакция отправлена, но ответа сети нет: повторять нельзя
+    UNKNOWN = 4
+
+class TronManager:
+    def __init__(self):
+        self.client = TronClient()
+        # Адреса сервисных кошельков: ключи есть только у подписчика (self.client.signer)
+        self.addresses: List[str] = []
+        # Состояние кошельков (WalletState) по адресу для /wallets_info; выбор кошелька его не читает
+        self.wallet_cache = TtlCache(get_wallet_cache_ttl())
+        # Выбор кошелька идет по индексу, сеть опрашивается только при сверке
+        self.index = WalletIndex(get_required_bandwidth())
+        self._last_transfer: Dict[str, float] = {}
+        self._index_loaded = False
+        self._reconcile_lock = asyncio.Lock()
+        self._lease_released = asyncio.Condition()
+
+    async def fetch_wallet_state(self, address: str) -> WalletState:
+        return await self.wallet_cache.get(address, lambda: self.client.fetch_wallet_state(address))
+
+    async def query_wallet_states(self, addresses: List[str]) -> FanOutResult:
+        """
+        Баланс и bandwidth кошельков по адресу для отображения: свежие состояния берутся из кэша,
+        который пополняет сверка, остальные запрашиваются по одному на кошелек, параллельно.
+        Одновременные запросы одного кошелька объединяются в один. Кошельки, не ответившие до дедлайна, - в errors.
+        """
+        result = await fan_out(addresses, self.fetch_wallet_state,
+                               get_rpc_concurrency(), get_wallet_query_deadline())
+        for address, error in result.errors.items():
+            logger.error(f"Failed to get state of {address}: {error!r}")
+        return result
+
+    def invalidate_wallet(self, address: str):
+        self.wallet_cache.invalidate(address)
+
+    async def reconcile_wallets(self):
+        """
+        Сверяет индекс с сетью: состояния всех кошельков запрашиваются заново и заменяют локальный учет.
+        Кошельки с отправкой за последние RECONCILE_SETTLE_SECONDS пропускаются до следующей сверки.
+        """
+        async with self._reconcile_lock:
+            await self._load_addresses()
+            self.index.set_required_bandwidth(get_required_bandwidth())
+
+            started = time.monotonic()
+            result = await self.client.fetch_wallet_states(self.addresses, get_rpc_concurrency(),
+                                                           get_wallet_query_deadline())
+            for address, state in result.results.items():
+                if self._last_transfer.get(address, 0) > started - RECONCILE_SETTLE_SECONDS:
+                    continue
+                local = self.index.get_balance_sun(address)
+                if local is not None and local != state.get_balance_sun():
+                    logger.info(f"Wallet {address} drifted by {state.get_balance_sun() - local} sun, reconciled")
+                self.wallet_cache.put(address, state)
+                self.index.update(state)
+            for address, error in result.errors.items():
+                logger.warning(f"Failed to reconcile {address}: {error!r}")
+            self._index_loaded = True
+
+    async def _load_addresses(self):
+        """Список кошельков у подписчика: процесс подписи мог перезапуститься с новыми ключами."""
+        try:
+            addresses = await self.client.signer.get_addresses()
+        except Exception as e:
+            if not self.addresses:
+                raise RuntimeError(f"Failed to get wallets from the signer: {e!r}")
+            logger.warning(f"Failed to get wallets from the signer, keeping {len(self.addresses)}: {e!r}")
+            return
+        for address in set(self.addresses) - set(addresses):
+            logger.warning(f"Wallet {address} is gone from the signer")
+            self.index.discard(address)
+            self.invalidate_wallet(address)
+        self.addresses = addresses
+
+    async def _ensure_index(self):
+        if not self._index_loaded:
+            await self.reconcile_wallets()
+
+    async def quote(self, amount: Amount, fee_free_only: bool = False) -> PaymentQuote:
+        """
+        Выбирает кошелек и откладывает на нем сумму с комиссией сети на payment_quote_ttl секунд.
+        fee_free_only - только кошельки без комиссии (пользователь уже оплатил котировку без нее).
+        ValueError, если суммы не хватает ни на одном подходящем кошельке.
+        """
+        await self._ensure_index()
+        reservation = self.index.reserve(amount.get_sun(), get_payment_quote_ttl(), fee_free_only=fee_free_only)
+        if reservation is None:
+            logger.warning(f"Quote failed: Not enough balance on any wallet to send {amount.get_to_trx():.6f} TRX.")
+            raise ValueError("Not enough balance!")
+
+        if reservation.is_fee_free():
+            fee = Amount()
         else:
-            logger.warning(
-                "No wallets with enough bandwidth. A fee will be charged. Selecting from all sufficient wallets.")
-            return self.get_wallet_with_lower_reminder(sufficient_wallets, amount), get_fee()
-
-    def get_no_fees_wallets(self, wallets: List[TronWallet]) -> List[TronWallet]:
-        no_fees_wallets = []
-        for wallet in wallets:
-            if self.client.can_transfer_without_fees(wallet.get_address()):
-                no_fees_wallets.append(wallet)
-        return no_fees_wallets
-
-    def can_transfer_without_fees(self):
-        return len(self.get_no_fees_wallets(self.storage.data)) > 0
-
-    def get_max_payment_amount(self):
-        max_balance = -1
-        for wallet in self.storage.data:
-            balance = self.client.get_balance(wallet.get_address())
-            if balance > max_balance:
-                max_balance = balance
-        return max_balance
+            logger.warning("No wallets with enough bandwidth. A fee will be charged.")
+            fee = get_fee(amount.get_rate())
+        quote = PaymentQuote(amount, fee, reservation)
+        logger.debug(f"Quoted {quote}")
+        return quote
+
+    def cancel_quote(self, quote: PaymentQuote):
+        self.index.cancel(quote.get_reservation())
+
+    async def pay(self, address: str, quote: PaymentQuote) -> PayReceipt:
+        """
+        Исполняет котировку: отправка идет только с отложенного под нее кошелька.
+        Если резерв истек или снят, возвращает QUOTE_EXPIRED: другой кошелек мог бы взять комиссию,
+        которой не было в котировке.
+        Исключение возможно только до отправки транзакции (ожидание аренды кошелька), дальше - PayReceipt.
+        """
+        amount = quote.get_amount()
+        logger.info(f"Initiating payment of {amount.get_to_trx():.6f} TRX to {address} ({quote.get_rate()})")
+
+        reservation = quote.get_reservation()
+        if not self.index.is_reserved(reservation):
+            logger.warning(f"Reservation for {quote} is gone, the payment needs a new quote")
+            return PayReceipt(PayResult.QUOTE_EXPIRED)
+
+        wallet_address = reservation.get_address()
+        lease = await self._lease_wallet(wallet_address)
+        logger.debug(f"Leased wallet {wallet_address} for the transaction.")
+
+        try:
+            txid = await self.client.transfer(wallet_address, address, amount)
+        except TransferOutcomeUnknown as e:
+            logger.error(f"Transfer outcome unknown: {e}")
+            # Неизвестно, ушла ли транзакция: кошелек не выбирается до сверки
+            self.index.discard(wallet_address)
+            return PayReceipt(PayResult.UNKNOWN, e.txid, wallet_address)
+        except Exception as e:
+            logger.error(f"An unexpected error occurred during transfer: {e}")
+            # Баланс кошелька мог разойтись с учетом (например, сборка отвергнута сетью): до сверки он не выбирается
+            self.index.discard(wallet_address)
+            return PayReceipt(PayResult.ERROR, wallet_address=wallet_address)
+        finally:
+            self._last_transfer[wallet_address] = time.monotonic()
+            self.invalidate_wallet(wallet_address)
+            await self._release_wallet(lease)
+
+        # Транзакция отправлена: ошибка учета не должна превратиться в ERROR и повторную отправку
+        try:
+            self.index.cancel(reservation)
+            self.index.apply_transfer(wallet_address, amount.get_sun())
+        except Exception as e:
+            logger.critical(f"Failed to account transfer {txid} from {wallet_address}: {e!r}")
+            self.index.discard(wallet_address)
+        result = PayResult.COMPLETED if reservation.is_fee_free() else PayResult.COMPLETED_FEE
+        return PayReceipt(result, txid, wallet_address)
+
+    async def _lease_wallet(self, address: str) -> WalletLease:
+        """Ждет очереди на отправку с кошелька: с одного кошелька одновременно идет одна отправка."""
+        async with self._lease_released:
+            while True:
+                lease = self.index.lease(address, get_wallet_lease_timeout(self.client.get_transfer_timeout()))
+                if lease is not None:
+                    return lease
+                try:
+                    # Просроченная аренда освобождается без уведомления, поэтому ждем с таймаутом
+                    async with asyncio.timeout(_LEASE_POLL_SECONDS):
+                        await self._lease_released.wait()
+                except TimeoutError:
+                    pass
+
+    async def _release_wallet(self, lease: WalletLease):
+        if not self.index.release(lease):
+            logger.warning(f"Lease of wallet {lease.get_address()} expired before release")
+        async with self._lease_released:
+            self._lease_released.notify_all()
+
+    async def get_max_payment_amount(self):
+        await self._ensure_index()
+        max_balance = self.index.max_balance_sun()
+        return -1 if max_balance is None else Decimal(max_balance) / 1_000_000
 
 
 tron_manager = TronManager()
@@ -1,4 +1,4 @@
-from tronpy.keys import PrivateKey
+from tronpy.keys import PrivateKey, PublicKey
 
 from src.util.logger import logger
 
@@ -7,25 +7,37 @@ _STR_BLOCKED = "BLOCKED"
 _STR_PRIVATE_KEY = "PRIVATE_KEY"
 
 class TronWallet:
+    # Ключ, публичный ключ и адрес выводятся из hex один раз, при первом обращении
+    __slots__ = ("waiting_for_payment", "blocked", "_private_key", "_key", "_address")
+
     def __init__(self, private_key: str, blocked = False, waiting_for_payment = False):
         self.waiting_for_payment = waiting_for_payment
         self.blocked = blocked
         self._private_key = private_key
+        self._key = None
+        self._address = None
 
     def get_private_key(self):
         return self._private_key
 
-    def get_address(self):
-        try:
-            private_key = PrivateKey.fromhex(self._private_key)
-            address = private_key.public_key.to_base58check_address()
+    def get_key(self) -> PrivateKey:
+        if self._key is None:
+            try:
+                self._key = PrivateKey.fromhex(self._private_key)
+            except Exception as e:
+                logger.error(f"Failed to parse private key: {e}")
+                raise ValueError(f"Некорректный приватный ключ: {e}")
+        return self._key
 
-            logger.debug(f"Converted private key to address: {address}")
-            return address
+    def get_public_key(self) -> PublicKey:
+        # PrivateKey выводит public_key в конструкторе
+        return self.get_key().public_key
 
-        except Exception as e:
-            logger.error(f"Failed to convert private key to address: {e}")
-            raise ValueError(f"Некорректный приватный ключ: {e}")
+    def get_address(self):
+        if self._address is None:
+            self._address = self.get_public_key().to_base58check_address()
+            logger.debug(f"Converted private key to address: {self._address}")
+        return self._address
 
     def to_dict(self):
         return {
@@ -0,0 +1,236 @@
+import itertools
+import time
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from src.core.crypto.tron.WalletState import WalletState
+from src.util.logger import logger
+
+# Цена bandwidth, сжигаемого вместо бесплатного: 1000 sun за байт
+SUN_PER_BANDWIDTH = 1000
+
+
+class WalletLease:
+    """Право одного платежа на отправку с кошелька до release или до истечения срока."""
+    __slots__ = ("_address", "_token", "_expires_at")
+
+    def __init__(self, address: str, token: int, expires_at: float):
+        self._address = address
+        self._token = token
+        self._expires_at = expires_at
+
+    def get_address(self) -> str:
+        return self._address
+
+    def get_expires_at(self) -> float:
+        return self._expires_at
+
+
+class WalletReservation:
+    """Часть баланса (и bandwidth) кошелька, отложенная под котировку до оплаты или истечения срока."""
+    __slots__ = ("_address", "_fee_free", "_sun", "_bandwidth", "_token", "_expires_at")
+
+    def __init__(self, address: str, fee_free: bool, sun: int, bandwidth: int, token: int, expires_at: float):
+        self._address = address
+        self._fee_free = fee_free
+        self._sun = sun
+        self._bandwidth = bandwidth
+        self._token = token
+        self._expires_at = expires_at
+
+    def get_address(self) -> str:
+        return self._address
+
+    def is_fee_free(self) -> bool:
+        return self._fee_free
+
+    def get_expires_at(self) -> float:
+        return self._expires_at
+
+
+class WalletIndex:
+    def __init__(self, required_bandwidth: int):
+        """
+        Wallets ordered by spendable balance (balance minus reservations), separately for all wallets
+        and for fee-free ones (free bandwidth >= required_bandwidth). Lookups are bisect searches, no network.
+        Balances are adjusted locally after each transfer and replaced by reconcile.
+        """
+        self.required_bandwidth = required_bandwidth
+        # address -> (balance_sun, free_bandwidth)
+        self._states: Dict[str, Tuple[int, int]] = {}
+        # address -> (sun, bandwidth), отложенные активными резервами
+        self._held: Dict[str, Tuple[int, int]] = {}
+        self._reservations: Dict[int, WalletReservation] = {}
+        # address -> (spendable_sun, fee_free), как кошелек лежит в списках
+        self._listed: Dict[str, Tuple[int, bool]] = {}
+        self._by_balance: List[Tuple[int, str]] = []
+        self._fee_free: List[Tuple[int, str]] = []
+        # address -> (token, expires_at); арендованные кошельки остаются в списках, но пропускаются при выборе
+        self._leases: Dict[str, Tuple[int, float]] = {}
+        self._tokens = itertools.count(1)
+
+    def _unlist(self, address: str):
+        listed = self._listed.pop(address, None)
+        if listed is None:
+            return
+        key = (listed[0], address)
+        self._by_balance.pop(bisect_left(self._by_balance, key))
+        if listed[1]:
+            self._fee_free.pop(bisect_left(self._fee_free, key))
+
+    def _list(self, address: str):
+        balance_sun, free_bandwidth = self._states[address]
+        held_sun, held_bandwidth = self._held.get(address, (0, 0))
+        spendable = balance_sun - held_sun
+        fee_free = free_bandwidth - held_bandwidth >= self.required_bandwidth
+        self._listed[address] = (spendable, fee_free)
+        insort(self._by_balance, (spendable, address))
+        if fee_free:
+            insort(self._fee_free, (spendable, address))
+
+    def _set_state(self, address: str, balance_sun: int, free_bandwidth: int):
+        self._unlist(address)
+        self._states[address] = (balance_sun, free_bandwidth)
+        self._list(address)
+
+    def _hold(self, address: str, sun: int, bandwidth: int):
+        held_sun, held_bandwidth = self._held.get(address, (0, 0))
+        held_sun, held_bandwidth = held_sun + sun, held_bandwidth + bandwidth
+        if held_sun == 0 and held_bandwidth == 0:
+            self._held.pop(address, None)
+        else:
+            self._held[address] = (held_sun, held_bandwidth)
+        if address in self._states:
+            self._unlist(address)
+            self._list(address)
+
+    def transfer_cost(self, amount_sun: int, fee_free: bool) -> Tuple[int, int]:
+        """(sun, bandwidth), которые уйдут с кошелька: без бесплатного bandwidth за него сжигаются TRX."""
+        if fee_free:
+            return amount_sun, self.required_bandwidth
+        return amount_sun + self.required_bandwidth * SUN_PER_BANDWIDTH, 0
+
+    def set_required_bandwidth(self, required_bandwidth: int):
+        if required_bandwidth == self.required_bandwidth:
+            return
+        self.required_bandwidth = required_bandwidth
+        for address in list(self._listed):
+            self._unlist(address)
+            self._list(address)
+
+    def update(self, state: WalletState):
+        """Заменяет локальное состояние кошелька состоянием из сети."""
+        self._set_state(state.get_address(), state.get_balance_sun(), state.get_free_bandwidth())
+
+    def discard(self, address: str):
+        """
+        Убирает кошелек из выбора до следующей сверки (например, результат отправки неизвестен).
+        Резервы на нем снимаются.
+        """
+        self._unlist(address)
+        self._states.pop(address, None)
+        self._held.pop(address, None)
+        for token in [token for token, reservation in self._reservations.items()
+                      if reservation.get_address() == address]:
+            del self._reservations[token]
+
+    def apply_transfer(self, address: str, amount_sun: int):
+        """Списывает отправленную сумму и израсходованный bandwidth (или сожженные за него TRX)."""
+        state = self._states.get(address)
+        if state is None:
+            return
+        balance_sun, free_bandwidth = state
+        sun, bandwidth = self.transfer_cost(amount_sun, free_bandwidth >= self.required_bandwidth)
+        self._set_state(address, balance_sun - sun, free_bandwidth - bandwidth)
+
+    def choose(self, amount_sun: int, include_leased: bool = False,
+               fee_free_only: bool = False) -> Optional[Tuple[str, bool]]:
+        """
+        Wallet with the smallest spendable balance that still covers amount_sun, fee-free ones first.
+        A wallet without free bandwidth must also cover the TRX burned for it.
+        Leased wallets are skipped unless include_leased; wallets that would burn TRX are skipped if fee_free_only.
+        Returns (address, fee_free) or None if no wallet has enough.
+        """
+        candidates = ((self._fee_free, True),) if fee_free_only else ((self._fee_free, True), (self._by_balance, False))
+        for wallets, fee_free in candidates:
+            target = self.transfer_cost(amount_sun, fee_free)[0]
+            for i in range(bisect_left(wallets, (target, "")), len(wallets)):
+                address = wallets[i][1]
+                if include_leased or address not in self._leases:
+                    return address, fee_free
+        return None
+
+    def reserve(self, amount_sun: int, reserve_seconds: float, now: float = None,
+                fee_free_only: bool = False) -> Optional[WalletReservation]:
+        """
+        Chooses a wallet and holds the transfer cost on it, so other quotes see only the rest.
+        The wallet may be leased now: the reservation is about capacity, not about the turn to send.
+        """
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        chosen = self.choose(amount_sun, include_leased=True, fee_free_only=fee_free_only)
+        if chosen is None:
+            return None
+        address, fee_free = chosen
+        sun, bandwidth = self.transfer_cost(amount_sun, fee_free)
+        reservation = WalletReservation(address, fee_free, sun, bandwidth, next(self._tokens), now + reserve_seconds)
+        self._reservations[reservation._token] = reservation
+        self._hold(address, sun, bandwidth)
+        return reservation
+
+    def is_reserved(self, reservation: WalletReservation) -> bool:
+        return reservation._token in self._reservations
+
+    def cancel(self, reservation: WalletReservation) -> bool:
+        """Снимает резерв. False, если он уже истек или снят."""
+        if self._reservations.pop(reservation._token, None) is None:
+            return False
+        self._hold(reservation.get_address(), -reservation._sun, -reservation._bandwidth)
+        return True
+
+    def lease(self, address: str, lease_seconds: float, now: float = None) -> Optional[WalletLease]:
+        """Turn to send from the wallet. None while another lease on it is active."""
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        if address in self._leases:
+            return None
+        lease = WalletLease(address, next(self._tokens), now + lease_seconds)
+        self._leases[address] = (lease._token, lease.get_expires_at())
+        return lease
+
+    def release(self, lease: WalletLease) -> bool:
+        """Returns the wallet to selection. False if the lease already expired and the wallet was leased again."""
+        held = self._leases.get(lease.get_address())
+        if held is None or held[0] != lease._token:
+            return False
+        del self._leases[lease.get_address()]
+        return True
+
+    def _expire(self, now: float):
+        for address in [address for address, (_, expires_at) in self._leases.items() if expires_at <= now]:
+            logger.warning(f"Lease of wallet {address} expired")
+            del self._leases[address]
+        for reservation in [reservation for reservation in self._reservations.values()
+                            if reservation.get_expires_at() <= now]:
+            logger.debug(f"Reservation on wallet {reservation.get_address()} expired")
+            self.cancel(reservation)
+
+    def get_balance_sun(self, address: str) -> Optional[int]:
+        state = self._states.get(address)
+        return None if state is None else state[0]
+
+    def max_balance_sun(self) -> Optional[int]:
+        """Largest spendable balance."""
+        return self._by_balance[-1][0] if self._by_balance else None
+
+    def leased(self) -> int:
+        return len(self._leases)
+
+    def reserved(self) -> int:
+        return len(self._reservations)
+
+    def __contains__(self, address: str):
+        return address in self._states
+
+    def __len__(self):
+        return len(self._states)
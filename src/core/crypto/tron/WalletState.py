@@ -0,0 +1,74 @@
+import time
+from decimal import Decimal
+
+from src.core.currency.Amount import sun_to_trx
+
+# Бесплатный bandwidth на аккаунт в сутки и окно, за которое расход восстанавливается
+FREE_BANDWIDTH = 600
+_WINDOW_MS = 24 * 60 * 60 * 1000
+
+
+class WalletState:
+    """
+    Balance and bandwidth of one address, taken from a single getaccount answer.
+    staked_sun is TRX staked for bandwidth (own and delegated to the wallet): the bandwidth
+    it gives depends on network totals, which getaccount does not return.
+    """
+    __slots__ = ("_address", "_balance_sun", "_free_bandwidth", "_staked_sun", "_updated_at")
+
+    def __init__(self, address: str, balance_sun: int, free_bandwidth: int, staked_sun: int, updated_at: float):
+        self._address = address
+        self._balance_sun = balance_sun
+        self._free_bandwidth = free_bandwidth
+        self._staked_sun = staked_sun
+        self._updated_at = updated_at
+
+    @classmethod
+    def from_account(cls, address: str, account: dict, now: float = None) -> "WalletState":
+        """Разбирает ответ wallet/getaccount. Пустой ответ - аккаунт еще не активирован."""
+        now = time.time() if now is None else now
+        staked = sum(frozen.get("amount", 0) for frozen in account.get("frozenV2", ())
+                     if frozen.get("type", "BANDWIDTH") == "BANDWIDTH")
+        staked += sum(frozen.get("frozen_balance", 0) for frozen in account.get("frozen", ()))
+        staked += account.get("acquired_delegated_frozenV2_balance_for_bandwidth", 0)
+        return cls(address,
+                   account.get("balance", 0),
+                   FREE_BANDWIDTH - _recovered_usage(account, now),
+                   staked,
+                   now)
+
+    def get_address(self) -> str:
+        return self._address
+
+    def get_balance_sun(self) -> int:
+        return self._balance_sun
+
+    def get_balance(self) -> Decimal:
+        """Balance in TRX, as tronpy's get_account_balance returns it."""
+        return Decimal(self._balance_sun) / 1_000_000
+
+    def get_free_bandwidth(self) -> int:
+        return self._free_bandwidth
+
+    def get_staked_sun(self) -> int:
+        return self._staked_sun
+
+    def get_updated_at(self) -> float:
+        """Unix time the state was fetched."""
+        return self._updated_at
+
+    def __repr__(self):
+        return (f"WalletState {self._address}: {self.get_balance()} TRX, "
+                f"free bandwidth {self._free_bandwidth}, staked {sun_to_trx(self._staked_sun)} TRX")
+
+
+def _recovered_usage(account: dict, now: float) -> int:
+    # Расход бесплатного bandwidth линейно восстанавливается за сутки после последнего списания
+    usage = account.get("free_net_usage", 0)
+    consumed_at = account.get("latest_consume_free_time")
+    if not usage or not consumed_at:
+        return usage
+    elapsed = now * 1000 - consumed_at
+    if elapsed >= _WINDOW_MS:
+        return 0
+    return max(0, int(usage * (_WINDOW_MS - max(elapsed, 0)) / _WINDOW_MS))
@@ -1,5 +1,8 @@
 import json
+from src.config.files import get_trx_wallets_filename
 from src.core.crypto.tron.TronWallet import TronWallet
+from src.database.codec import JsonCodec, RecordCodec, RecordSchema
+from src.database.storage import create_record_storage
 from src.util.logger import logger
 
 
@@ -19,4 +22,29 @@ class TronWalletDecoder:
         if isinstance(data, dict):
             if data.get("__type__") == "TronWallet":
                 return TronWallet.from_dict(data)
-        return data
\ No newline at end of file
+        return data
+
+
+class TronWalletSchema(RecordSchema):
+    name = "TronWallet"
+    fields = ("private_key", "blocked", "waiting_for_payment")
+
+    @staticmethod
+    def to_row(wallet: TronWallet) -> list:
+        return [wallet.get_private_key(), wallet.blocked, wallet.waiting_for_payment]
+
+    @staticmethod
+    def from_row(row: list) -> TronWallet:
+        return TronWallet(private_key=row[0], blocked=row[1], waiting_for_payment=row[2])
+
+
+def create_wallet_storage():
+    """Хранилище trx_wallets: им пользуются и бот, и процесс подписи."""
+    return create_record_storage(get_trx_wallets_filename(),
+                                 table="trx_wallets",
+                                 key=TronWallet.get_address,
+                                 default_value=[],
+                                 decode_hook=TronWalletDecoder.decode_hook,
+                                 encoder=TronWalletEncoder,
+                                 codec=RecordCodec(TronWalletSchema,
+                                                   legacy=JsonCodec(TronWalletDecoder.decode_hook, TronWalletEncoder)))
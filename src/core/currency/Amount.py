@@ -1,27 +1,73 @@
-from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
-import src.util.configs
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP, InvalidOperation, Overflow
+from typing import Optional
+
+from src.core.currency.RateSnapshot import RateSnapshot, get_rate_snapshot
+
+KOPECKS_PER_BYN = 100
+SUN_PER_TRX = 1_000_000
+
+
+def _finite_decimal(value: Decimal | str | float | int) -> Decimal:
+    number = Decimal(str(value))
+    # inf и NaN не переводятся в целые копейки/sun
+    if not number.is_finite():
+        raise InvalidOperation(f"Non-finite amount: {value}")
+    return number
+
+
+def byn_to_kopecks(byn: Decimal | str | float | int) -> int:
+    return int((_finite_decimal(byn) * KOPECKS_PER_BYN).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def kopecks_to_byn(kopecks: int) -> Decimal:
+    return Decimal(kopecks).scaleb(-2)
+
+
+def trx_to_sun(trx: Decimal | str | float | int) -> int:
+    return int((_finite_decimal(trx) * SUN_PER_TRX).to_integral_value(rounding=ROUND_DOWN))
+
+
+def sun_to_trx(sun: int) -> Decimal:
+    return Decimal(sun).scaleb(-6)
+
 
 class Amount:
-    def __init__(self, byn: Decimal | str | float = '0.0', trx: Decimal | str | float = '0.0'):
+    """
+    Сумма в копейках BYN. Сумма, введенная в TRX, дополнительно хранит точное значение в sun,
+    чтобы в сеть ушло ровно столько, сколько ввел пользователь.
+    rate - снимок курса, по которому сумма пересчитывается; без него берется текущий.
+    """
+    __slots__ = ("_kopecks", "_sun", "_rate")
+
+    def __init__(self, byn: Decimal | str | float = '0.0', trx: Decimal | str | float = '0.0',
+                 rate: Optional[RateSnapshot] = None):
         byn_provided = byn != '0.0'
         trx_provided = trx != '0.0'
 
         if byn_provided and trx_provided:
             raise ValueError("Нельзя одновременно указывать BYN и TRX при создании Amount")
 
-        self._byn: Decimal
+        self._sun: Optional[int] = None
+        self._rate = rate
 
         try:
             if trx_provided:
-                rate = Decimal(str(src.util.configs.trx_config.data['to_trx_rate']))
-                if rate == 0:
-                    raise ValueError("Курс обмена TRX не может быть нулевым.")
-                self._byn = Decimal(str(trx)) / rate
+                self._rate = rate or get_rate_snapshot()
+                self._sun = trx_to_sun(trx)
+                self._kopecks = self._rate.sun_to_kopecks(self._sun)
             else:
-                self._byn = Decimal(str(byn))
-        except (InvalidOperation, TypeError):
+                self._kopecks = byn_to_kopecks(byn)
+        except (InvalidOperation, Overflow, OverflowError, TypeError):
             raise ValueError("Некорректный формат суммы. Ожидалось число.")
 
+    @classmethod
+    def from_kopecks(cls, kopecks: int, rate: Optional[RateSnapshot] = None) -> "Amount":
+        amount = cls.__new__(cls)
+        amount._kopecks = kopecks
+        amount._sun = None
+        amount._rate = rate
+        return amount
+
     def format_trx(self) -> str:
         trx_value = self.get_to_trx()
 
@@ -40,12 +86,31 @@ class Amount:
             s = s.rstrip('0').rstrip('.')
         return s
 
+    def get_kopecks(self) -> int:
+        return self._kopecks
+
+    def get_sun(self) -> int:
+        if self._sun is not None:
+            return self._sun
+        return (self._rate or get_rate_snapshot()).kopecks_to_sun(self._kopecks)
+
+    def get_rate(self) -> Optional[RateSnapshot]:
+        return self._rate
+
     def get_byn_amount(self) -> Decimal:
-        return self._byn.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        return kopecks_to_byn(self._kopecks)
 
     def get_to_trx(self) -> Decimal:
-        rate = Decimal(str(src.util.configs.trx_config.data['to_trx_rate']))
-        return self._byn * rate
+        return sun_to_trx(self.get_sun())
+
+    def __add__(self, other: "Amount") -> "Amount":
+        return Amount.from_kopecks(self._kopecks + other._kopecks, self._rate or other._rate)
+
+    def __eq__(self, other):
+        return isinstance(other, Amount) and self._kopecks == other._kopecks and self._sun == other._sun
+
+    def __hash__(self):
+        return hash((self._kopecks, self._sun))
 
     def __repr__(self):
         return f"{self.get_byn_amount()} BYN"
@@ -53,7 +118,7 @@ class Amount:
     def to_dict(self):
         return {
             "__type__": "Amount",
-            "byn": str(self._byn)
+            "byn": str(self.get_byn_amount())
         }
 
     @classmethod
@@ -63,5 +128,5 @@ class Amount:
         return cls(byn=data.get("byn", '0.0'))
 
 
-def amount_from_trx(trx_value: float | str | Decimal) -> Amount:
-    return Amount(trx=trx_value)
\ No newline at end of file
+def amount_from_trx(trx_value: float | str | Decimal, rate: Optional[RateSnapshot] = None) -> Amount:
+    return Amount(trx=trx_value, rate=rate)
@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+from typing import Optional
+
+import src.util.configs
+from src.util.logger import logger
+
+_DEFAULT_FEE_BYN = 0.35
+# Как часто проверять, не изменился ли файл конфига
+_CHECK_INTERVAL = 1.0
+
+
+class RateSnapshot:
+    """
+    Курс TRX и комиссия, разобранные из trx_config один раз.
+    Неизменяем: котировка, списание и отправка в сеть считаются по одному снимку.
+    version растет при каждом изменении курса или комиссии в конфиге.
+    """
+    __slots__ = ("_version", "_to_trx_rate", "_fee_kopecks")
+
+    def __init__(self, version: int, to_trx_rate: Decimal, fee_kopecks: int):
+        if to_trx_rate == 0:
+            raise ValueError("Курс обмена TRX не может быть нулевым.")
+        object.__setattr__(self, "_version", version)
+        object.__setattr__(self, "_to_trx_rate", to_trx_rate)
+        object.__setattr__(self, "_fee_kopecks", fee_kopecks)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RateSnapshot is immutable")
+
+    def get_version(self) -> int:
+        return self._version
+
+    def get_to_trx_rate(self) -> Decimal:
+        return self._to_trx_rate
+
+    def get_fee_kopecks(self) -> int:
+        return self._fee_kopecks
+
+    def kopecks_to_sun(self, kopecks: int) -> int:
+        # копейки * курс / 100 = TRX, TRX * 10^6 = sun
+        return int((Decimal(kopecks) * self._to_trx_rate * 10_000).to_integral_value(rounding=ROUND_DOWN))
+
+    def sun_to_kopecks(self, sun: int) -> int:
+        return int((Decimal(sun) / self._to_trx_rate / 10_000).to_integral_value(rounding=ROUND_HALF_UP))
+
+    def same_values(self, other: "RateSnapshot") -> bool:
+        return self._to_trx_rate == other._to_trx_rate and self._fee_kopecks == other._fee_kopecks
+
+    def __repr__(self):
+        return f"RateSnapshot [v{self._version}] rate {self._to_trx_rate}, fee {self._fee_kopecks} kopecks"
+
+
+_lock = threading.Lock()
+_current: Optional[RateSnapshot] = None
+_config_stamp = None
+_checked_at = 0.0
+
+
+def _stamp(path: str):
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+
+def _parse(version: int, data) -> RateSnapshot:
+    fee = Decimal(str(data.get('transaction_fee_byn', _DEFAULT_FEE_BYN)))
+    return RateSnapshot(version,
+                        Decimal(str(data['to_trx_rate'])),
+                        int((fee * 100).to_integral_value(rounding=ROUND_HALF_UP)))
+
+
+def get_rate_snapshot() -> RateSnapshot:
+    """
+    Текущий снимок курса. Файл конфига проверяется не чаще раза в секунду,
+    перечитывается и разбирается только если изменился.
+    """
+    global _current, _config_stamp, _checked_at
+    current = _current
+    now = time.monotonic()
+    if current is not None and now - _checked_at < _CHECK_INTERVAL:
+        return current
+
+    config = src.util.configs.trx_config
+    stamp = _stamp(config.file_path)
+    _checked_at = now
+    if current is not None and stamp == _config_stamp:
+        return current
+
+    with _lock:
+        if _current is not None and stamp == _config_stamp:
+            return _current
+        if _current is None:
+            snapshot = _parse(1, config.data)
+        else:
+            # Недописанный или битый файл не должен подменить рабочий конфиг:
+            # новые данные принимаются, только если из них разобрался снимок
+            try:
+                data = config.read_file()
+                if not isinstance(data, dict):
+                    raise ValueError("config must be a JSON object")
+                snapshot = _parse(_current.get_version() + 1, data)
+            except Exception as e:
+                logger.error(f"Keeping previous config, failed to reload {config.file_path}: {str(e)}")
+                _config_stamp = stamp
+                return _current
+            config.replace_loaded(data)
+        if _current is None or not snapshot.same_values(_current):
+            _current = snapshot
+            logger.info(f"Exchange rate loaded: {snapshot}")
+        _config_stamp = stamp
+        return _current
@@ -0,0 +1,6 @@
+class TransferOutcomeUnknown(Exception):
+    """Транзакция подписана и отправлена, но ответа сети нет: она могла попасть в блок."""
+
+    def __init__(self, txid: str, message: str):
+        super().__init__(message)
+        self.txid = txid
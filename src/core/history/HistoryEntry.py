@@ -0,0 +1,27 @@
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Optional
+
+
+class HistoryKind(Enum):
+    TRANSFER = "transfer"
+    PAYMENT = "payment"
+    REFUND = "refund"
+    CREDIT = "credit"
+
+
+class HistoryEntry:
+    def __init__(self, entry_id: int, tg_id: int, created_at: datetime, kind: HistoryKind, amount: Decimal,
+                 counterparty: Optional[str] = None, reference: Optional[str] = None):
+        self.entry_id = entry_id
+        self.tg_id = tg_id
+        self.created_at = created_at
+        self.kind = kind
+        self.amount = amount
+        self.counterparty = counterparty
+        self.reference = reference
+
+    def __repr__(self):
+        return (f"HistoryEntry [#{self.entry_id}] {self.kind.value} {self.amount} BYN for {self.tg_id}"
+                f" ({self.counterparty or '-'}) at {self.created_at:%Y-%m-%d %H:%M:%S}")
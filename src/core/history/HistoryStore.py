@@ -0,0 +1,94 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable, List, Optional, Tuple
+
+from src.core.history.HistoryEntry import HistoryEntry, HistoryKind
+from src.util.logger import logger
+
+_COLUMNS = "id, tg_id, created_at, kind, amount, counterparty, reference"
+
+
+class HistoryStore:
+    def __init__(self, db_path: str):
+        """
+        Append-only store of balance operations per user (SQLite, WAL mode).
+        Pages are read by (tg_id, id) index, so their cost does not depend on the store size.
+        """
+        self.db_path = db_path
+        # Операции пишутся и из потоков AccountManager, соединение общее под self._lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tg_id INTEGER NOT NULL,
+                created_at INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                amount TEXT NOT NULL,
+                counterparty TEXT,
+                reference TEXT
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS history_tg_id_id ON history (tg_id, id)")
+        self._conn.commit()
+
+    def record(self, tg_id: int, kind: HistoryKind, amount: Decimal,
+               counterparty: Optional[str] = None, reference: Optional[str] = None) -> None:
+        self.record_many([(tg_id, kind, amount, counterparty, reference)])
+
+    def record_many(self, entries: Iterable[Tuple[int, HistoryKind, Decimal, Optional[str], Optional[str]]]) -> None:
+        """Records several entries in one transaction (e.g. both sides of a transfer)."""
+        now = int(time.time() * 1000)
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT INTO history (tg_id, created_at, kind, amount, counterparty, reference) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(tg_id, now, kind.value, str(amount),
+                      None if counterparty is None else str(counterparty), reference)
+                     for tg_id, kind, amount, counterparty, reference in entries]
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Failed to write history to {self.db_path}: {str(e)}")
+
+    def has_entry(self, tg_id: int, kind: HistoryKind, reference: str) -> bool:
+        """Whether the user has an entry of the kind recorded with the reference."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM history WHERE tg_id = ? AND kind = ? AND reference = ? LIMIT 1",
+                (tg_id, kind.value, reference)
+            ).fetchone()
+        return row is not None
+
+    def get_page(self, tg_id: int, before_id: Optional[int] = None, limit: int = 10) -> List[HistoryEntry]:
+        """Newest entries of a user, older than before_id if given."""
+        with self._lock:
+            if before_id is None:
+                rows = self._conn.execute(
+                    f"SELECT {_COLUMNS} FROM history WHERE tg_id = ? ORDER BY id DESC LIMIT ?",
+                    (tg_id, limit)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    f"SELECT {_COLUMNS} FROM history WHERE tg_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                    (tg_id, before_id, limit)
+                ).fetchall()
+        return [self._to_entry(row) for row in rows]
+
+    @staticmethod
+    def _to_entry(row) -> HistoryEntry:
+        entry_id, tg_id, created_at, kind, amount, counterparty, reference = row
+        return HistoryEntry(entry_id=entry_id,
+                            tg_id=tg_id,
+                            created_at=datetime.fromtimestamp(created_at / 1000),
+                            kind=HistoryKind(kind),
+                            amount=Decimal(amount),
+                            counterparty=counterparty,
+                            reference=reference)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
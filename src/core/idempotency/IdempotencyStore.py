@@ -0,0 +1,103 @@
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional
+
+from src.config.files import get_idempotency_filename
+from src.util.logger import logger
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+
+
+def generate_transaction_id():
+    return str(uuid.uuid4())[:8]
+
+
+class IdempotencyStore:
+    def __init__(self, db_path: str, capacity: int = 10_000, prune_every: int = 100):
+        """
+        Persisted dedupe table for payment and transfer confirmations, keyed by (tg_id, transaction_id).
+        Keeps the last `capacity` operations, older ones are pruned every `prune_every` claims.
+        """
+        self.db_path = db_path
+        self.capacity = capacity
+        self.prune_every = prune_every
+        self._claims = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS idempotency (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                tg_id INTEGER NOT NULL,
+                transaction_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                created_at INTEGER NOT NULL,
+                UNIQUE (tg_id, transaction_id)
+            )""")
+        self._conn.commit()
+
+    def claim(self, tg_id: int, transaction_id: str, kind: str) -> Optional[tuple[str, Optional[str]]]:
+        """
+        Marks the operation as started.
+        Returns None if it is new, otherwise (status, result) of the earlier attempt.
+        Claim is persisted before the ledger is touched, so a replay after a crash sees it as pending.
+        """
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    "INSERT INTO idempotency (tg_id, transaction_id, kind, status, created_at) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (tg_id, transaction_id) DO NOTHING",
+                    (tg_id, transaction_id, kind, STATUS_PENDING, int(time.time() * 1000))
+                )
+            if cursor.rowcount == 0:
+                row = self._conn.execute(
+                    "SELECT status, result FROM idempotency WHERE tg_id = ? AND transaction_id = ?",
+                    (tg_id, transaction_id)
+                ).fetchone()
+                logger.warning(f"Replayed {kind} {transaction_id} from {tg_id}: {row[0]}")
+                return row[0], row[1]
+
+            self._claims += 1
+            if self._claims % self.prune_every == 0:
+                self._prune()
+            return None
+
+    def complete(self, tg_id: int, transaction_id: str, result: str) -> None:
+        """Stores the result returned to the user, replays get the same result."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE idempotency SET status = ?, result = ? WHERE tg_id = ? AND transaction_id = ?",
+                (STATUS_DONE, result, tg_id, transaction_id)
+            )
+
+    def release(self, tg_id: int, transaction_id: str) -> None:
+        """Forgets a claim whose operation failed before changing anything, so it can be retried."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM idempotency WHERE tg_id = ? AND transaction_id = ? AND status = ?",
+                (tg_id, transaction_id, STATUS_PENDING)
+            )
+
+    def _prune(self) -> None:
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM idempotency WHERE seq <= (SELECT MAX(seq) FROM idempotency) - ?",
+                (self.capacity,)
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM idempotency").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+idempotency_store = IdempotencyStore(get_idempotency_filename())
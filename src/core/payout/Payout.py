@@ -0,0 +1,97 @@
+from decimal import Decimal
+from typing import Optional
+
+from src.core.currency.Amount import Amount, kopecks_to_byn, sun_to_trx
+
+# Запись создана, списание с баланса еще не подтверждено
+STATUS_DEBITING = "debiting"
+# Списано, ждет отправки (в том числе повторной)
+STATUS_PENDING = "pending"
+# Взята на отправку
+STATUS_SENDING = "sending"
+# Транзакция отправлена, ждет необратимого блока
+STATUS_SENT = "sent"
+STATUS_CONFIRMED = "confirmed"
+# Попытки исчерпаны, списание еще не возвращено
+STATUS_DEAD = "dead"
+STATUS_REFUNDED = "refunded"
+# Исход неизвестен (транзакция могла уйти в сеть), нужна ручная проверка; автоматически не возвращается
+STATUS_REVIEW = "review"
+
+FINAL_STATUSES = (STATUS_CONFIRMED, STATUS_REFUNDED, STATUS_REVIEW)
+
+
+class Payout:
+    """Выплата из outbox: кому, сколько TRX и сколько BYN списано с пользователя."""
+    __slots__ = ("_id", "_tg_id", "_transaction_id", "_address", "_amount_sun", "_debit_kopecks", "_fee_kopecks",
+                 "_status", "_attempts", "_txid", "_wallet", "_error", "_updated_at")
+
+    def __init__(self, payout_id: int, tg_id: int, transaction_id: str, address: str, amount_sun: int,
+                 debit_kopecks: int, fee_kopecks: int, status: str, attempts: int = 0, txid: Optional[str] = None,
+                 wallet: Optional[str] = None, error: Optional[str] = None, updated_at: float = 0.0):
+        self._id = payout_id
+        self._tg_id = tg_id
+        self._transaction_id = transaction_id
+        self._address = address
+        self._amount_sun = amount_sun
+        self._debit_kopecks = debit_kopecks
+        self._fee_kopecks = fee_kopecks
+        self._status = status
+        self._attempts = attempts
+        self._txid = txid
+        self._wallet = wallet
+        self._error = error
+        self._updated_at = updated_at
+
+    def get_id(self) -> int:
+        return self._id
+
+    def get_tg_id(self) -> int:
+        return self._tg_id
+
+    def get_transaction_id(self) -> str:
+        return self._transaction_id
+
+    def get_address(self) -> str:
+        return self._address
+
+    def get_amount_sun(self) -> int:
+        return self._amount_sun
+
+    def get_amount_trx(self) -> Decimal:
+        return sun_to_trx(self._amount_sun)
+
+    def get_debit(self) -> Amount:
+        """Сумма с комиссией, списанная с пользователя."""
+        return Amount.from_kopecks(self._debit_kopecks)
+
+    def get_debit_byn(self) -> Decimal:
+        return kopecks_to_byn(self._debit_kopecks)
+
+    def is_fee_free(self) -> bool:
+        """Котировка была без комиссии сети: повторная отправка возможна только с кошелька без комиссии."""
+        return self._fee_kopecks == 0
+
+    def get_status(self) -> str:
+        return self._status
+
+    def get_attempts(self) -> int:
+        return self._attempts
+
+    def get_txid(self) -> Optional[str]:
+        return self._txid
+
+    def get_wallet(self) -> Optional[str]:
+        """Адрес сервисного кошелька, с которого ушла транзакция."""
+        return self._wallet
+
+    def get_error(self) -> Optional[str]:
+        return self._error
+
+    def get_updated_at(self) -> float:
+        """Unix time of the last status change."""
+        return self._updated_at
+
+    def __repr__(self):
+        return (f"Payout [#{self._id}] {self.get_amount_trx()} TRX to {self._address} for {self._tg_id}: "
+                f"{self._status}, {self._attempts} attempt(s)")
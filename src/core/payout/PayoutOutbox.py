@@ -0,0 +1,159 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from src.config.files import get_payouts_filename
+from src.core.payout.Payout import (Payout, STATUS_DEBITING, STATUS_PENDING, STATUS_REVIEW, STATUS_SENDING)
+from src.util.logger import logger
+
+_COLUMNS = ("id, tg_id, transaction_id, address, amount_sun, debit_kopecks, fee_kopecks, status, attempts, txid, "
+            "wallet, error, updated_at")
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class PayoutOutbox:
+    def __init__(self, db_path: str):
+        """
+        Durable queue of TRX payouts (SQLite, WAL, synchronous=FULL).
+        A payout is recorded before the user is debited and leaves the queue only in a final status,
+        so a restart never loses a debited payment.
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS payouts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tg_id INTEGER NOT NULL,
+                transaction_id TEXT NOT NULL,
+                address TEXT NOT NULL,
+                amount_sun INTEGER NOT NULL,
+                debit_kopecks INTEGER NOT NULL,
+                fee_kopecks INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at INTEGER NOT NULL,
+                txid TEXT,
+                wallet TEXT,
+                error TEXT,
+                created_at INTEGER NOT NULL,
+                updated_at INTEGER NOT NULL,
+                UNIQUE (tg_id, transaction_id)
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS payouts_status_next ON payouts (status, next_attempt_at)")
+        self._conn.commit()
+
+    def add(self, tg_id: int, transaction_id: str, address: str, amount_sun: int, debit_kopecks: int,
+            fee_kopecks: int) -> Payout:
+        """
+        Records a payout in STATUS_DEBITING. debit_kopecks includes the quoted network fee fee_kopecks.
+        Raises sqlite3.IntegrityError for a duplicate transaction_id.
+        """
+        now = _now_ms()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO payouts (tg_id, transaction_id, address, amount_sun, debit_kopecks, fee_kopecks, status, "
+                "next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (tg_id, transaction_id, address, amount_sun, debit_kopecks, fee_kopecks, STATUS_DEBITING, now, now, now)
+            )
+        return Payout(cursor.lastrowid, tg_id, transaction_id, address, amount_sun, debit_kopecks, fee_kopecks,
+                      STATUS_DEBITING, updated_at=now / 1000)
+
+    def forget(self, payout_id: int) -> None:
+        """Deletes a payout whose debit did not happen."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM payouts WHERE id = ? AND status = ?", (payout_id, STATUS_DEBITING))
+
+    def update(self, payout_id: int, status: str, expected: Optional[str] = None,
+               txid: Optional[str] = None, wallet: Optional[str] = None, error: Optional[str] = None) -> bool:
+        """
+        Moves the payout to status, only from `expected` if given. txid, wallet and error are kept if None.
+        Returns False if the payout is missing or in another status.
+        """
+        query = ("UPDATE payouts SET status = ?, txid = COALESCE(?, txid), wallet = COALESCE(?, wallet), "
+                 "error = COALESCE(?, error), updated_at = ? WHERE id = ?")
+        params = [status, txid, wallet, error, _now_ms(), payout_id]
+        if expected is not None:
+            query += " AND status = ?"
+            params.append(expected)
+        with self._lock, self._conn:
+            return self._conn.execute(query, params).rowcount == 1
+
+    def retry(self, payout_id: int, delay: float, error: str, expected: str = STATUS_SENDING) -> None:
+        """
+        Returns a payout that was not paid to the queue, due in `delay` seconds: one being sent or,
+        with expected=STATUS_SENT, one whose transaction expired or failed.
+        """
+        now = _now_ms()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE payouts SET status = ?, next_attempt_at = ?, error = ?, updated_at = ? "
+                "WHERE id = ? AND status = ?",
+                (STATUS_PENDING, now + int(delay * 1000), error, now, payout_id, expected)
+            )
+
+    def claim_due(self, limit: int = 1) -> List[Payout]:
+        """Takes up to `limit` due payouts, oldest first, into STATUS_SENDING and counts the attempt."""
+        now = _now_ms()
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                f"UPDATE payouts SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id IN ("
+                f"SELECT id FROM payouts WHERE status = ? AND next_attempt_at <= ? "
+                f"ORDER BY next_attempt_at, id LIMIT ?) RETURNING {_COLUMNS}",
+                (STATUS_SENDING, now, STATUS_PENDING, now, limit)
+            ).fetchall()
+        return [self._to_payout(row) for row in rows]
+
+    def recover(self) -> List[Payout]:
+        """
+        Called once at startup. Payouts left in STATUS_SENDING by a crash have an unknown outcome
+        (the broadcast may have happened) and go to STATUS_REVIEW.
+        Payouts left in STATUS_DEBITING are resolved by the payout service against the debit history.
+        """
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                f"UPDATE payouts SET status = ?, error = 'interrupted while ' || status, updated_at = ? "
+                f"WHERE status = ? RETURNING {_COLUMNS}",
+                (STATUS_REVIEW, _now_ms(), STATUS_SENDING)
+            ).fetchall()
+        payouts = [self._to_payout(row) for row in rows]
+        for payout in payouts:
+            logger.critical(f"{payout} was interrupted ({payout.get_error()}), moved to review")
+        return payouts
+
+    def get(self, payout_id: int) -> Optional[Payout]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM payouts WHERE id = ?", (payout_id,)).fetchone()
+        return None if row is None else self._to_payout(row)
+
+    def list(self, status: str, limit: int = 20) -> List[Payout]:
+        """Oldest payouts in the status."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM payouts WHERE status = ? ORDER BY id LIMIT ?", (status, limit)
+            ).fetchall()
+        return [self._to_payout(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM payouts GROUP BY status").fetchall())
+
+    @staticmethod
+    def _to_payout(row) -> Payout:
+        (payout_id, tg_id, transaction_id, address, amount_sun, debit_kopecks, fee_kopecks, status, attempts, txid,
+         wallet, error, updated_at) = row
+        return Payout(payout_id, tg_id, transaction_id, address, amount_sun, debit_kopecks, fee_kopecks, status,
+                      attempts=attempts, txid=txid, wallet=wallet, error=error, updated_at=updated_at / 1000)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+payout_outbox = PayoutOutbox(get_payouts_filename())
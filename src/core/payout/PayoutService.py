@@ -0,0 +1,265 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from src.core.account.AccountManager import account_manager
+from src.core.crypto.tron.ConfirmationTracker import (ConfirmationTracker, OUTCOME_CONFIRMED, OUTCOME_EXPIRED,
+                                                      TrackedTransaction)
+from src.core.crypto.tron.PaymentQuote import PaymentQuote
+from src.core.crypto.tron.PayReceipt import PayReceipt
+from src.core.crypto.tron.TronManager import (PayResult, get_rpc_concurrency, get_wallet_query_deadline,
+                                              tron_manager)
+from src.core.currency.Amount import amount_from_trx
+from src.core.payout.Payout import (Payout, STATUS_CONFIRMED, STATUS_DEAD, STATUS_DEBITING, STATUS_PENDING,
+                                    STATUS_REFUNDED, STATUS_SENDING, STATUS_SENT)
+from src.core.payout.PayoutOutbox import PayoutOutbox, payout_outbox
+from src.util.logger import logger
+import src.util.configs
+
+# Без уведомления свободный обработчик заглядывает в outbox раз в секунду (повторы по расписанию)
+_IDLE_POLL_SECONDS = 1.0
+_MAX_RETRY_DELAY = 600
+
+
+def get_payout_workers() -> int:
+    return int(src.util.configs.trx_config.data.get('payout_workers', 4))
+
+
+def get_payout_max_attempts() -> int:
+    return int(src.util.configs.trx_config.data.get('payout_max_attempts', 5))
+
+
+def get_payout_retry_delay() -> float:
+    """Пауза перед первым повтором, дальше она удваивается до _MAX_RETRY_DELAY."""
+    return float(src.util.configs.trx_config.data.get('payout_retry_delay', 10))
+
+
+def _debit_operation(payout_id: int) -> str:
+    # Идентификатор списания в истории: по нему восстанавливается выплата, прерванная в STATUS_DEBITING
+    return f"payout:{payout_id}"
+
+
+class PayoutService:
+    def __init__(self, outbox: PayoutOutbox):
+        """
+        Payouts through the outbox: submit() debits the user and queues the payout, a pool of workers
+        sends queued payouts, retries failed sends with exponential backoff and, when attempts run out,
+        moves the payout to the dead letter status and refunds the debit.
+        A sent payout waits in STATUS_SENT for the confirmation tracker: a confirmed transaction
+        completes it, a failed or expired one counts as a failed attempt.
+        on_final is called once a payout reaches STATUS_CONFIRMED, STATUS_REFUNDED or STATUS_REVIEW.
+        """
+        self.outbox = outbox
+        self.tracker = ConfirmationTracker(tron_manager.client, get_rpc_concurrency(), get_wallet_query_deadline())
+        self.on_final: Optional[Callable[[Payout], Awaitable[None]]] = None
+        # Котировки, показанные пользователю: первая попытка идет с отложенного под нее кошелька.
+        # После перезапуска их нет, и котировка строится заново
+        self._quotes: Dict[int, PaymentQuote] = {}
+        self._wake = asyncio.Condition()
+        self._workers: List[asyncio.Task] = []
+        self._stopping = False
+
+    async def submit(self, tg_id: int, transaction_id: str, address: str, quote: PaymentQuote) -> Optional[Payout]:
+        """
+        Records the payout, debits the quote total and queues the payout.
+        Returns None if the user has not enough funds.
+        """
+        total = quote.get_total()
+        payout = self.outbox.add(tg_id, transaction_id, address, quote.get_amount().get_sun(), total.get_kopecks(),
+                                 quote.get_fee().get_kopecks())
+        try:
+            debited = await account_manager.subtract_from_balance_async(tg_id, total, reference=address,
+                                                                        operation=_debit_operation(payout.get_id()))
+        except Exception:
+            self.outbox.forget(payout.get_id())
+            raise
+        if not debited:
+            self.outbox.forget(payout.get_id())
+            return None
+
+        # Списание должно быть на диске раньше, чем выплата станет видна обработчикам.
+        # Если запись не удалась, выплата остается в STATUS_DEBITING и решается при запуске (_resolve_debit)
+        await account_manager.flush()
+        self._quotes[payout.get_id()] = quote
+        self.outbox.update(payout.get_id(), STATUS_PENDING, expected=STATUS_DEBITING)
+        logger.info(f"Queued {payout}")
+        async with self._wake:
+            self._wake.notify()
+        return self.outbox.get(payout.get_id())
+
+    async def start(self, on_final: Callable[[Payout], Awaitable[None]]):
+        """
+        Recovers interrupted payouts, finishes pending refunds, resumes tracking of sent payouts
+        and starts the workers.
+        """
+        self.on_final = on_final
+        self._stopping = False
+        for payout in self.outbox.list(STATUS_DEBITING, limit=-1):
+            self._resolve_debit(payout)
+        for payout in self.outbox.recover():
+            await self._notify(payout)
+        for payout in self.outbox.list(STATUS_DEAD, limit=-1):
+            await self._refund(payout)
+        sent = self.outbox.list(STATUS_SENT, limit=-1)
+        for payout in sent:
+            # STATUS_SENT ставится сразу после отправки, так что updated_at - время отправки
+            self.tracker.track(payout.get_txid(), payout.get_id(), payout.get_tg_id(), payout.get_wallet(),
+                               broadcast_at=payout.get_updated_at())
+        if sent:
+            logger.info(f"Resumed confirmation tracking of {len(sent)} payout(s)")
+        self.tracker.start(self._on_outcome)
+        workers = get_payout_workers()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(workers)]
+        logger.info(f"Payout workers started: {workers}")
+
+    def _resolve_debit(self, payout: Payout):
+        """
+        A payout left in STATUS_DEBITING by a crash or a failed flush: the history entry of its debit
+        tells whether the user was debited. A debited payout is queued, any other one is dropped.
+        """
+        if account_manager.was_subtracted(payout.get_tg_id(), _debit_operation(payout.get_id())):
+            self.outbox.update(payout.get_id(), STATUS_PENDING, expected=STATUS_DEBITING)
+            logger.warning(f"{payout} was interrupted after the debit, queued")
+        else:
+            self.outbox.forget(payout.get_id())
+            logger.warning(f"{payout} was interrupted before the debit, dropped")
+
+    async def stop(self):
+        """
+        Lets the workers finish the payouts they are sending, then stops them and the tracker.
+        Tracking of sent payouts resumes on the next start.
+        """
+        self._stopping = True
+        await self.tracker.stop()
+        async with self._wake:
+            self._wake.notify_all()
+        if not self._workers:
+            return
+        _, pending = await asyncio.wait(self._workers, timeout=tron_manager.client.get_transfer_timeout())
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._workers = []
+
+    async def _work(self):
+        while not self._stopping:
+            claimed = self.outbox.claim_due()
+            if not claimed:
+                async with self._wake:
+                    try:
+                        async with asyncio.timeout(_IDLE_POLL_SECONDS):
+                            await self._wake.wait()
+                    except TimeoutError:
+                        pass
+                continue
+            try:
+                await self._send(claimed[0])
+            except Exception as e:
+                # Ошибка после отправки в сеть: выплата остается в STATUS_SENDING и после перезапуска уйдет на проверку
+                logger.critical(f"Payout worker failed on {claimed[0]}: {e!r}")
+
+    async def _send(self, payout: Payout):
+        try:
+            receipt = await self._pay(payout)
+        except Exception as e:
+            # До отправки в сеть (подписчик, список кошельков, аренда): транзакция не ушла, повтор безопасен
+            logger.error(f"Payout #{payout.get_id()} failed before broadcast: {e!r}")
+            await self._retry_or_fail(payout, f"failed before broadcast: {e!r}")
+            return
+        if receipt is None:
+            await self._retry_or_fail(payout, "not enough balance on service wallets")
+            return
+
+        result = receipt.get_result()
+        if result in (PayResult.COMPLETED, PayResult.COMPLETED_FEE, PayResult.UNKNOWN):
+            # Об исходе (в том числе неизвестном исходе отправки) скажет трекер подтверждений
+            error = "broadcast outcome unknown" if result == PayResult.UNKNOWN else None
+            self.outbox.update(payout.get_id(), STATUS_SENT, expected=STATUS_SENDING, txid=receipt.get_txid(),
+                               wallet=receipt.get_wallet_address(), error=error)
+            self.tracker.track(receipt.get_txid(), payout.get_id(), payout.get_tg_id(), receipt.get_wallet_address())
+            logger.info(f"Payout #{payout.get_id()} sent: {receipt}")
+        elif result == PayResult.QUOTE_EXPIRED:
+            await self._retry_or_fail(payout, "quote expired")
+        else:
+            await self._retry_or_fail(payout, "transaction was not accepted")
+
+    async def _pay(self, payout: Payout) -> Optional[PayReceipt]:
+        """
+        Pays the quote shown to the user or a new one of the same fee class, None if no wallet can pay.
+        Raises only before a transaction is broadcast (see TronManager.pay).
+        """
+        quote = self._quotes.pop(payout.get_id(), None)
+        receipt = None if quote is None else await self._pay_quote(payout, quote)
+        if receipt is None or receipt.get_result() == PayResult.QUOTE_EXPIRED:
+            # Котировки нет (повтор или перезапуск) или ее резерв истек: кошелек выбирается заново,
+            # но только в оплаченном пользователем классе комиссии
+            try:
+                quote = await tron_manager.quote(amount_from_trx(payout.get_amount_trx()),
+                                                 fee_free_only=payout.is_fee_free())
+            except ValueError:
+                return None
+            receipt = await self._pay_quote(payout, quote)
+        return receipt
+
+    @staticmethod
+    async def _pay_quote(payout: Payout, quote: PaymentQuote) -> PayReceipt:
+        try:
+            return await tron_manager.pay(payout.get_address(), quote)
+        except Exception:
+            # Резерв не должен держать баланс кошелька до истечения котировки
+            tron_manager.cancel_quote(quote)
+            raise
+
+    async def _on_outcome(self, tracked: TrackedTransaction, outcome: str):
+        payout_id = tracked.get_payout_id()
+        if outcome == OUTCOME_CONFIRMED:
+            if self.outbox.update(payout_id, STATUS_CONFIRMED, expected=STATUS_SENT):
+                await self._finish(payout_id)
+            return
+        payout = self.outbox.get(payout_id)
+        if payout is None or payout.get_status() != STATUS_SENT:
+            return
+        # Истекшая транзакция уже не попадет в сеть, упавшая не перевела TRX: повтор не приведет к двойной выплате
+        error = "transaction expired" if outcome == OUTCOME_EXPIRED else "transaction failed"
+        await self._retry_or_fail(payout, f"{error}: {tracked.get_txid()}")
+
+    async def _retry_or_fail(self, payout: Payout, error: str):
+        """Retries or, when attempts run out, refunds a payout in STATUS_SENDING or STATUS_SENT."""
+        if payout.get_attempts() < get_payout_max_attempts():
+            delay = min(get_payout_retry_delay() * 2 ** (payout.get_attempts() - 1), _MAX_RETRY_DELAY)
+            logger.warning(f"Payout #{payout.get_id()} attempt {payout.get_attempts()} failed ({error}), "
+                           f"retry in {delay:.0f} s")
+            self.outbox.retry(payout.get_id(), delay, error, expected=payout.get_status())
+            async with self._wake:
+                self._wake.notify()
+            return
+        self._quotes.pop(payout.get_id(), None)
+        self.outbox.update(payout.get_id(), STATUS_DEAD, expected=payout.get_status(), error=error)
+        logger.critical(f"Payout #{payout.get_id()} failed after {payout.get_attempts()} attempts: {error}")
+        await self._refund(self.outbox.get(payout.get_id()))
+
+    async def _refund(self, payout: Payout):
+        """Compensating entry for a dead payout: the debit goes back to the user's balance."""
+        refunded = await account_manager.refund_async(payout.get_tg_id(), payout.get_debit(),
+                                                      reference=payout.get_address())
+        if not refunded:
+            # Аккаунта нет: выплата остается в STATUS_DEAD, возврат повторится при следующем запуске
+            logger.critical(f"Refund of payout #{payout.get_id()} failed")
+            return
+        await account_manager.flush()
+        self.outbox.update(payout.get_id(), STATUS_REFUNDED, expected=STATUS_DEAD)
+        logger.info(f"Payout #{payout.get_id()} refunded: {payout.get_debit_byn()} BYN to {payout.get_tg_id()}")
+        await self._finish(payout.get_id())
+
+    async def _finish(self, payout_id: int):
+        await self._notify(self.outbox.get(payout_id))
+
+    async def _notify(self, payout: Payout):
+        if self.on_final is None:
+            return
+        try:
+            await self.on_final(payout)
+        except Exception as e:
+            logger.error(f"Failed to notify about {payout}: {e!r}")
+
+
+payout_service = PayoutService(payout_outbox)
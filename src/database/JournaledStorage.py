@@ -0,0 +1,197 @@
+import json
+import os
+import threading
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+
+from src.database.JsonFileStorage import JsonFileStorage
+from src.database.codec import RecordCodec
+from src.util.logger import logger
+
+
+class JournaledStorage(JsonFileStorage):
+    def __init__(self, file_path: str, key: Callable[[Any], Hashable], decode_hook=None, encoder=None,
+                 default_value: Any = None, snapshot_every: int = 1000, codec=None):
+        """
+        Creates journaled JSON storage for a list of records.
+        Mutations are appended to a journal as small delta records, the snapshot
+        (file_path, same format as JsonFileStorage) is compacted in the background.
+        Every journal entry has a sequence number and the snapshot stores the last one it contains,
+        so entries already in the snapshot are never replayed over it.
+        :param file_path: path to snapshot
+        :param key: returns unique key of a record, used to apply deltas
+        :param snapshot_every: number of journal entries after which the journal is compacted
+        :param codec: RecordCodec of the records, it stores the sequence numbers
+        """
+        if not isinstance(codec, RecordCodec):
+            raise ValueError("Journaled storage requires a RecordCodec")
+        self._key = key
+        self.snapshot_every = snapshot_every
+        self.journal_path = os.path.splitext(file_path)[0] + ".journal"
+        self.sealed_path = self.journal_path + ".sealed"
+        self._journal = None
+        self._entries = 0
+        # Номер последней записи журнала
+        self._seq = 0
+        self._compaction: Optional[threading.Thread] = None
+        super().__init__(file_path, decode_hook=decode_hook, encoder=encoder, default_value=default_value,
+                         codec=codec)
+
+    def _load(self) -> Any:
+        try:
+            snapshot, seq = self._read_snapshot()
+        except Exception as e:
+            # Не продолжаем со старым журналом поверх битого снимка: компакция затерла бы данные
+            logger.critical(f"Failed to read snapshot {self.file_path}: {str(e)}")
+            raise
+        records = {self._key(record): record for record in (snapshot or [])}
+
+        sealed, seq = self._replay(self.sealed_path, records, seq)
+        replayed, seq = self._replay(self.journal_path, records, seq)
+        self._seq = seq or 0
+        if sealed + replayed:
+            logger.debug(f"Replayed {sealed + replayed} journal entries over {self.file_path}")
+
+        self._open_journal()
+        if os.path.exists(self.sealed_path):
+            self._start_compaction()
+
+        if snapshot is None and not records:
+            return self.default_value
+        return list(records.values())
+
+    def _read_snapshot(self) -> Tuple[Optional[List[Any]], Optional[int]]:
+        """Records of the snapshot and the last journal entry in it (None if it was not written by journal)."""
+        if not os.path.exists(self.file_path) or os.path.getsize(self.file_path) == 0:
+            return None, None
+        with open(self.file_path, "r", encoding="utf-8") as f:
+            return self._codec.loads_with_seq(f.read())
+
+    def _replay(self, path: str, records: dict, after: Optional[int]) -> Tuple[int, Optional[int]]:
+        """
+        Applies the entries of a journal file numbered above `after`.
+        Returns the number of applied entries and the last entry number seen.
+        """
+        if not os.path.exists(path):
+            return 0, after
+
+        replayed = 0
+        last = after
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    entry, seq = self._codec.loads_with_seq(line)
+                except json.JSONDecodeError as e:
+                    # Оборванная последняя запись после падения процесса
+                    logger.warning(f"Skipping broken journal entry {path}:{line_no}: {str(e)}")
+                    continue
+                if seq is not None and after is not None and seq <= after:
+                    # Запись уже в снимке (падение между записью снимка и очисткой журнала)
+                    continue
+                for record in entry:
+                    records[self._key(record)] = record
+                replayed += 1
+                if seq is not None:
+                    last = seq
+        return replayed, last
+
+    def _open_journal(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+        self._truncate_torn_tail(self.journal_path)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._entries = self._count_entries(self.journal_path)
+
+    @staticmethod
+    def _truncate_torn_tail(path: str) -> None:
+        if not os.path.exists(path):
+            return
+        if os.path.getsize(path) == 0:
+            return
+        with open(path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            f.truncate(f.read().rfind(b"\n") + 1)
+            logger.warning(f"Truncated torn tail of journal {path}")
+
+    @staticmethod
+    def _count_entries(path: str) -> int:
+        with open(path, "r", encoding="utf-8") as f:
+            return sum(1 for line in f if line.strip())
+
+    def commit(self, *records) -> None:
+        if not records:
+            return
+        try:
+            line = self._codec.dumps(list(records), seq=self._seq + 1)
+            self._journal.write(line + "\n")
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+        except Exception as e:
+            logger.error(f"Error writing to journal {self.journal_path}: {str(e)}")
+            raise
+
+        self._seq += 1
+        self._entries += 1
+        if self._entries >= self.snapshot_every and not self.is_compacting():
+            self._rotate()
+
+    def is_compacting(self) -> bool:
+        return self._compaction is not None and self._compaction.is_alive()
+
+    def _rotate(self) -> None:
+        if os.path.exists(self.sealed_path):
+            # Прошлая компакция не удалась, запечатанный сегмент нельзя перезаписывать
+            self._start_compaction()
+            return
+        self._journal.close()
+        os.replace(self.journal_path, self.sealed_path)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._entries = 0
+        self._start_compaction()
+
+    def _start_compaction(self) -> None:
+        self._compaction = threading.Thread(target=self._compact, name="journal-compaction", daemon=True)
+        self._compaction.start()
+
+    def _compact(self) -> None:
+        """Merges the sealed journal segment into the snapshot. Works on files only, never on live records."""
+        try:
+            snapshot, seq = self._read_snapshot()
+            records = {self._key(record): record for record in (snapshot or [])}
+            replayed, seq = self._replay(self.sealed_path, records, seq)
+            self._write_snapshot(list(records.values()), seq)
+            os.remove(self.sealed_path)
+            logger.debug(f"Compacted {replayed} journal entries into {self.file_path}")
+        except Exception as e:
+            logger.error(f"Journal compaction of {self.file_path} failed: {str(e)}")
+
+    def _write_snapshot(self, records: List[Any], seq: Optional[int]) -> None:
+        self._write_file(self._codec.dumps(records, seq=seq))
+
+    def _save(self) -> None:
+        # Полная перезапись: снимок заменяет и снимок, и журнал (и запечатанный сегмент неудачной компакции)
+        self.wait_compaction()
+        try:
+            self._write_snapshot(self._data, self._seq)
+            if os.path.exists(self.sealed_path):
+                os.remove(self.sealed_path)
+            self._journal.close()
+            open(self.journal_path, "w").close()
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+            self._entries = 0
+            logger.debug(f"Saved snapshot to {self.file_path}")
+        except Exception as e:
+            logger.error(f"Error writing to {self.file_path}: {str(e)}")
+            raise
+
+    def wait_compaction(self) -> None:
+        if self._compaction is not None:
+            self._compaction.join()
+
+    def reload(self) -> None:
+        self.wait_compaction()
+        super().reload()
@@ -1,21 +1,37 @@
+import asyncio
+import atexit
 import json
 import os
-from typing import Any
+import threading
+from typing import Any, Optional
 
+from src.database.codec import JsonCodec
 from src.util.logger import logger
 
 
 class JsonFileStorage:
-    def __init__(self, file_path: str, decode_hook = None, encoder = None, default_value: Any = None):
+    def __init__(self, file_path: str, decode_hook = None, encoder = None, default_value: Any = None,
+                 write_behind: bool = False, codec = None):
         """
         Creates JSON storage
         :param file_path: path to storage
         :param default_value: value that should be returned if storage is empty
+        :param write_behind: write on a worker thread, coalescing bursts of saves into one write
+        :param codec: file format (src.database.codec), plain JSON with decode_hook/encoder by default
         """
         self.file_path = file_path
         self.default_value = default_value
         self._decode_hook = decode_hook
         self._encoder = encoder
+        self._codec = codec or JsonCodec(decode_hook=decode_hook, encoder=encoder)
+        self.write_behind = write_behind
+        self._writer: Optional[threading.Thread] = None
+        self._writer_cond = threading.Condition()
+        # Держится при изменении данных; фоновый писатель берет под ним только снимок (codec.snapshot)
+        self.lock = threading.RLock()
+        self._submitted = 0
+        self._written = 0
+        self._write_error: Optional[Exception] = None
         self._data = self._load()
 
     def _load(self) -> Any:
@@ -23,13 +39,9 @@ class JsonFileStorage:
             return self.default_value
 
         try:
-            with open(self.file_path, "r", encoding="utf-8") as f:
-                if self._decode_hook is None:
-                    data = json.load(f)
-                else:
-                    data = json.load(f, object_hook=self._decode_hook)
-                logger.debug(f"Loaded data from {self.file_path}")
-                return data
+            data = self.read_file()
+            logger.debug(f"Loaded data from {self.file_path}")
+            return data
         except json.JSONDecodeError as e:
             logger.error(f"Failed to decode JSON from {self.file_path}: {str(e)}")
             return self.default_value
@@ -37,20 +49,100 @@ class JsonFileStorage:
             logger.error(f"Error reading {self.file_path}: {str(e)}")
             return self.default_value
 
+    def read_file(self) -> Any:
+        """Reads and decodes the file without touching data; raises if it can't be read or decoded"""
+        with open(self.file_path, "r", encoding="utf-8") as f:
+            return self._codec.loads(f.read())
+
+    def _dumps(self, data: Any) -> str:
+        return self._codec.dumps(data)
+
+    def _write_file(self, payload: str) -> None:
+        # Пишем во временный файл и атомарно подменяем: при падении остается старая или новая версия
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+        tmp_path = self.file_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.file_path)
+
     def _save(self) -> None:
+        if self.write_behind:
+            self._submit()
+            return
         try:
-            # Создаем директорию, если она не существует
-            os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
-            with open(self.file_path, "w", encoding="utf-8") as f:
-                if self._encoder is None:
-                    json.dump(self._data, f, indent=2)
-                else:
-                    json.dump(self._data, f, indent=2, cls=self._encoder)
+            self._write_file(self._dumps(self._data))
             logger.debug(f"Saved data to {self.file_path}")
         except Exception as e:
             logger.error(f"Error writing to {self.file_path}: {str(e)}")
             raise
 
+    def _submit(self) -> None:
+        with self._writer_cond:
+            self._submitted += 1
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="storage-writer", daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+            self._writer_cond.notify_all()
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._writer_cond:
+                while self._written == self._submitted:
+                    self._writer_cond.wait()
+                # Все сохранения, пришедшие до этого момента, попадут в одну запись
+                generation = self._submitted
+
+            error = None
+            try:
+                # Под блокировкой - только дешевая копия строк, сериализация и запись идут без нее
+                with self.lock:
+                    snapshot = self._codec.snapshot(self._data)
+                self._write_file(self._codec.dumps_snapshot(snapshot))
+                logger.debug(f"Saved data to {self.file_path} (write-behind)")
+            except Exception as e:
+                logger.error(f"Error writing to {self.file_path}: {str(e)}")
+                error = e
+
+            with self._writer_cond:
+                # Ошибка видна всем flush, пока следующая запись не пройдет
+                self._write_error = error
+                self._written = generation
+                self._writer_cond.notify_all()
+
+    def flush(self) -> None:
+        """
+        Durability barrier: returns when everything saved before the call is on disk
+        """
+        with self._writer_cond:
+            target = self._submitted
+            while self._written < target:
+                self._writer_cond.wait()
+            error = self._write_error
+        if error is not None:
+            raise RuntimeError(f"Failed to write {self.file_path}: {str(error)}")
+
+    async def flush_async(self) -> None:
+        if self.write_behind:
+            await asyncio.to_thread(self.flush)
+
+    def commit(self, *records) -> None:
+        """
+        Persists changed records
+        :param records: records of data that were modified in place
+        """
+        self._save()
+
+    def reload(self) -> None:
+        self.flush()
+        self._data = self._load()
+
+    def replace_loaded(self, value: Any) -> None:
+        """Replaces data with a value already read from the file (read_file), without writing it back"""
+        self._data = value
+
     def create(self):
         if not os.path.isfile(self.file_path):
             open(self.file_path, "w").close()
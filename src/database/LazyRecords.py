@@ -0,0 +1,72 @@
+import weakref
+from collections import OrderedDict
+from typing import Any, Hashable, Iterator
+
+
+class LazyRecords:
+    """
+    List/dict-like view of a storage that loads records on demand (ShardedStorage, lazy SqliteStorage):
+    records are materialized only when touched.
+    """
+
+    def __init__(self, storage):
+        self._storage = storage
+
+    def get(self, key: int, default: Any = None) -> Any:
+        record = self._storage.get(key)
+        return default if record is None else record
+
+    def __setitem__(self, key: int, record: Any) -> None:
+        self._storage.cache(key, record)
+
+    def append(self, record: Any) -> None:
+        self._storage.cache(self._storage.key(record), record)
+
+    def __len__(self) -> int:
+        return self._storage.count()
+
+    def __iter__(self) -> Iterator[Any]:
+        return self._storage.iter_records()
+
+
+class RecordCache:
+    """
+    LRU of decoded records plus weak references to every record handed out.
+    While a caller still holds a record evicted from the LRU, the same object is returned for its key:
+    two live copies of one record would let a stale copy be committed over a newer one.
+    Not thread safe: used under the lock of its storage.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._lru: OrderedDict[Hashable, Any] = OrderedDict()
+        self._live: weakref.WeakValueDictionary[Hashable, Any] = weakref.WeakValueDictionary()
+
+    def get(self, key: Hashable) -> Any:
+        record = self._lru.get(key)
+        if record is not None:
+            self._lru.move_to_end(key)
+            return record
+        record = self._live.get(key)
+        if record is not None:
+            self.put(key, record)
+        return record
+
+    def peek(self, key: Hashable) -> Any:
+        """Record in use for the key, without touching the LRU order."""
+        record = self._lru.get(key)
+        return record if record is not None else self._live.get(key)
+
+    def put(self, key: Hashable, record: Any) -> None:
+        self._lru[key] = record
+        self._lru.move_to_end(key)
+        self._live[key] = record
+        while len(self._lru) > self.size:
+            self._lru.popitem(last=False)
+
+    def clear(self) -> None:
+        self._lru.clear()
+        self._live.clear()
+
+    def __len__(self) -> int:
+        return len(self._lru)
@@ -0,0 +1,385 @@
+import glob
+import json
+import mmap
+import os
+import struct
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.database.JsonFileStorage import JsonFileStorage
+from src.database.LazyRecords import LazyRecords, RecordCache
+from src.database.codec import RecordSchema
+from src.util.logger import logger
+
+_INDEX_MAGIC = b"KBIDX001"
+_INDEX_HEADER = struct.Struct("<8sQ")  # magic, размер данных, покрытый индексом
+_INDEX_ENTRY = struct.Struct("<qQI")   # key, offset, length
+
+
+def _encode_row(row: list) -> bytes:
+    return (json.dumps(row, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _key_of_line(line: bytes) -> int:
+    # Ключ - первое поле строки "[123,...]": разбирается только он
+    end = line.find(b",")
+    return int(line[1:end if end != -1 else line.rindex(b"]")])
+
+
+class _Shard:
+    """
+    One shard: append-only data file of JSON rows plus a sorted offset index, both memory-mapped.
+    Rows appended after the index was built are tracked in `delta` until the next compaction.
+    Files are versioned by generation, the index of a generation is written last.
+    """
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.generation = 0
+        self.delta: Dict[int, Tuple[int, int]] = {}
+        self.size = 0
+        self.count = 0
+        self._append = None
+        self._data_map: Optional[mmap.mmap] = None
+        self._index_map: Optional[mmap.mmap] = None
+        self._index_count = 0
+
+    def _data_path(self, generation: int) -> str:
+        return f"{self.prefix}.{generation}.dat"
+
+    def _index_path(self, generation: int) -> str:
+        return f"{self.prefix}.{generation}.idx"
+
+    def open(self) -> None:
+        generations = sorted(int(path.rsplit(".", 2)[1]) for path in glob.glob(f"{self.prefix}.*.idx"))
+        self.generation = generations[-1] if generations else 0
+        self._remove_other_generations()
+
+        data_path = self._data_path(self.generation)
+        open(data_path, "ab").close()
+        self._truncate_torn_tail(data_path)
+        self.size = os.path.getsize(data_path)
+        self._append = open(data_path, "ab")
+        covered = self._map_index()
+
+        self.delta = {}
+        with open(data_path, "rb") as f:
+            f.seek(covered)
+            offset = covered
+            for line in f:
+                self.delta[_key_of_line(line)] = (offset, len(line))
+                offset += len(line)
+        self.count = self._index_count + sum(1 for key in self.delta if self._index_lookup(key) is None)
+
+    def _remove_other_generations(self) -> None:
+        for path in glob.glob(f"{self.prefix}.*.dat") + glob.glob(f"{self.prefix}.*.idx"):
+            if int(path.rsplit(".", 2)[1]) != self.generation:
+                os.remove(path)
+
+    @staticmethod
+    def _truncate_torn_tail(path: str) -> None:
+        if os.path.getsize(path) == 0:
+            return
+        with open(path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            f.truncate(f.read().rfind(b"\n") + 1)
+            logger.warning(f"Truncated torn tail of shard {path}")
+
+    def _map_index(self) -> int:
+        if self._index_map is not None:
+            self._index_map.close()
+        self._index_map = None
+        self._index_count = 0
+
+        index_path = self._index_path(self.generation)
+        if not os.path.exists(index_path) or os.path.getsize(index_path) < _INDEX_HEADER.size:
+            return 0
+        with open(index_path, "rb") as f:
+            self._index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, covered = _INDEX_HEADER.unpack_from(self._index_map, 0)
+        if magic != _INDEX_MAGIC:
+            raise ValueError(f"Invalid shard index {index_path}")
+        self._index_count = (len(self._index_map) - _INDEX_HEADER.size) // _INDEX_ENTRY.size
+        return covered
+
+    def _index_entry(self, position: int) -> Tuple[int, int, int]:
+        return _INDEX_ENTRY.unpack_from(self._index_map, _INDEX_HEADER.size + position * _INDEX_ENTRY.size)
+
+    def _index_lookup(self, key: int) -> Optional[Tuple[int, int]]:
+        lo, hi = 0, self._index_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry_key, offset, length = self._index_entry(mid)
+            if entry_key < key:
+                lo = mid + 1
+            elif entry_key > key:
+                hi = mid
+            else:
+                return offset, length
+        return None
+
+    def locate(self, key: int) -> Optional[Tuple[int, int]]:
+        location = self.delta.get(key)
+        if location is None:
+            location = self._index_lookup(key)
+        return location
+
+    def read(self, offset: int, length: int) -> bytes:
+        if self._data_map is None or offset + length > len(self._data_map):
+            self._append.flush()
+            if self._data_map is not None:
+                self._data_map.close()
+            with open(self._data_path(self.generation), "rb") as f:
+                self._data_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._data_map[offset:offset + length]
+
+    def append(self, key: int, line: bytes) -> None:
+        if self.locate(key) is None:
+            self.count += 1
+        self.delta[key] = (self.size, len(line))
+        self._append.write(line)
+        self.size += len(line)
+
+    def sync(self) -> None:
+        self._append.flush()
+        os.fsync(self._append.fileno())
+
+    def entries(self) -> Iterator[Tuple[int, int, int]]:
+        delta = dict(self.delta)
+        for position in range(self._index_count):
+            entry = self._index_entry(position)
+            if entry[0] not in delta:
+                yield entry
+        for key, (offset, length) in delta.items():
+            yield key, offset, length
+
+    def compact(self) -> None:
+        """Writes the next generation with live rows only and a fresh index."""
+        self._append.flush()
+        self._write_generation((key, self.read(offset, length)) for key, offset, length in sorted(self.entries()))
+
+    def rewrite(self, lines: Dict[int, bytes]) -> None:
+        """Replaces all rows of the shard: the next generation is written next to the current one."""
+        self._write_generation(sorted(lines.items()))
+
+    def _write_generation(self, lines: Iterable[Tuple[int, bytes]]) -> None:
+        # Старое поколение остается рабочим, пока индекс нового не записан: он пишется последним
+        generation = self.generation + 1
+        new_entries: List[Tuple[int, int, int]] = []
+        position = 0
+        with open(self._data_path(generation), "wb") as out:
+            for key, line in lines:
+                out.write(line)
+                new_entries.append((key, position, len(line)))
+                position += len(line)
+            out.flush()
+            os.fsync(out.fileno())
+
+        tmp_path = self._index_path(generation) + ".tmp"
+        with open(tmp_path, "wb") as out:
+            out.write(_INDEX_HEADER.pack(_INDEX_MAGIC, position))
+            for entry in new_entries:
+                out.write(_INDEX_ENTRY.pack(*entry))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, self._index_path(generation))
+
+        self.close()
+        self.generation = generation
+        self._remove_other_generations()
+        self._append = open(self._data_path(generation), "ab")
+        self.size = position
+        self._map_index()
+        self.delta = {}
+        self.count = len(new_entries)
+
+    def close(self) -> None:
+        for handle in (self._append, self._data_map, self._index_map):
+            if handle is not None:
+                handle.close()
+        self._append = self._data_map = self._index_map = None
+        self._index_count = 0
+
+
+class ShardedStorage(JsonFileStorage):
+    def __init__(self, directory: str, key: Callable[[Any], int], schema: type[RecordSchema],
+                 file_path: str = None, codec=None, shards: int = 64, cache_size: int = 50_000,
+                 checkpoint_every: int = 1000, compact_every: int = 4096):
+        """
+        Creates sharded storage for records keyed by int (tg_id), the key must be the first field of schema rows.
+        Records live in `shards` append-only files with memory-mapped offset indexes and are
+        decoded only when touched; at most `cache_size` decoded records are kept (LRU), a record evicted
+        while still in use stays the only live object of its key (RecordCache).
+        A commit is first written to a commit log, so multi-record commits survive a crash as a whole.
+        Shard files and their mmaps are used only under self.lock: compaction replaces them.
+        :param directory: directory for shard files
+        :param file_path: JSON file with records to import if the shards are empty
+        :param codec: format of file_path
+        :param checkpoint_every: commits after which shard files are fsynced and the commit log is cleared
+        :param compact_every: rows appended to a shard after which it is compacted
+        """
+        self.directory = directory
+        self.key = key
+        self.schema = schema
+        self.checkpoint_every = checkpoint_every
+        self.compact_every = compact_every
+        self.commit_log_path = os.path.join(directory, "commit.log")
+        self._shards = [_Shard(os.path.join(directory, f"shard-{i:03d}")) for i in range(shards)]
+        self._cache = RecordCache(cache_size)
+        self._commit_log = None
+        self._commits = 0
+        super().__init__(file_path, default_value=None, codec=codec)
+
+    def _shard(self, key: int) -> _Shard:
+        return self._shards[key % len(self._shards)]
+
+    def _load(self) -> Any:
+        with self.lock:
+            return self._open_shards()
+
+    def _open_shards(self) -> Any:
+        os.makedirs(self.directory, exist_ok=True)
+        self._cache.clear()
+        for shard in self._shards:
+            shard.close()
+            shard.open()
+
+        replayed = self._replay_commit_log()
+        if replayed:
+            logger.info(f"Replayed {replayed} commits from {self.commit_log_path}")
+
+        if self.count() == 0 and self.file_path is not None:
+            # Первый запуск: переносим записи из JSON файла
+            records = super()._load() or []
+            for record in records:
+                self._shard(self.key(record)).append(self.key(record), _encode_row(self.schema.to_row(record)))
+            for shard in self._shards:
+                shard.compact()
+            if records:
+                logger.info(f"Imported {len(records)} records from {self.file_path} into {self.directory}")
+
+        logger.debug(f"Opened {len(self._shards)} shards in {self.directory}, {self.count()} records")
+        return LazyRecords(self)
+
+    def _replay_commit_log(self) -> int:
+        replayed = 0
+        if os.path.exists(self.commit_log_path):
+            with open(self.commit_log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rows = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f"Skipping broken commit in {self.commit_log_path}")
+                        continue
+                    for row in rows:
+                        self._shard(row[0]).append(row[0], _encode_row(row))
+                    replayed += 1
+        self._checkpoint()
+        return replayed
+
+    def _checkpoint(self) -> None:
+        for shard in self._shards:
+            shard.sync()
+        if self._commit_log is not None:
+            self._commit_log.close()
+        self._commit_log = open(self.commit_log_path, "w", encoding="utf-8")
+        self._commits = 0
+
+    def get(self, key: int) -> Any:
+        # Под блокировкой: запись, поднятая из шарда, должна попасть в кэш один раз для всех потоков
+        with self.lock:
+            record = self._cache.get(key)
+            if record is not None:
+                return record
+
+            shard = self._shard(key)
+            location = shard.locate(key)
+            if location is None:
+                return None
+            record = self.schema.from_row(json.loads(shard.read(*location)))
+            self.cache(key, record)
+            return record
+
+    def cache(self, key: int, record: Any) -> None:
+        with self.lock:
+            self._cache.put(key, record)
+
+    def count(self) -> int:
+        return sum(shard.count for shard in self._shards)
+
+    def iter_records(self) -> Iterator[Any]:
+        """
+        Streams all records shard by shard without filling the cache. A shard is copied under the lock
+        (cached records and raw rows) and decoded after it, so writers wait for one shard read at most.
+        """
+        for shard in self._shards:
+            with self.lock:
+                items = [self._cache.peek(key) or shard.read(offset, length)
+                         for key, offset, length in shard.entries()]
+            for item in items:
+                yield self.schema.from_row(json.loads(item)) if isinstance(item, bytes) else item
+
+    def commit(self, *records) -> None:
+        if not records:
+            return
+        with self.lock:
+            self._commit(records)
+
+    def _commit(self, records) -> None:
+        rows = [self.schema.to_row(record) for record in records]
+        try:
+            self._commit_log.write(json.dumps(rows, separators=(",", ":")) + "\n")
+            self._commit_log.flush()
+            os.fsync(self._commit_log.fileno())
+
+            touched = set()
+            for record, row in zip(records, rows):
+                key = self.key(record)
+                shard = self._shard(key)
+                shard.append(key, _encode_row(row))
+                touched.add(shard)
+                self.cache(key, record)
+        except Exception as e:
+            logger.error(f"Error writing to {self.directory}: {str(e)}")
+            raise
+
+        self._commits += 1
+        if self._commits >= self.checkpoint_every:
+            self._checkpoint()
+        for shard in touched:
+            if len(shard.delta) >= self.compact_every:
+                shard.compact()
+
+    def _save(self) -> None:
+        if isinstance(self._data, LazyRecords):
+            return
+        with self.lock:
+            self._replace_records()
+
+    def _replace_records(self) -> None:
+        # Полная замена набора записей. Каждый шард пишет новое поколение рядом со старым и переключается
+        # на него, как при сжатии: при сбое шард остается в старом или новом виде, но не пустым.
+        # Журнал коммитов очищается заранее, чтобы после сбоя он не применился поверх новых данных
+        records = list(self._data or [])
+        self._checkpoint()
+        lines: List[Dict[int, bytes]] = [{} for _ in self._shards]
+        for record in records:
+            key = self.key(record)
+            lines[key % len(self._shards)][key] = _encode_row(self.schema.to_row(record))
+        for shard, shard_lines in zip(self._shards, lines):
+            shard.rewrite(shard_lines)
+        self._cache.clear()
+        self._data = LazyRecords(self)
+        logger.debug(f"Saved {len(records)} records to {self.directory}")
+
+    def create(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+    def close(self) -> None:
+        with self.lock:
+            self._checkpoint()
+            for shard in self._shards:
+                shard.close()
+            self._commit_log.close()
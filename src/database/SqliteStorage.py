@@ -0,0 +1,150 @@
+import json
+import sqlite3
+from typing import Any, Callable, Hashable, Iterator, List
+
+from src.database.JsonFileStorage import JsonFileStorage
+from src.database.LazyRecords import LazyRecords, RecordCache
+from src.util.logger import logger
+
+
+class SqliteStorage(JsonFileStorage):
+    def __init__(self, db_path: str, table: str, key: Callable[[Any], Hashable], file_path: str = None,
+                 decode_hook=None, encoder=None, default_value: Any = None, codec=None,
+                 lazy: bool = False, cache_size: int = 50_000):
+        """
+        Creates SQLite storage for a list of records, one row per record keyed by key(record)
+        :param db_path: path to SQLite database (WAL mode)
+        :param table: table name
+        :param file_path: JSON file with records to import if the table is empty
+        :param codec: format of file_path
+        :param lazy: records are read by key with point queries instead of loading the table at start;
+                     at most `cache_size` decoded records are kept (LRU), a record evicted while still
+                     in use stays the only live object of its key (RecordCache)
+        """
+        self.db_path = db_path
+        self.table = table
+        self.key = key
+        self.lazy = lazy
+        self._cache = RecordCache(cache_size)
+        # Соединение используется из разных потоков, обращения к нему идут под self.lock
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (key PRIMARY KEY, body TEXT NOT NULL)")
+        self._conn.commit()
+        super().__init__(file_path, decode_hook=decode_hook, encoder=encoder, default_value=default_value,
+                         codec=codec)
+
+    def _load(self) -> Any:
+        if self.lazy:
+            return self._open_lazy()
+        with self.lock:
+            rows = self._conn.execute(f"SELECT body FROM {self.table} ORDER BY rowid").fetchall()
+        if rows:
+            records = [json.loads(body, object_hook=self._decode_hook) for (body,) in rows]
+            logger.debug(f"Loaded {len(records)} rows from {self.db_path}:{self.table}")
+            return records
+
+        if self.file_path is None:
+            return self.default_value
+
+        # Первый запуск: переносим записи из JSON файла
+        records = super()._load()
+        if records:
+            self._upsert(records)
+            logger.info(f"Imported {len(records)} records from {self.file_path} into {self.db_path}:{self.table}")
+        return records
+
+    def _open_lazy(self) -> LazyRecords:
+        with self.lock:
+            self._cache.clear()
+        if self.count() == 0 and self.file_path is not None:
+            # Первый запуск: переносим записи из JSON файла
+            records = super()._load()
+            if records:
+                self._upsert(records)
+                logger.info(f"Imported {len(records)} records from {self.file_path} into {self.db_path}:{self.table}")
+        logger.debug(f"Opened {self.db_path}:{self.table}, {self.count()} records")
+        return LazyRecords(self)
+
+    def _decode(self, body: str) -> Any:
+        return json.loads(body, object_hook=self._decode_hook)
+
+    def get(self, key: Hashable) -> Any:
+        # Под блокировкой: запись, поднятая из таблицы, должна попасть в кэш один раз для всех потоков
+        with self.lock:
+            record = self._cache.get(key)
+            if record is not None:
+                return record
+            row = self._conn.execute(f"SELECT body FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            record = self._decode(row[0])
+            self.cache(key, record)
+            return record
+
+    def cache(self, key: Hashable, record: Any) -> None:
+        with self.lock:
+            self._cache.put(key, record)
+
+    def count(self) -> int:
+        with self.lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def iter_records(self, batch_size: int = 1000) -> Iterator[Any]:
+        """Streams all records in batches of rows without filling the cache; the lock is held per batch."""
+        last_rowid = 0
+        while True:
+            with self.lock:
+                rows = self._conn.execute(
+                    f"SELECT rowid, key, body FROM {self.table} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, batch_size)
+                ).fetchall()
+                items = [self._cache.peek(key) or body for _, key, body in rows]
+            if not rows:
+                return
+            last_rowid = rows[-1][0]
+            for item in items:
+                yield self._decode(item) if isinstance(item, str) else item
+
+    def _encode(self, record) -> str:
+        return json.dumps(record, cls=self._encoder, separators=(",", ":"))
+
+    def _upsert(self, records: List[Any]) -> None:
+        with self.lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO {self.table} (key, body) VALUES (?, ?) "
+                f"ON CONFLICT(key) DO UPDATE SET body = excluded.body",
+                [(self.key(record), self._encode(record)) for record in records]
+            )
+
+    def commit(self, *records) -> None:
+        if not records:
+            return
+        try:
+            self._upsert(list(records))
+        except sqlite3.Error as e:
+            logger.error(f"Error writing to {self.db_path}:{self.table}: {str(e)}")
+            raise
+
+    def _save(self) -> None:
+        if isinstance(self._data, LazyRecords):
+            return
+        try:
+            with self.lock, self._conn:
+                self._conn.execute(f"DELETE FROM {self.table}")
+                self._conn.executemany(
+                    f"INSERT INTO {self.table} (key, body) VALUES (?, ?)",
+                    [(self.key(record), self._encode(record)) for record in self._data or []]
+                )
+            logger.debug(f"Saved data to {self.db_path}:{self.table}")
+        except sqlite3.Error as e:
+            logger.error(f"Error writing to {self.db_path}:{self.table}: {str(e)}")
+            raise
+
+    def create(self):
+        pass
+
+    def close(self) -> None:
+        with self.lock:
+            self._conn.close()
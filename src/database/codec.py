@@ -0,0 +1,120 @@
+import inspect
+import json
+from abc import ABC, abstractmethod
+from typing import Any, List, Optional, Sequence, Tuple
+
+_FORMAT_KEY = "__format__"
+_FORMAT_RECORDS = "records"
+_FORMAT_VERSION = 1
+_ROWS_PER_CHUNK = 10_000
+
+
+class JsonCodec:
+    def __init__(self, decode_hook=None, encoder=None, indent: Optional[int] = 2):
+        """
+        Plain JSON with optional object_hook / JSONEncoder (format of JsonFileStorage files)
+        """
+        self._decode_hook = decode_hook
+        self._encoder = encoder
+        self.indent = indent
+
+    def loads(self, text: str) -> Any:
+        if self._decode_hook is None:
+            return json.loads(text)
+        return json.loads(text, object_hook=self._decode_hook)
+
+    def dumps(self, data: Any) -> str:
+        return json.dumps(data, indent=self.indent, cls=self._encoder)
+
+    def snapshot(self, data: Any) -> str:
+        """Copy of data to serialize later without the storage lock: for plain JSON it is the text itself."""
+        return self.dumps(data)
+
+    def dumps_snapshot(self, snapshot: str) -> str:
+        return snapshot
+
+
+class RecordSchema(ABC):
+    """
+    Describes how a record maps to a flat row. Subclasses define name, fields, to_row and from_row.
+    Schemas are used as classes, RecordCodec refuses a schema that leaves to_row or from_row abstract.
+    """
+    name: str = ""
+    fields: Sequence[str] = ()
+
+    @staticmethod
+    @abstractmethod
+    def to_row(record) -> Sequence:
+        ...
+
+    @staticmethod
+    @abstractmethod
+    def from_row(row: list):
+        ...
+
+
+class RecordCodec:
+    def __init__(self, schema: type[RecordSchema], legacy: Optional[JsonCodec] = None):
+        """
+        Compact codec for a list of records of one schema:
+        {"__format__": "records", "version": 1, "schema": ..., "fields": [...], "seq": n, "rows": [[...], ...]}
+        Rows are decoded by schema.from_row without per-dict hooks. "seq" is optional: the journal
+        sequence number a journaled snapshot or journal entry was written at.
+        :param legacy: codec for files written in the old format, they are read and rewritten on next save
+        """
+        if inspect.isabstract(schema):
+            raise TypeError(f"Schema {schema.__name__} does not implement {', '.join(sorted(schema.__abstractmethods__))}")
+        self.schema = schema
+        self.legacy = legacy
+
+    def loads(self, text: str) -> Any:
+        return self.loads_with_seq(text)[0]
+
+    def loads_with_seq(self, text: str) -> Tuple[Any, Optional[int]]:
+        """Records and the sequence number saved with them by dumps(seq=...), None if there is none."""
+        if not text.lstrip().startswith("{"):
+            return self._loads_legacy(text), None
+
+        document = json.loads(text)
+        if not isinstance(document, dict) or document.get(_FORMAT_KEY) != _FORMAT_RECORDS:
+            return self._loads_legacy(text), None
+        if document.get("schema") != self.schema.name:
+            raise ValueError(f"Expected records of {self.schema.name}, got {document.get('schema')}")
+
+        rows = document["rows"]
+        fields = document["fields"]
+        if fields != list(self.schema.fields):
+            # Файл записан с другим порядком полей
+            order = [fields.index(field) for field in self.schema.fields]
+            rows = ([row[i] for i in order] for row in rows)
+
+        from_row = self.schema.from_row
+        return [from_row(row) for row in rows], document.get("seq")
+
+    def _loads_legacy(self, text: str) -> Any:
+        if self.legacy is None:
+            raise ValueError(f"Data is not in {_FORMAT_RECORDS} format and no legacy codec is set")
+        return self.legacy.loads(text)
+
+    def dumps(self, data: List[Any], seq: Optional[int] = None) -> str:
+        return self.dumps_snapshot(self.snapshot(data), seq)
+
+    def snapshot(self, data: List[Any]) -> List[Sequence]:
+        """Rows of the records: a cheap copy taken under the storage lock, serialized by dumps_snapshot after it."""
+        return list(map(self.schema.to_row, data))
+
+    def dumps_snapshot(self, rows: List[Sequence], seq: Optional[int] = None) -> str:
+        document = {
+            _FORMAT_KEY: _FORMAT_RECORDS,
+            "version": _FORMAT_VERSION,
+            "schema": self.schema.name,
+            "fields": list(self.schema.fields),
+        }
+        if seq is not None:
+            document["seq"] = seq
+        document["rows"] = []
+        header = json.dumps(document, separators=(",", ":"))
+        # Строки кодируются частями: json.dumps держит GIL весь вызов, а между частями работает цикл событий
+        chunks = (json.dumps(rows[i:i + _ROWS_PER_CHUNK], separators=(",", ":"))[1:-1]
+                  for i in range(0, len(rows), _ROWS_PER_CHUNK))
+        return header[:-2] + ",".join(chunks) + "]}"
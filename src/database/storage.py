@@ -0,0 +1,55 @@
+import os
+from typing import Any, Callable, Hashable
+
+import src.config.env.var_names
+from src.config.env.env import get_env_var
+from src.config.files import get_database_filename
+from src.database.JournaledStorage import JournaledStorage
+from src.database.JsonFileStorage import JsonFileStorage
+from src.database.ShardedStorage import ShardedStorage
+from src.database.SqliteStorage import SqliteStorage
+from src.util.logger import logger
+
+MODE_JSON = "json"
+MODE_JOURNAL = "journal"
+MODE_SQLITE = "sqlite"
+MODE_SHARDED = "sharded"
+
+
+def get_storage_mode() -> str:
+    return get_env_var(src.config.env.var_names.STORAGE_MODE, default=MODE_JSON).lower()
+
+
+def is_write_behind() -> bool:
+    return get_env_var(src.config.env.var_names.STORAGE_WRITE_BEHIND).lower() in ("1", "true", "yes")
+
+
+def create_record_storage(file_path: str, table: str, key: Callable[[Any], Hashable],
+                          decode_hook=None, encoder=None, default_value: Any = None, codec=None,
+                          lazy: bool = False) -> JsonFileStorage:
+    """
+    Creates storage for a list of records according to STORAGE_MODE
+    :param file_path: JSON file of the records (snapshot for journal mode, import source for sqlite)
+    :param table: table name for sqlite mode
+    :param key: returns unique key of a record
+    :param codec: file format of file_path, plain JSON with decode_hook/encoder by default
+    :param lazy: records are keyed by int and may be loaded on demand (sharded and sqlite modes),
+                 requires RecordCodec; other collections keep a single JSON file in sharded mode
+    """
+    mode = get_storage_mode()
+    if mode == MODE_SHARDED:
+        if lazy:
+            return ShardedStorage(os.path.splitext(file_path)[0] + ".shards", key=key, schema=codec.schema,
+                                  file_path=file_path, codec=codec)
+        mode = MODE_JSON
+    if mode == MODE_SQLITE:
+        return SqliteStorage(get_database_filename(), table=table, key=key, file_path=file_path,
+                             decode_hook=decode_hook, encoder=encoder, default_value=default_value, codec=codec,
+                             lazy=lazy)
+    if mode == MODE_JOURNAL:
+        return JournaledStorage(file_path, key=key, decode_hook=decode_hook, encoder=encoder,
+                                default_value=default_value, codec=codec)
+    if mode != MODE_JSON:
+        logger.warning(f"Unknown STORAGE_MODE [{mode}], falling back to {MODE_JSON}")
+    return JsonFileStorage(file_path, decode_hook=decode_hook, encoder=encoder, default_value=default_value,
+                           write_behind=is_write_behind(), codec=codec)
@@ -0,0 +1,108 @@
+"""
+Offline tool for the accounts storage. Stop the bot before running it: both processes
+would write the same files.
+
+    python -m src.tools.accounts export [file.csv]      tg_id,blocked,balance (stdout by default)
+    python -m src.tools.accounts verify                 exit code 1 if problems were found
+    python -m src.tools.accounts block file.csv         tg_id per line
+    python -m src.tools.accounts unblock file.csv       missing accounts are created unblocked
+    python -m src.tools.accounts credit file.csv        tg_id,amount (BYN) per line
+
+Input files are read twice: the first pass validates every line, so a bad line leaves the data untouched.
+"""
+import argparse
+import contextlib
+import os
+import sys
+
+
+def _open_input(path: str):
+    return open(path, newline="", encoding="utf-8-sig")
+
+
+def export(manager, path: str = None) -> int:
+    from src.core.account.csv_io import write_accounts
+
+    if path is None:
+        count = write_accounts(manager.iter_accounts(), sys.stdout)
+    else:
+        with open(path, "w", newline="", encoding="utf-8") as out:
+            count = write_accounts(manager.iter_accounts(), out)
+    print(f"Exported {count} accounts", file=sys.stderr)
+    return 0
+
+
+def verify(manager) -> int:
+    from src.core.account.AccountManager import get_max_debt
+
+    max_debt = get_max_debt()
+    problems = 0
+    seen = set()
+    for account in manager.accounts:
+        tg_id = account.get_id()
+        if tg_id in seen:
+            print(f"duplicate tg_id {tg_id}")
+            problems += 1
+        seen.add(tg_id)
+        if account.get_balance() < max_debt:
+            print(f"{tg_id}: balance {account.get_balance()} is below max debt {max_debt}")
+            problems += 1
+
+    if not manager.verify_stats():
+        print("account stats do not match a full recompute")
+        problems += 1
+
+    print(manager.get_stats())
+    print(f"{problems} problem(s) found")
+    return 1 if problems else 0
+
+
+def apply(manager, command: str, path: str) -> int:
+    from src.core.account.csv_io import read_credits, read_ids
+
+    reader = read_credits if command == "credit" else read_ids
+    try:
+        with _open_input(path) as lines:
+            rows = sum(1 for _ in reader(lines))
+    except ValueError as e:
+        print(f"{path}: {e}", file=sys.stderr)
+        return 1
+
+    with _open_input(path) as lines:
+        if command == "credit":
+            count, total = manager.bulk_credit(reader(lines))
+            print(f"Credited {count} rows, {total} BYN")
+        else:
+            changed, missing = manager.bulk_set_blocked(reader(lines), command == "block",
+                                                        create_missing=command == "unblock")
+            print(f"{rows} rows: {changed} changed, {missing} not found")
+    manager.storage.flush()
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.tools.accounts",
+                                     description="Offline accounts tool. Stop the bot before running it.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("export", help="write all accounts as CSV").add_argument("file", nargs="?")
+    commands.add_parser("verify", help="check storage integrity")
+    for command in ("block", "unblock", "credit"):
+        commands.add_parser(command).add_argument("file")
+    args = parser.parse_args(argv)
+
+    # Загрузка конфигурации меняет рабочую директорию, пути нужно разрешить заранее
+    path = os.path.abspath(args.file) if getattr(args, "file", None) else None
+
+    # Импорт печатает служебные строки, stdout оставляем под экспорт
+    with contextlib.redirect_stdout(sys.stderr):
+        from src.core.account.AccountManager import account_manager
+
+    if args.command == "export":
+        return export(account_manager, path)
+    if args.command == "verify":
+        return verify(account_manager)
+    return apply(account_manager, args.command, path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
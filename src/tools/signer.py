@@ -0,0 +1,48 @@
+"""
+Signer process: holds the keys from trx_wallets.json and signs transaction ids for the bot
+over a unix socket. Restart it after wallets are added.
+
+    python -m src.tools.signer [--socket path] [--workers N]
+
+The socket defaults to SIGNER_SOCKET from .env, workers to the number of CPUs.
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.tools.signer",
+                                     description="Transaction signer for the bot.")
+    parser.add_argument("--socket", help="unix socket path (default: SIGNER_SOCKET)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="signing processes")
+    args = parser.parse_args(argv)
+
+    # Загрузка конфигурации меняет рабочую директорию, путь нужно разрешить заранее
+    socket_path = os.path.abspath(args.socket) if args.socket else None
+
+    with contextlib.redirect_stdout(sys.stderr):
+        from src.config.env.env import get_env_var
+        from src.config.env.var_names import SIGNER_SOCKET
+        from src.core.crypto.tron.Signer import SignerServer, load_keys
+
+    socket_path = socket_path or get_env_var(SIGNER_SOCKET)
+    if not socket_path:
+        print("Socket path is not set: pass --socket or set SIGNER_SOCKET", file=sys.stderr)
+        return 1
+    if args.workers < 1:
+        print("--workers must be at least 1", file=sys.stderr)
+        return 1
+
+    server = SignerServer(load_keys(), socket_path, args.workers)
+    try:
+        asyncio.run(server.serve_forever())
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable
+
+
+class FanOutResult:
+    """Answers of a fan-out query: results and errors by key. Keys without an answer by the deadline are in errors."""
+    __slots__ = ("results", "errors")
+
+    def __init__(self):
+        self.results: Dict[Hashable, Any] = {}
+        self.errors: Dict[Hashable, BaseException] = {}
+
+    def is_complete(self) -> bool:
+        return not self.errors
+
+
+async def fan_out(keys: Iterable[Hashable],
+                  query: Callable[[Hashable], Awaitable[Any]],
+                  limit: int,
+                  deadline: float) -> FanOutResult:
+    """
+    Runs query(key) for every key, at most `limit` at a time, and waits no longer than `deadline` seconds.
+    Never raises for a single key: its exception (or TimeoutError) goes to errors, other results are kept.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(key):
+        async with semaphore:
+            return await query(key)
+
+    tasks = {asyncio.ensure_future(run(key)): key for key in dict.fromkeys(keys)}
+    result = FanOutResult()
+    if not tasks:
+        return result
+
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+        result.errors[tasks[task]] = TimeoutError(f"no answer in {deadline:g} s")
+    if pending:
+        # Дожидаемся отмены, чтобы задачи не пережили вызов
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    for task in done:
+        if task.exception() is not None:
+            result.errors[tasks[task]] = task.exception()
+        else:
+            result.results[tasks[task]] = task.result()
+    return result
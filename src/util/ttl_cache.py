@@ -0,0 +1,70 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class TtlCache:
+    def __init__(self, ttl: float):
+        """
+        Async cache with a time-to-live per entry.
+        Concurrent misses for one key share a single fetch (single-flight); failed fetches are not cached.
+        """
+        self.ttl = ttl
+        # key -> (value, время загрузки)
+        self._entries: Dict[Hashable, Tuple[Any, float]] = {}
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        # Растет при invalidate, загрузка, начатая до сброса, результат не сохраняет
+        self._versions: Dict[Hashable, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and now - entry[1] < self.ttl:
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        return await self._load(key, fetch)
+
+    async def refresh(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Fetches the value regardless of its age, joining a fetch already in flight."""
+        return await self._load(key, fetch)
+
+    async def _load(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, fetch, self._versions.get(key, 0)))
+            self._inflight[key] = task
+        # shield: отмена одного ожидающего не отменяет общую загрузку
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], version: int) -> Any:
+        try:
+            value = await fetch()
+            if self._versions.get(key, 0) == version:
+                self._entries[key] = (value, time.monotonic())
+            return value
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (value, time.monotonic())
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Cached value regardless of its age, without fetching."""
+        entry = self._entries.get(key)
+        return default if entry is None else entry[0]
+
+    def invalidate(self, key: Hashable) -> None:
+        self._versions[key] = self._versions.get(key, 0) + 1
+        self._entries.pop(key, None)
+        self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        for key in list(self._entries) + list(self._inflight):
+            self.invalidate(key)
+
+    def __len__(self):
+        return len(self._entries)